@@ -0,0 +1,97 @@
+"""Add latest_scans table
+
+Revision ID: 3f1c2a9b7d54
+Revises: 6ac06ef47c0a
+Create Date: 2026-10-19 09:12:41.218734
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9b7d54'
+down_revision: Union[str, Sequence[str], None] = '6ac06ef47c0a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_QUERY = """
+SELECT
+    sr.domain_id, sr.id, sr.scan_date, sr.scan_status, sr.grade, sr.score,
+    (SELECT MAX(t.version) FROM tls_versions t
+        WHERE t.scan_result_id = sr.id AND t.is_supported) AS max_tls_version,
+    (SELECT MAX(CASE WHEN p.is_supported THEN 1 ELSE 0 END) FROM pqc_info p
+        WHERE p.scan_result_id = sr.id) AS pqc_supported,
+    (SELECT MAX(c.issuer) FROM certificates c WHERE c.scan_result_id = sr.id) AS issuer,
+    (SELECT MAX(c.ca_type) FROM certificates c WHERE c.scan_result_id = sr.id) AS ca_type,
+    (SELECT MAX(g.country_name) FROM geo_locations g WHERE g.scan_result_id = sr.id) AS country
+FROM scan_results sr
+WHERE sr.domain_id IS NOT NULL
+  AND sr.id = (
+    SELECT s2.id FROM scan_results s2
+    WHERE s2.domain_id = sr.domain_id
+    ORDER BY s2.scan_date DESC, s2.id DESC
+    LIMIT 1
+  )
+"""
+
+
+def issuer_name(issuer: str) -> str:
+    """Friendly issuer name (O, falling back to CN) as of this revision, kept here so the backfill never changes."""
+    match = re.search(r"O=([^,]+)", issuer) or re.search(r"CN=([^,]+)", issuer)
+    if match:
+        return match.group(1).strip().strip('"').strip("'").replace("\\", "").strip()
+    return issuer[:30] + "..." if len(issuer) > 30 else issuer
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    latest_scans = op.create_table('latest_scans',
+    sa.Column('domain_id', sa.Integer(), nullable=False),
+    sa.Column('scan_result_id', sa.Integer(), nullable=False),
+    sa.Column('scan_date', sa.DateTime(), nullable=False),
+    sa.Column('scan_status', sa.String(length=50), nullable=False),
+    sa.Column('grade', sa.String(length=5), nullable=True),
+    sa.Column('score', sa.DECIMAL(precision=5, scale=2), nullable=True),
+    sa.Column('max_tls_version', sa.String(length=50), nullable=True),
+    sa.Column('pqc_supported', sa.Boolean(), nullable=True),
+    sa.Column('issuer', sa.String(length=255), nullable=True),
+    sa.Column('ca_type', sa.String(length=50), nullable=True),
+    sa.Column('country', sa.String(length=100), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['domain_id'], ['domains.id'], ),
+    sa.ForeignKeyConstraint(['scan_result_id'], ['scan_results.id'], ),
+    sa.PrimaryKeyConstraint('domain_id')
+    )
+    op.create_index('ix_latest_scans_status_date', 'latest_scans', ['scan_status', 'scan_date'], unique=False)
+
+    # Backfill from existing history
+    query = sa.text(BACKFILL_QUERY).columns(scan_date=sa.DateTime(), score=sa.DECIMAL(5, 2))
+    rows = op.get_bind().execute(query).fetchall()
+    if rows:
+        op.bulk_insert(latest_scans, [
+            {
+                "domain_id": row.domain_id,
+                "scan_result_id": row.id,
+                "scan_date": row.scan_date,
+                "scan_status": row.scan_status,
+                "grade": row.grade,
+                "score": row.score,
+                "max_tls_version": row.max_tls_version,
+                "pqc_supported": bool(row.pqc_supported),
+                "issuer": issuer_name(row.issuer) if row.issuer else None,
+                "ca_type": row.ca_type,
+                "country": row.country,
+            }
+            for row in rows
+        ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_latest_scans_status_date', table_name='latest_scans')
+    op.drop_table('latest_scans')
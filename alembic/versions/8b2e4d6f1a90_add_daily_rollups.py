@@ -0,0 +1,38 @@
+"""Add daily_rollups table
+
+Revision ID: 8b2e4d6f1a90
+Revises: 3f1c2a9b7d54
+Create Date: 2026-10-19 13:05:22.614093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a90'
+down_revision: Union[str, Sequence[str], None] = '3f1c2a9b7d54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows are backfilled from scan history by the generator on its next run
+    op.create_table('daily_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.DateTime(), nullable=False),
+    sa.Column('scope', sa.String(length=20), nullable=False),
+    sa.Column('scope_key', sa.String(length=100), nullable=False),
+    sa.Column('statistics_json', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'scope', 'scope_key', name='uq_daily_rollups_day_scope_key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_rollups')
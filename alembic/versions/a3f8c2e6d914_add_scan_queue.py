@@ -0,0 +1,40 @@
+"""Add scan_queue table
+
+Revision ID: a3f8c2e6d914
+Revises: d7b3f5e1a846
+Create Date: 2026-10-22 09:14:37.502816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f8c2e6d914'
+down_revision: Union[str, Sequence[str], None] = 'd7b3f5e1a846'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scan_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('domain', sa.String(length=255), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('tld', sa.String(length=50), nullable=False),
+    sa.Column('enqueued_at', sa.DateTime(), nullable=False),
+    sa.Column('visible_at', sa.DateTime(), nullable=False),
+    sa.Column('lease_token', sa.String(length=32), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_scan_queue_visible', 'scan_queue', ['visible_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_scan_queue_visible', table_name='scan_queue')
+    op.drop_table('scan_queue')
@@ -0,0 +1,82 @@
+"""Key geo_locations by IP address and store the scanned IP on scan_results
+
+Revision ID: a7c3e5f9b214
+Revises: f2a6d8c4b931
+Create Date: 2026-10-20 09:12:44.518302
+
+"""
+import hashlib
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5f9b214'
+down_revision: Union[str, Sequence[str], None] = 'f2a6d8c4b931'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('scan_results') as batch_op:
+        batch_op.add_column(sa.Column('ip_address', sa.String(length=45), nullable=True))
+    op.create_index(op.f('ix_scan_results_ip_address'), 'scan_results', ['ip_address'], unique=False)
+
+    # The only IPs known so far are those of resolved locations, held by the configuration's scan
+    op.execute(
+        "UPDATE scan_results SET ip_address = ("
+        "SELECT MAX(geo_locations.ip_address) FROM geo_locations "
+        "WHERE geo_locations.scan_result_id = COALESCE(scan_results.config_scan_id, scan_results.id))"
+    )
+
+    # One location per IP: keep the newest row of each
+    op.execute("DELETE FROM geo_locations WHERE ip_address IS NULL")
+    op.execute("DELETE FROM geo_locations WHERE id NOT IN (SELECT MAX(id) FROM geo_locations GROUP BY ip_address)")
+    with op.batch_alter_table('geo_locations') as batch_op:
+        batch_op.drop_column('scan_result_id')
+        batch_op.alter_column('ip_address', existing_type=sa.String(length=45), nullable=False)
+        batch_op.add_column(sa.Column('database_build', sa.DateTime(), nullable=True))
+    op.create_index('ix_geo_locations_ip_address', 'geo_locations', ['ip_address'], unique=True)
+
+    # Locations are no longer part of a configuration: rehash once per distinct configuration
+    conn = op.get_bind()
+    rows = []
+    for config_hash, component_hashes in conn.execute(sa.text("SELECT DISTINCT config_hash, component_hashes FROM config_changes")):
+        hashes = json.loads(component_hashes)
+        hashes.pop("geo_location", None)
+        rows.append({"old": config_hash, "new": _digest(hashes), "components": json.dumps(hashes, sort_keys=True)})
+    if rows:
+        conn.execute(
+            sa.text("UPDATE config_changes SET config_hash = :new, component_hashes = :components WHERE config_hash = :old"),
+            rows,
+        )
+        conn.execute(sa.text("UPDATE scan_results SET config_hash = :new WHERE config_hash = :old"), rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Configuration hashes are not restored; the next scan of each domain records its configuration afresh
+    op.drop_index('ix_geo_locations_ip_address', table_name='geo_locations')
+    with op.batch_alter_table('geo_locations') as batch_op:
+        batch_op.drop_column('database_build')
+        batch_op.alter_column('ip_address', existing_type=sa.String(length=45), nullable=True)
+        batch_op.add_column(sa.Column('scan_result_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_geo_locations_scan_result_id', 'scan_results', ['scan_result_id'], ['id'])
+
+    # Hand each location to the newest scan of its IP
+    op.execute(
+        "UPDATE geo_locations SET scan_result_id = ("
+        "SELECT MAX(scan_results.id) FROM scan_results WHERE scan_results.ip_address = geo_locations.ip_address)"
+    )
+
+    op.drop_index(op.f('ix_scan_results_ip_address'), table_name='scan_results')
+    with op.batch_alter_table('scan_results') as batch_op:
+        batch_op.drop_column('ip_address')
@@ -0,0 +1,63 @@
+"""Add priority_at to scan_schedule
+
+Revision ID: b6e1d9f4c270
+Revises: a3f8c2e6d914
+Create Date: 2026-10-23 11:02:18.447391
+
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d9f4c270'
+down_revision: Union[str, Sequence[str], None] = 'a3f8c2e6d914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def priority_at(rank, first_seen, next_due, interval_days):
+    # Frozen copy of scanner.scheduler.priority_at / entrant_priority_at at this revision
+    if interval_days is None:
+        # Never scanned: the rank's interval, one of them overdue when first listed
+        interval_days = 1.0 if rank <= 1000 else min(30.0, 1.0 + 7.0 * math.log10(rank / 1000))
+        return first_seen + timedelta(days=interval_days * (math.log10(rank + 9) - 2))
+    return next_due + timedelta(days=interval_days * (math.log10(rank + 9) - 1))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('scan_schedule') as batch_op:
+        batch_op.add_column(sa.Column('priority_at', sa.DateTime(), nullable=True))
+
+    conn = op.get_bind()
+    rows = [
+        {"b_id": schedule_id,
+         "priority_at": priority_at(rank, _datetime(first_seen), _datetime(next_due), interval_days)}
+        for schedule_id, rank, first_seen, next_due, interval_days in conn.execute(sa.text(
+            "SELECT id, rank, first_seen, next_due, interval_days FROM scan_schedule"
+        ))
+    ]
+    if rows:
+        # Bound as DateTime so the stored format matches what the ORM writes
+        update = sa.text("UPDATE scan_schedule SET priority_at = :priority_at WHERE id = :b_id")
+        conn.execute(update.bindparams(sa.bindparam("priority_at", type_=sa.DateTime())), rows)
+
+    with op.batch_alter_table('scan_schedule') as batch_op:
+        batch_op.alter_column('priority_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_scan_schedule_priority_at'), 'scan_schedule', ['priority_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_scan_schedule_priority_at'), table_name='scan_schedule')
+    with op.batch_alter_table('scan_schedule') as batch_op:
+        batch_op.drop_column('priority_at')
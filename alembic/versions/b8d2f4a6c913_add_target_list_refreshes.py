@@ -0,0 +1,56 @@
+"""Add target_list_refreshes and target_list_changes tables
+
+Revision ID: b8d2f4a6c913
+Revises: a7c3e5f9b214
+Create Date: 2026-10-20 15:41:09.226814
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2f4a6c913'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e5f9b214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('target_list_refreshes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('url', sa.String(length=500), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.Column('etag', sa.String(length=255), nullable=True),
+    sa.Column('last_modified', sa.String(length=64), nullable=True),
+    sa.Column('domains', sa.Integer(), nullable=False),
+    sa.Column('added', sa.Integer(), nullable=False),
+    sa.Column('removed', sa.Integer(), nullable=False),
+    sa.Column('rank_shifted', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_target_list_refreshes_fetched_at'), 'target_list_refreshes', ['fetched_at'], unique=False)
+    op.create_table('target_list_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('refresh_id', sa.Integer(), nullable=False),
+    sa.Column('domain', sa.String(length=255), nullable=False),
+    sa.Column('change', sa.String(length=20), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=True),
+    sa.Column('previous_rank', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['refresh_id'], ['target_list_refreshes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_target_list_changes_domain'), 'target_list_changes', ['domain'], unique=False)
+    op.create_index('ix_target_list_changes_refresh_change', 'target_list_changes', ['refresh_id', 'change'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_target_list_changes_refresh_change', table_name='target_list_changes')
+    op.drop_index(op.f('ix_target_list_changes_domain'), table_name='target_list_changes')
+    op.drop_table('target_list_changes')
+    op.drop_index(op.f('ix_target_list_refreshes_fetched_at'), table_name='target_list_refreshes')
+    op.drop_table('target_list_refreshes')
@@ -0,0 +1,87 @@
+"""Add configuration hashes, references and change log
+
+Revision ID: c47d9e2a5b18
+Revises: 8b2e4d6f1a90
+Create Date: 2026-10-19 16:41:08.392617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d9e2a5b18'
+down_revision: Union[str, Sequence[str], None] = '8b2e4d6f1a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('scan_results') as batch_op:
+        batch_op.add_column(sa.Column('config_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('config_scan_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_scan_results_config_scan_id', 'scan_results', ['config_scan_id'], ['id'])
+
+    with op.batch_alter_table('latest_scans') as batch_op:
+        batch_op.add_column(sa.Column('config_scan_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_latest_scans_config_scan_id', 'scan_results', ['config_scan_id'], ['id'])
+
+    # Existing scans all hold their own child rows
+    op.execute("UPDATE latest_scans SET config_scan_id = scan_result_id")
+
+    op.create_table('config_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('domain_id', sa.Integer(), nullable=False),
+    sa.Column('scan_result_id', sa.Integer(), nullable=False),
+    sa.Column('previous_scan_id', sa.Integer(), nullable=True),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.Column('config_hash', sa.String(length=64), nullable=False),
+    sa.Column('component_hashes', sa.Text(), nullable=False),
+    sa.Column('changed_components', sa.String(length=255), nullable=False),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['domain_id'], ['domains.id'], ),
+    sa.ForeignKeyConstraint(['previous_scan_id'], ['scan_results.id'], ),
+    sa.ForeignKeyConstraint(['scan_result_id'], ['scan_results.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_config_changes_domain_changed', 'config_changes', ['domain_id', 'changed_at'], unique=False)
+    op.create_index(op.f('ix_config_changes_changed_at'), 'config_changes', ['changed_at'], unique=False)
+
+
+# Tables whose rows a scan stored by reference leaves to the scan it references
+CHILD_TABLES = ('tls_versions', 'cipher_suites', 'certificates', 'pqc_info', 'geo_locations')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Without config_scan_id, scans stored by reference need their own copy of the
+    # configuration rows; tables are reflected so the copy matches this revision's columns
+    bind = op.get_bind()
+    scans = sa.table('scan_results', sa.column('id'), sa.column('config_scan_id'))
+    for name in CHILD_TABLES:
+        table = sa.Table(name, sa.MetaData(), autoload_with=bind)
+        own = table.alias('own')
+        columns = [column.name for column in table.c if column.name not in ('id', 'scan_result_id')]
+        op.execute(table.insert().from_select(
+            ['scan_result_id', *columns],
+            sa.select(scans.c.id, *(table.c[column] for column in columns))
+            .select_from(table)
+            .join(scans, scans.c.config_scan_id == table.c.scan_result_id)
+            .where(~sa.exists().where(own.c.scan_result_id == scans.c.id)),
+        ))
+
+    op.drop_index(op.f('ix_config_changes_changed_at'), table_name='config_changes')
+    op.drop_index('ix_config_changes_domain_changed', table_name='config_changes')
+    op.drop_table('config_changes')
+
+    with op.batch_alter_table('latest_scans') as batch_op:
+        batch_op.drop_constraint('fk_latest_scans_config_scan_id', type_='foreignkey')
+        batch_op.drop_column('config_scan_id')
+
+    with op.batch_alter_table('scan_results') as batch_op:
+        batch_op.drop_constraint('fk_scan_results_config_scan_id', type_='foreignkey')
+        batch_op.drop_column('config_scan_id')
+        batch_op.drop_column('config_hash')
@@ -0,0 +1,38 @@
+"""Add sampling_strata table
+
+Revision ID: c4e9a1d7f352
+Revises: b8d2f4a6c913
+Create Date: 2026-10-20 18:07:32.905417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e9a1d7f352'
+down_revision: Union[str, Sequence[str], None] = 'b8d2f4a6c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by the next stratified run (run_scan.py --strata)
+    op.create_table('sampling_strata',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rank_first', sa.Integer(), nullable=False),
+    sa.Column('rank_last', sa.Integer(), nullable=False),
+    sa.Column('tld', sa.String(length=50), nullable=True),
+    sa.Column('population', sa.Integer(), nullable=False),
+    sa.Column('sample_size', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sampling_strata')
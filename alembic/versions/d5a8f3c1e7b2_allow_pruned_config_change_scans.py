@@ -0,0 +1,32 @@
+"""Allow change-log entries to outlive their scans
+
+Revision ID: d5a8f3c1e7b2
+Revises: c47d9e2a5b18
+Create Date: 2026-10-19 19:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8f3c1e7b2'
+down_revision: Union[str, Sequence[str], None] = 'c47d9e2a5b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('config_changes') as batch_op:
+        batch_op.alter_column('scan_result_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Entries whose scan was pruned cannot be kept without it
+    op.execute("DELETE FROM config_changes WHERE scan_result_id IS NULL")
+    with op.batch_alter_table('config_changes') as batch_op:
+        batch_op.alter_column('scan_result_id', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,45 @@
+"""Add scan_schedule table
+
+Revision ID: d7b3f5e1a846
+Revises: c4e9a1d7f352
+Create Date: 2026-10-21 10:26:51.370284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7b3f5e1a846'
+down_revision: Union[str, Sequence[str], None] = 'c4e9a1d7f352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled from the target list and scan history by the next scheduled run (run_scan.py --budget)
+    op.create_table('scan_schedule',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('domain', sa.String(length=255), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('tld', sa.String(length=50), nullable=False),
+    sa.Column('first_seen', sa.DateTime(), nullable=False),
+    sa.Column('last_scanned', sa.DateTime(), nullable=True),
+    sa.Column('change_rate', sa.Float(), nullable=True),
+    sa.Column('interval_days', sa.Float(), nullable=True),
+    sa.Column('next_due', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('domain')
+    )
+    op.create_index(op.f('ix_scan_schedule_next_due'), 'scan_schedule', ['next_due'], unique=False)
+    op.create_index(op.f('ix_scan_schedule_rank'), 'scan_schedule', ['rank'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_scan_schedule_rank'), table_name='scan_schedule')
+    op.drop_index(op.f('ix_scan_schedule_next_due'), table_name='scan_schedule')
+    op.drop_table('scan_schedule')
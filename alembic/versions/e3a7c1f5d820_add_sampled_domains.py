@@ -0,0 +1,38 @@
+"""Add sampled_domains table
+
+Revision ID: e3a7c1f5d820
+Revises: b6e1d9f4c270
+Create Date: 2026-10-24 09:41:05.118263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7c1f5d820'
+down_revision: Union[str, Sequence[str], None] = 'b6e1d9f4c270'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled by the next stratified run; until then the estimates have no scans to weight
+    op.create_table('sampled_domains',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stratum_id', sa.Integer(), nullable=False),
+    sa.Column('domain', sa.String(length=255), nullable=False),
+    sa.Column('sampled_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['stratum_id'], ['sampling_strata.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sampled_domains_stratum_sampled', 'sampled_domains', ['stratum_id', 'sampled_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sampled_domains_stratum_sampled', table_name='sampled_domains')
+    op.drop_table('sampled_domains')
@@ -0,0 +1,49 @@
+"""Add structured issuer O/CN to certificates
+
+Revision ID: e9c4b7a2d318
+Revises: d5a8f3c1e7b2
+Create Date: 2026-10-19 21:03:57.246190
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9c4b7a2d318'
+down_revision: Union[str, Sequence[str], None] = 'd5a8f3c1e7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _attribute(issuer: str, name: str):
+    if issuer.startswith("<Name(") and issuer.endswith(")>"):
+        issuer = issuer[len("<Name("):-len(")>")]
+    match = re.search(rf"(?:^|,){name}=([^,]+)", issuer)
+    return match.group(1) if match else None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('certificates') as batch_op:
+        batch_op.add_column(sa.Column('issuer_organization', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('issuer_common_name', sa.String(length=255), nullable=True))
+
+    # Backfill once per distinct issuer DN
+    conn = op.get_bind()
+    issuers = [row[0] for row in conn.execute(sa.text("SELECT DISTINCT issuer FROM certificates WHERE issuer IS NOT NULL"))]
+    if issuers:
+        conn.execute(
+            sa.text("UPDATE certificates SET issuer_organization = :organization, issuer_common_name = :common_name WHERE issuer = :issuer"),
+            [{"issuer": issuer, "organization": _attribute(issuer, "O"), "common_name": _attribute(issuer, "CN")} for issuer in issuers],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('certificates') as batch_op:
+        batch_op.drop_column('issuer_common_name')
+        batch_op.drop_column('issuer_organization')
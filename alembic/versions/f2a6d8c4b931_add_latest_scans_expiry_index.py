@@ -0,0 +1,57 @@
+"""Add expiry index to latest_scans
+
+Revision ID: f2a6d8c4b931
+Revises: e9c4b7a2d318
+Create Date: 2026-10-19 22:27:31.804517
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6d8c4b931'
+down_revision: Union[str, Sequence[str], None] = 'e9c4b7a2d318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('latest_scans') as batch_op:
+        batch_op.add_column(sa.Column('valid_until', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('expiry_week', sa.DateTime(), nullable=True))
+
+    # Current certificates live on the scan holding the configuration rows
+    op.execute(
+        "UPDATE latest_scans SET valid_until = ("
+        "SELECT certificates.valid_until FROM certificates WHERE certificates.scan_result_id = latest_scans.config_scan_id)"
+    )
+
+    # Week buckets once per distinct expiry time
+    conn = op.get_bind()
+    values = [row[0] for row in conn.execute(sa.text("SELECT DISTINCT valid_until FROM latest_scans WHERE valid_until IS NOT NULL"))]
+    if values:
+        rows = []
+        for value in values:
+            parsed = datetime.fromisoformat(value) if isinstance(value, str) else value
+            day = parsed.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+            rows.append({"valid_until": value, "expiry_week": day - timedelta(days=day.weekday())})
+        # Bound as DateTime so the stored format matches what the ORM writes
+        update = sa.text("UPDATE latest_scans SET expiry_week = :expiry_week WHERE valid_until = :valid_until")
+        conn.execute(update.bindparams(sa.bindparam("expiry_week", type_=sa.DateTime())), rows)
+
+    op.create_index('ix_latest_scans_valid_until', 'latest_scans', ['valid_until'], unique=False)
+    op.create_index('ix_latest_scans_expiry_week', 'latest_scans', ['expiry_week', 'valid_until'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_latest_scans_expiry_week', table_name='latest_scans')
+    op.drop_index('ix_latest_scans_valid_until', table_name='latest_scans')
+    with op.batch_alter_table('latest_scans') as batch_op:
+        batch_op.drop_column('expiry_week')
+        batch_op.drop_column('valid_until')
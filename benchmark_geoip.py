@@ -0,0 +1,118 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+import geoip2.database
+import geoip2.errors
+from scanner.geoip import GeoIPResolver, GEOIP_DB_PATH, GEOIP_MODE
+from scanner.models import GeoLocation
+
+
+def skewed_ips(count: int, blocks: int, seed: int):
+    """
+    IPv4 addresses drawn like scan targets: a Zipf-like spread over /24 blocks, so a
+    few CDN blocks account for most sites, with random hosts inside each block.
+    """
+    rng = random.Random(seed)
+    prefixes = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}" for _ in range(blocks)]
+    weights = [1 / (rank + 1) for rank in range(blocks)]
+    return [f"{prefix}.{rng.randint(1, 254)}" for prefix in rng.choices(prefixes, weights, k=count)]
+
+
+def _location(reader, ip: str):
+    """One uncached lookup, building the GeoLocation as the resolver does."""
+    try:
+        response = reader.city(ip)
+    except geoip2.errors.AddressNotFoundError:
+        return None
+    return GeoLocation(
+        ip_address=ip,
+        country_code=response.country.iso_code,
+        country_name=response.country.name,
+        region=response.subdivisions.most_specific.name if response.subdivisions else None,
+        city=response.city.name,
+        latitude=response.location.latitude,
+        longitude=response.location.longitude
+    )
+
+
+def per_call(mmdb: str, ips):
+    """The previous path: a reader opened in the default mode for every lookup, no cache."""
+    found = 0
+    for ip in ips:
+        reader = geoip2.database.Reader(mmdb)
+        found += _location(reader, ip) is not None
+        reader.close()
+    return found
+
+
+def shared_reader(mmdb: str, ips):
+    """One reader in the default mode, no cache: separates reader reuse from caching."""
+    with geoip2.database.Reader(mmdb) as reader:
+        return sum(_location(reader, ip) is not None for ip in ips)
+
+
+def benchmark_geoip(mmdb: str, lookups: int, baseline_lookups: int, blocks: int, seed: int, mode: str):
+    if not os.path.exists(mmdb):
+        print(f"GeoIP database not found at {mmdb}; download GeoLite2-City.mmdb (see the daily scan workflow) or pass --mmdb")
+        sys.exit(1)
+
+    # Addresses missing from the database are expected here
+    logging.getLogger("scanner.geoip").setLevel(logging.ERROR)
+    ips = skewed_ips(lookups, blocks, seed)
+    baseline = ips[:baseline_lookups]
+    print(f"{lookups} lookups over {len(set(ips))} distinct IPs in {blocks} /24 blocks")
+
+    def run(label, count, fn):
+        start = time.perf_counter()
+        found = fn()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<36} {count:>8} lookups {elapsed:8.3f}s {count / elapsed:>12,.0f}/s  ({found} found)")
+        return elapsed / count
+
+    old = run("per-call reader (previous)", len(baseline), lambda: per_call(mmdb, baseline))
+    run("shared reader, no cache", len(ips), lambda: shared_reader(mmdb, ips))
+
+    resolver = GeoIPResolver(mmdb, mode=mode)
+    new = run(f"shared resolver ({mode}), lookup", len(ips),
+              lambda: sum(resolver.lookup(ip) is not None for ip in ips))
+    stats = resolver.stats()
+    print(f"  cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%}), {stats['size']} entries")
+
+    batch = GeoIPResolver(mmdb, mode=mode)
+    run(f"shared resolver ({mode}), resolve_many", len(ips),
+        lambda: sum(location is not None for location in batch.resolve_many(ips).values()))
+
+    # Both paths must agree on every answer
+    mismatches = 0
+    with geoip2.database.Reader(mmdb) as reader:
+        for ip in baseline:
+            try:
+                response = reader.city(ip)
+                expected = (response.country.iso_code, response.city.name, response.location.latitude)
+            except geoip2.errors.AddressNotFoundError:
+                expected = None
+            location = resolver.lookup(ip)
+            actual = (location.country_code, location.city, location.latitude) if location else None
+            mismatches += expected != actual
+    print(f"Speedup over the per-call path: {old / new:.0f}x, {mismatches} mismatched answers")
+    if mismatches:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GeoIP lookups: per-call reader vs. the shared cached resolver")
+    parser.add_argument("--mmdb", default=GEOIP_DB_PATH, help="GeoLite2-City.mmdb to read")
+    parser.add_argument("--lookups", type=int, default=200000, help="Lookups for the shared paths")
+    parser.add_argument("--baseline-lookups", type=int, default=5000, help="Lookups for the (slow) per-call path")
+    parser.add_argument("--blocks", type=int, default=20000, help="Distinct /24 blocks in the workload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default=GEOIP_MODE, choices=["mmap", "memory"], help="Reader mode of the shared resolver")
+    args = parser.parse_args()
+    benchmark_geoip(args.mmdb, args.lookups, args.baseline_lookups, args.blocks, args.seed, args.mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,8 @@ def check_cipher_data():
         
         total_ciphers = 0
         for scan in scans:
-            ciphers = scan.cipher_suites
+            # Unchanged scans reference the scan holding their configuration rows
+            ciphers = scan.configuration_scan.cipher_suites
             count = len(ciphers)
             print(f"Domain: {scan.domain.name}, Cipher Suites: {count}")
             if count > 0:
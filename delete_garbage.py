@@ -1,33 +1,32 @@
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from scanner.database import get_db, engine
+from scanner.database import get_db
 from scanner.models import Domain, ScanResult
-from datetime import datetime
+from scanner.retention import discard_scans
 
 def delete_garbage():
     db: Session = next(get_db())
-    
+
     domains_to_clean = ["youtube.com", "facebook.com", "google.com"]
-    target_date_str = "2025-11-19"
-    
-    print(f"Cleaning up data for {domains_to_clean} on {target_date_str}...")
-    
-    deleted_count = 0
-    
-    for domain_name in domains_to_clean:
-        domain = db.query(Domain).filter(Domain.name == domain_name).first()
-        if not domain:
-            continue
-            
-        # Find scans for this domain on the target date
-        scans = db.query(ScanResult).filter(ScanResult.domain_id == domain.id).all()
-        
-        for scan in scans:
-            # Check if scan date matches 2025-11-19
-            if scan.scan_date.strftime("%Y-%m-%d") == target_date_str:
-                print(f"Deleting scan for {domain_name} at {scan.scan_date} with grade {scan.grade}")
-                db.delete(scan)
-                deleted_count += 1
-    
+    target_date = datetime(2025, 11, 19)
+
+    print(f"Cleaning up data for {domains_to_clean} on {target_date:%Y-%m-%d}...")
+
+    # Select the scans of the target day in one query, comparing dates in the database
+    scan_ids = [
+        scan_id for (scan_id,) in
+        db.query(ScanResult.id)
+        .join(Domain, Domain.id == ScanResult.domain_id)
+        .filter(
+            Domain.name.in_(domains_to_clean),
+            ScanResult.scan_date >= target_date,
+            ScanResult.scan_date < target_date + timedelta(days=1),
+        )
+    ]
+
+    # Deleted scans may be current; only the affected domains' pointers and aggregates change
+    deleted_count = discard_scans(db, scan_ids)
+
     db.commit()
     print(f"Deleted {deleted_count} records.")
 
@@ -0,0 +1,35 @@
+import argparse
+from scanner.database import get_db
+from scanner.geoip import GeoIPResolver, GEOIP_DB_PATH
+from scanner.geo_enrichment import enrich_locations
+
+
+def run_enrichment(mmdb: str = GEOIP_DB_PATH, refresh: bool = False, rebuild_trends: bool = False):
+    resolver = GeoIPResolver(mmdb)
+    db = next(get_db())
+    try:
+        report = enrich_locations(db, resolver, refresh=refresh, rebuild_trends=rebuild_trends)
+    finally:
+        db.close()
+        resolver.close()
+
+    if report.database_build is None:
+        print(f"No GeoIP database at {mmdb}; nothing enriched")
+        return
+    print(f"GeoIP database built {report.database_build:%Y-%m-%d}")
+    print(f"Resolved {report.resolved_ips} IPs ({report.located_ips} located)")
+    print(f"{report.changed_domains} domains changed country")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill missing or stale locations of scanned IPs from the GeoIP database")
+    parser.add_argument("--mmdb", default=GEOIP_DB_PATH, help="GeoLite2-City.mmdb to resolve with")
+    parser.add_argument("--refresh", action="store_true", help="Re-resolve every scanned IP, not only missing and stale ones")
+    parser.add_argument("--rebuild-trends", action="store_true", help="Also replay history so past days of the trend charts use the new locations")
+    args = parser.parse_args()
+
+    run_enrichment(args.mmdb, refresh=args.refresh, rebuild_trends=args.rebuild_trends)
+
+
+if __name__ == "__main__":
+    main()
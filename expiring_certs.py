@@ -0,0 +1,41 @@
+import argparse
+from datetime import datetime, timedelta, timezone
+from scanner.database import get_db
+from scanner.expiry import expiring_between, expiry_horizon
+
+
+def expiring_certs(days: int = 30, include_expired: bool = False, limit: int = None, horizon: bool = False):
+    db = next(get_db())
+    try:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if horizon:
+            counts = expiry_horizon(db, now)
+            print(f"Already expired: {counts['expired']}")
+            for week, count in counts["weeks"]:
+                print(f"  week of {week:%Y-%m-%d}: {count}")
+            print(f"Later: {counts['later']}")
+            return
+
+        end = now + timedelta(days=days)
+        rows = expiring_between(db, None if include_expired else now, end, limit=limit).all()
+        print(f"{len(rows)} domains with certificates expiring before {end:%Y-%m-%d}:")
+        for name, valid_until, issuer, ca_type, grade in rows:
+            status = "EXPIRED" if valid_until < now else f"in {(valid_until - now).days}d"
+            print(f"- {valid_until:%Y-%m-%d} ({status}) {name} [{issuer or 'Unknown'}, grade {grade or 'N/A'}]")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List tracked domains whose current certificate expires soon")
+    parser.add_argument("--days", type=int, default=30, help="Expiry window in days from now (default: 30)")
+    parser.add_argument("--include-expired", action="store_true", help="Also list certificates that already expired")
+    parser.add_argument("--limit", type=int, help="List at most this many domains")
+    parser.add_argument("--horizon", action="store_true", help="Show counts per expiry week instead of domains")
+    args = parser.parse_args()
+
+    expiring_certs(args.days, args.include_expired, args.limit, args.horizon)
+
+
+if __name__ == "__main__":
+    main()
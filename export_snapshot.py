@@ -0,0 +1,34 @@
+import os
+import argparse
+from scanner.database import get_db
+from scanner.snapshot import ColumnarSnapshotWriter, LATEST_SCHEMA, export_history
+from generator.main import iter_table_rows, summarize_row, snapshot_row
+
+
+def export_snapshot(output_dir: str, history: bool = False):
+    """Write the current state (and optionally every stored scan) as NumPy column files."""
+    db = next(get_db())
+    try:
+        latest = ColumnarSnapshotWriter(os.path.join(output_dir, "latest"), LATEST_SCHEMA)
+        for row in iter_table_rows(db):
+            summary, _ = summarize_row(row)
+            latest.add(snapshot_row(row, summary))
+        latest.close()
+
+        if history:
+            export_history(db, os.path.join(output_dir, "history"))
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export scan data as a columnar NumPy snapshot")
+    parser.add_argument("--output", default="snapshot", help="Output directory (default: snapshot)")
+    parser.add_argument("--history", action="store_true", help="Also export every stored scan, not only the latest per domain")
+    args = parser.parse_args()
+
+    export_snapshot(args.output, history=args.history)
+
+
+if __name__ == "__main__":
+    main()
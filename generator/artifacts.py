@@ -0,0 +1,412 @@
+import os
+import gzip
+import json
+import base64
+import shutil
+import hashlib
+import logging
+from array import array
+from tempfile import TemporaryFile
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+import numpy as np
+from scanner.snapshot import Snapshot
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip copies are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of a summary row; the page decodes them back into objects
+SUMMARY_COLUMNS = [
+    "domain", "grade", "score", "pqc_supported", "tls_version",
+    "ca_type", "issuer", "country", "timestamp", "pqc_algorithms",
+]
+
+# Summary columns stored as indexes into a per-file string dictionary
+DICTIONARY_COLUMNS = ["grade", "tls_version", "ca_type", "issuer", "country", "pqc_algorithms"]
+
+# Domains per detail shard the shard count aims for, and its bounds
+DOMAINS_PER_SHARD = 2000
+MAX_SHARDS = 256
+
+# Domains per trigram posting shard
+DOMAINS_PER_TRIGRAM_SHARD = 20000
+
+# Facets the page filters on, with a bitmap or id list per value
+SEARCH_FACETS = ["country", "grade", "pqc_supported"]
+
+# Suffixes of the data directory being built and of the one it replaces during the swap
+STAGING_SUFFIX = ".staging"
+PREVIOUS_SUFFIX = ".previous"
+
+
+def shard_count_for(total: int, per_shard: int = DOMAINS_PER_SHARD) -> int:
+    """Pick a power-of-two shard count so each shard holds about per_shard domains."""
+    count = 1
+    while count < MAX_SHARDS and count * per_shard < total:
+        count *= 2
+    return count
+
+
+def trigrams(domain: str) -> List[str]:
+    """Distinct 3-character substrings of a lower-cased domain."""
+    text = domain.lower()
+    return sorted({text[i:i + 3] for i in range(len(text) - 2)})
+
+
+def delta_encode(ids: Iterable[int]) -> List[int]:
+    """Encode ascending row ids as gaps from the previous id."""
+    encoded, previous = [], 0
+    for row_id in ids:
+        encoded.append(row_id - previous)
+        previous = row_id
+    return encoded
+
+
+def encode_bitmap(ids: Iterable[int], total: int) -> str:
+    """Base64 of a uint32 bitmap (native, i.e. little-endian, byte order) with one bit per row id."""
+    words = array("I", bytes(4 * ((total + 31) // 32)))
+    for row_id in ids:
+        words[row_id >> 5] |= 1 << (row_id & 31)
+    return base64.b64encode(words.tobytes()).decode("ascii")
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    """
+    Map a domain (or trigram) to its shard with 32-bit FNV-1a over its UTF-8 bytes.
+
+    The dashboard computes the same hash in JavaScript to find a row's shard.
+    """
+    h = 0x811C9DC5
+    for byte in key.encode("utf-8"):
+        h ^= byte
+        h = (h * 0x01000193) & 0xFFFFFFFF
+    return h % shard_count
+
+
+class _HashedFile:
+    """A JSON file written incrementally and published under a content-hashed name."""
+
+    def __init__(self, directory: str, stem: str):
+        self.directory = directory
+        self.stem = stem
+        self.tmp_path = os.path.join(directory, f".{stem}.tmp")
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self.digest = hashlib.sha256()
+
+    def write(self, text: str):
+        self.file.write(text)
+        self.digest.update(text.encode("utf-8"))
+
+    def publish(self) -> str:
+        """Rename to <stem>.<hash>.json, write compressed copies, and return the file name."""
+        self.file.close()
+        name = f"{self.stem}.{self.digest.hexdigest()[:12]}.json"
+        path = os.path.join(self.directory, name)
+        os.replace(self.tmp_path, path)
+
+        with open(path, "rb") as src, gzip.GzipFile(path + ".gz", "wb", compresslevel=9, mtime=0) as dst:
+            shutil.copyfileobj(src, dst)
+        if brotli is not None:
+            with open(path, "rb") as src, open(path + ".br", "wb") as dst:
+                dst.write(brotli.compress(src.read()))
+        return name
+
+
+def swap_in_dashboard(output_dir: str, rendered_page: str, page: str = "index.html",
+                      directories: Tuple[str, ...] = ("data", "snapshot")):
+    """
+    Publish a finished build: the staged directories (<name>.staging), then the page
+    rendered at rendered_page, replace the live ones.
+
+    The previous directories are only deleted once everything is in place, and are
+    moved back if the swap fails, so a failed build leaves the previous page and the
+    data and snapshot it was built with.
+    """
+    swapped = []
+    try:
+        for name in directories:
+            live = os.path.join(output_dir, name)
+            previous = live + PREVIOUS_SUFFIX
+            shutil.rmtree(previous, ignore_errors=True)
+            if os.path.exists(live):
+                os.replace(live, previous)
+            swapped.append(live)
+            os.replace(live + STAGING_SUFFIX, live)
+        os.replace(rendered_page, os.path.join(output_dir, page))
+    except OSError:
+        for live in reversed(swapped):
+            if os.path.exists(live + PREVIOUS_SUFFIX):
+                shutil.rmtree(live, ignore_errors=True)
+                os.replace(live + PREVIOUS_SUFFIX, live)
+        raise
+    for live in swapped:
+        shutil.rmtree(live + PREVIOUS_SUFFIX, ignore_errors=True)
+
+
+class DashboardDataWriter:
+    """
+    Writes the dashboard data as a slim summary index plus lazily fetched detail shards.
+
+    Rows are appended one at a time: the summary goes to one file and each row's details
+    to the shard picked by shard_of(domain). Nothing but the string dictionaries is kept
+    in memory. close() publishes every file under a content-hashed name (with .gz/.br
+    copies) and returns the manifest the page loads them from.
+
+    Files are written to a staging directory next to the published one, which keeps
+    serving the previous page until swap_in_dashboard() replaces both.
+    """
+
+    def __init__(self, output_dir: str, total: int, data_dir: str = "data"):
+        self.output_dir = output_dir
+        self.data_dir = data_dir
+        self.root = os.path.join(output_dir, data_dir + STAGING_SUFFIX)
+
+        # Leftovers of a failed build are never published, so start from a clean directory
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(os.path.join(self.root, "details"))
+
+        self.shard_count = shard_count_for(total)
+        self.dictionaries: Dict[str, Dict[str, int]] = {column: {} for column in DICTIONARY_COLUMNS}
+
+        self.summary = _HashedFile(self.root, "summary")
+        self.summary.write('{"columns":' + json.dumps(SUMMARY_COLUMNS) + ',"rows":[')
+        self.summary_rows = 0
+
+        self.shards: List[Optional[_HashedFile]] = [None] * self.shard_count
+        self.shard_rows = [0] * self.shard_count
+
+    def _code(self, column: str, value: str) -> int:
+        codes = self.dictionaries[column]
+        if value not in codes:
+            codes[value] = len(codes)
+        return codes[value]
+
+    def add(self, summary: Dict[str, Any], details: Dict[str, Any]) -> int:
+        """Append one domain's summary row and details, returning its row id."""
+        row = []
+        for column in SUMMARY_COLUMNS:
+            value = summary[column]
+            if column == "pqc_algorithms":
+                value = [self._code(column, algo) for algo in value]
+            elif column in DICTIONARY_COLUMNS:
+                value = self._code(column, value)
+            elif column == "pqc_supported":
+                value = int(value)
+            row.append(value)
+
+        row_id = self.summary_rows
+        self.summary.write(("," if row_id else "") + json.dumps(row, separators=(",", ":")))
+        self.summary_rows += 1
+
+        domain = summary["domain"]
+        shard = shard_of(domain, self.shard_count)
+        if self.shards[shard] is None:
+            self.shards[shard] = _HashedFile(os.path.join(self.root, "details"), f"{shard:03d}")
+            self.shards[shard].write("{")
+        prefix = "," if self.shard_rows[shard] else ""
+        self.shards[shard].write(prefix + json.dumps(domain) + ":" + json.dumps(details, separators=(",", ":")))
+        self.shard_rows[shard] += 1
+        return row_id
+
+    def publish_json(self, stem: str, data: Any) -> str:
+        """Publish a standalone data file as <stem>.<hash>.json and return its path relative to the output directory."""
+        hashed = _HashedFile(self.root, stem)
+        hashed.write(json.dumps(data, separators=(",", ":")))
+        return f"{self.data_dir}/{hashed.publish()}"
+
+    def close(self) -> Dict[str, Any]:
+        """Publish all files and return the manifest (paths relative to the output directory)."""
+        dictionaries = {
+            column: sorted(codes, key=codes.get) for column, codes in self.dictionaries.items()
+        }
+        self.summary.write('],"dictionaries":' + json.dumps(dictionaries, separators=(",", ":")) + "}")
+        summary_name = self.summary.publish()
+
+        shard_paths = []
+        for shard in self.shards:
+            if shard is None:
+                shard_paths.append(None)
+                continue
+            shard.write("}")
+            shard_paths.append(f"{self.data_dir}/details/{shard.publish()}")
+
+        logger.info(f"Wrote summary of {self.summary_rows} domains and {self.shard_count} detail shards")
+        return {
+            "summary": f"{self.data_dir}/{summary_name}",
+            "shard_count": self.shard_count,
+            "shards": shard_paths,
+        }
+
+
+class SearchIndexWriter:
+    """
+    Builds the search artifacts the page intersects instead of rescanning rows.
+
+    Row ids are positions in the summary index. Three artifacts are written into the
+    same data directory as DashboardDataWriter:
+
+    - sorted.<hash>.json: row ids ordered by lower-cased domain, for prefix binary search
+    - trigrams/<shard>.<hash>.json: delta-encoded posting lists per domain trigram,
+      sharded by FNV-1a of the trigram so a query only fetches the shards it needs
+    - facets.<hash>.json: per facet value, a uint32 bitmap (dense values) or a
+      delta-encoded id list (sparse values)
+
+    Postings and facet ids are spilled to temporary files (one per trigram shard and
+    per facet) while rows stream in, and read back one shard or facet at a time on
+    close, so memory follows the largest shard rather than the domain count.
+    """
+
+    def __init__(self, data_writer: DashboardDataWriter, total: int):
+        self.root = data_writer.root
+        self.data_dir = data_writer.data_dir
+        os.makedirs(os.path.join(self.root, "trigrams"))
+
+        self.total = total
+        self.trigram_shard_count = shard_count_for(total, DOMAINS_PER_TRIGRAM_SHARD)
+        # Lines of "<key>\t<row id>", in ascending row id order
+        self.postings = [TemporaryFile("w+", encoding="utf-8") for _ in range(self.trigram_shard_count)]
+        self.facets = {facet: TemporaryFile("w+", encoding="utf-8") for facet in SEARCH_FACETS}
+
+    def add(self, row_id: int, summary: Dict[str, Any]):
+        """Index one summary row; row ids must be added in ascending order."""
+        for trigram in trigrams(summary["domain"]):
+            self.postings[shard_of(trigram, self.trigram_shard_count)].write(f"{trigram}\t{row_id}\n")
+        for facet in SEARCH_FACETS:
+            value = summary[facet]
+            value = str(int(value)) if isinstance(value, bool) else str(value)
+            self.facets[facet].write(f"{value}\t{row_id}\n")
+
+    @staticmethod
+    def _read_back(spill) -> Dict[str, array]:
+        """Group a spill file's row ids by key (ascending, as written) and close it."""
+        grouped: Dict[str, array] = {}
+        spill.seek(0)
+        for line in spill:
+            key, row_id = line.rstrip("\n").split("\t")
+            grouped.setdefault(key, array("I")).append(int(row_id))
+        spill.close()
+        return grouped
+
+    def close(self, sorted_row_ids: Iterable[int]) -> Dict[str, Any]:
+        """
+        Publish the search artifacts.
+
+        Args:
+            sorted_row_ids: Row ids in lower-cased domain order (streamed from the database)
+
+        Returns:
+            The "search" section of the data manifest
+        """
+        sorted_file = _HashedFile(self.root, "sorted")
+        sorted_file.write("[")
+        for i, row_id in enumerate(sorted_row_ids):
+            sorted_file.write(("," if i else "") + str(row_id))
+        sorted_file.write("]")
+
+        trigram_paths = []
+        for i, spill in enumerate(self.postings):
+            shard = {trigram: delta_encode(ids) for trigram, ids in self._read_back(spill).items()}
+            shard_file = _HashedFile(os.path.join(self.root, "trigrams"), f"{i:03d}")
+            shard_file.write(json.dumps(shard, separators=(",", ":"), sort_keys=True))
+            trigram_paths.append(f"{self.data_dir}/trigrams/{shard_file.publish()}")
+        self.postings = []
+
+        # Written value by value so only one facet's ids and one encoded value are held
+        facets_file = _HashedFile(self.root, "facets")
+        facets_file.write("{")
+        for f, facet in enumerate(sorted(self.facets)):
+            values = self._read_back(self.facets[facet])
+            facets_file.write(("," if f else "") + json.dumps(facet) + ":{")
+            for v, value in enumerate(sorted(values)):
+                ids = values[value]
+                # A bitmap costs total/32 words; below that density an id list is smaller
+                if len(ids) * 32 >= self.total:
+                    entry = {"count": len(ids), "bitmap": encode_bitmap(ids, self.total)}
+                else:
+                    entry = {"count": len(ids), "ids": delta_encode(ids)}
+                facets_file.write(("," if v else "") + json.dumps(value) + ":"
+                                  + json.dumps(entry, separators=(",", ":"), sort_keys=True))
+            facets_file.write("}")
+        facets_file.write("}")
+        self.facets = {}
+
+        return {
+            "sorted": f"{self.data_dir}/{sorted_file.publish()}",
+            "facets": f"{self.data_dir}/{facets_file.publish()}",
+            "trigram_shard_count": self.trigram_shard_count,
+            "trigram_shards": trigram_paths,
+        }
+
+
+# Dimensions of the facet cube
+CUBE_DIMENSIONS = ["country", "grade", "pqc_supported", "tls_version", "ca_type"]
+
+
+def write_facet_cube(data_writer: DashboardDataWriter, snapshot: Snapshot) -> str:
+    """
+    Pre-aggregate the current scans over the facet dimensions and publish cube.<hash>.json.
+
+    Each cell (one combination of dimension values that occurs) stores its domain count,
+    score sum and PQC algorithm counts, so the page can produce every chart for any facet
+    filter by summing cells instead of touching rows. Cells are found with np.unique over
+    the snapshot's integer-coded columns and summed with np.bincount. The cube is written
+    column-wise (one integer array per dimension and measure) so the page loads it into
+    typed arrays.
+
+    Issuers have too many values to be a dimension, which would multiply the cells; the
+    CA chart's counts are kept per combination of the facets the page filters on
+    (SEARCH_FACETS) instead.
+
+    Returns:
+        Path of the cube file relative to the output directory
+    """
+    values = {
+        dimension: ["0", "1"] if dimension == "pqc_supported" else snapshot.values(dimension)
+        for dimension in CUBE_DIMENSIONS
+    }
+    codes = np.stack([snapshot.column(dimension).astype(np.int64) for dimension in CUBE_DIMENSIONS], axis=1)
+    keys, cell_of = np.unique(codes, axis=0, return_inverse=True)
+    cell_of = cell_of.reshape(-1)
+    cells = len(keys)
+
+    columns: Dict[str, list] = {dimension: keys[:, i].tolist() for i, dimension in enumerate(CUBE_DIMENSIONS)}
+    columns["count"] = np.bincount(cell_of, minlength=cells).tolist()
+    # Scores carry one decimal; store sums as integer tenths
+    tenths = np.round(snapshot.column("score").astype(np.float64) * 10)
+    columns["score_sum"] = np.bincount(cell_of, weights=tenths, minlength=cells).astype(np.int64).tolist()
+
+    # Flattened (cell, algorithm, count) triples; PQC cells are a small minority
+    algorithms = snapshot.values("pqc_algorithms")
+    stride = max(len(algorithms), 1)
+    pairs = cell_of[snapshot.row_of_items("pqc_algorithms")] * stride + snapshot.column("pqc_algorithms")
+    pairs, counts = np.unique(pairs, return_counts=True)
+    triples = np.stack([pairs // stride, pairs % stride, counts], axis=1)
+    columns["pqc_algorithms"] = triples.reshape(-1).tolist()
+
+    # Flattened (facet cell, issuer, count) triples over the filtered facets only
+    facet_keys, facet_of = np.unique(codes[:, [CUBE_DIMENSIONS.index(facet) for facet in SEARCH_FACETS]],
+                                     axis=0, return_inverse=True)
+    issuers = snapshot.values("issuer")
+    stride = max(len(issuers), 1)
+    pairs, counts = np.unique(facet_of.reshape(-1) * stride + snapshot.column("issuer").astype(np.int64), return_counts=True)
+    issuer_triples = np.stack([pairs // stride, pairs % stride, counts], axis=1)
+
+    cube = {
+        "dimensions": CUBE_DIMENSIONS,
+        "values": values,
+        "pqc_algorithms": algorithms,
+        "cells": cells,
+        "columns": columns,
+        "issuers": {
+            "values": issuers,
+            "cells": len(facet_keys),
+            "facets": {facet: facet_keys[:, i].tolist() for i, facet in enumerate(SEARCH_FACETS)},
+            "counts": issuer_triples.reshape(-1).tolist(),
+        },
+    }
+    path = data_writer.publish_json("cube", cube)
+    logger.info(f"Wrote facet cube with {cells} cells and issuer counts over {len(facet_keys)} facet cells")
+    return path
@@ -1,17 +1,196 @@
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from collections import Counter
+from itertools import groupby
+from types import SimpleNamespace
+from typing import Iterable, Iterator, Tuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from jinja2 import Environment, FileSystemLoader
 
 from scanner.database import get_db
-from scanner.models import ScanResult, TLSVersion, CipherSuite, Certificate, PQCInfo
+from scanner.models import Domain, ScanResult, LatestScan, Certificate, CipherSuite, PQCInfo
+from scanner.statistics import load_current_statistics, is_consistent, rebuild_statistics, split_pqc_suites
+from scanner.rollups import load_trends, rebuild_rollups
+from scanner.expiry import load_expiry
+from scanner.sampling import load_estimates
+from scanner.snapshot import ColumnarSnapshotWriter, LATEST_SCHEMA
+from generator.artifacts import DashboardDataWriter, SearchIndexWriter, write_facet_cube, swap_in_dashboard, STAGING_SUFFIX
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round trip while streaming the table
+STREAM_BATCH_SIZE = 1000
+
+
+def _grouped(rows: Iterable) -> Iterator[Tuple[int, list]]:
+    """Group (scan_result_id, value) rows that arrive clustered by scan_result_id."""
+    for scan_result_id, group in groupby(rows, key=lambda r: r[0]):
+        yield scan_result_id, [value for _, value in group]
+
+
+def iter_table_rows(db: Session) -> Iterator[SimpleNamespace]:
+    """
+    Stream the per-domain table data, newest scan first, with a fixed number of queries.
+
+    One joined projection returns the columns the template shows; cipher and PQC
+    lists come from one query each, joined to latest_scans and sorted the same way,
+    so the three cursors are merged row by row without holding any of them in memory.
+    """
+    success = LatestScan.scan_status == "SUCCESS"
+    order = (LatestScan.scan_date.desc(), LatestScan.scan_result_id.desc())
+
+    rows = (
+        db.query(
+            Domain.name.label("domain"),
+            LatestScan.scan_result_id,
+            LatestScan.grade,
+            LatestScan.score,
+            LatestScan.pqc_supported,
+            LatestScan.max_tls_version,
+            LatestScan.ca_type,
+            LatestScan.issuer,
+            LatestScan.country,
+            LatestScan.scan_date,
+            ScanResult.error_message,
+            Certificate.subject.label("cert_subject"),
+            Certificate.issuer.label("cert_issuer"),
+            Certificate.valid_from,
+            Certificate.valid_until,
+        )
+        .join(Domain, Domain.id == LatestScan.domain_id)
+        .join(ScanResult, ScanResult.id == LatestScan.scan_result_id)
+        .outerjoin(Certificate, Certificate.scan_result_id == LatestScan.config_scan_id)
+        .filter(success)
+        .order_by(*order)
+        .yield_per(STREAM_BATCH_SIZE)
+    )
+
+    ciphers = _grouped(
+        db.query(LatestScan.scan_result_id, CipherSuite.name)
+        .join(LatestScan, LatestScan.config_scan_id == CipherSuite.scan_result_id)
+        .filter(success)
+        .order_by(*order, CipherSuite.id)
+        .yield_per(STREAM_BATCH_SIZE)
+    )
+    pqc_suites = _grouped(
+        db.query(LatestScan.scan_result_id, PQCInfo.supported_suites)
+        .join(LatestScan, LatestScan.config_scan_id == PQCInfo.scan_result_id)
+        .filter(success)
+        .order_by(*order)
+        .yield_per(STREAM_BATCH_SIZE)
+    )
+
+    next_ciphers = next(ciphers, None)
+    next_pqc = next(pqc_suites, None)
+    for row in rows:
+        cipher_suites = []
+        if next_ciphers and next_ciphers[0] == row.scan_result_id:
+            cipher_suites = next_ciphers[1]
+            next_ciphers = next(ciphers, None)
+
+        pqc_algorithms = []
+        if next_pqc and next_pqc[0] == row.scan_result_id:
+            pqc_algorithms = [algo for suites in next_pqc[1] for algo in split_pqc_suites(suites)]
+            next_pqc = next(pqc_suites, None)
+
+        yield SimpleNamespace(**row._asdict(), cipher_suites=cipher_suites, pqc_algorithms=pqc_algorithms)
+
+
+def iter_row_ids_by_domain(db: Session) -> Iterator[int]:
+    """
+    Stream summary row ids (positions in iter_table_rows order) sorted by lower-cased domain.
+
+    The database numbers and sorts the rows, so the permutation never sits in memory.
+    """
+    success = LatestScan.scan_status == "SUCCESS"
+    order = (LatestScan.scan_date.desc(), LatestScan.scan_result_id.desc())
+
+    numbered = (
+        db.query(
+            Domain.name.label("name"),
+            (func.row_number().over(order_by=order) - 1).label("row_id"),
+        )
+        .join(Domain, Domain.id == LatestScan.domain_id)
+        .join(ScanResult, ScanResult.id == LatestScan.scan_result_id)
+        .filter(success)
+        .subquery()
+    )
+
+    # Byte-wise order, which is what the page's binary search compares with
+    name_key = func.lower(numbered.c.name)
+    if db.get_bind().dialect.name == "postgresql":
+        name_key = name_key.collate("C")
+
+    rows = db.query(numbered.c.row_id).order_by(name_key, numbered.c.row_id).yield_per(STREAM_BATCH_SIZE)
+    for (row_id,) in rows:
+        yield row_id
+
+
+def summarize_row(row: SimpleNamespace) -> Tuple[dict, dict]:
+    """Split a streamed table row into its summary (table, filters, charts) and details."""
+    score = float(row.score) if row.score is not None else 0.0
+
+    # Slim row for the table, filters and charts
+    summary = {
+        "domain": row.domain,
+        "grade": row.grade or "Unknown",
+        "score": round(score, 1),
+        "pqc_supported": bool(row.pqc_supported),
+        "tls_version": row.max_tls_version or "Unknown",
+        "ca_type": row.ca_type or "Unknown",
+        "issuer": row.issuer or "Unknown",  # Add issuer name
+        "country": row.country or "Unknown",
+        "timestamp": int(row.scan_date.replace(tzinfo=timezone.utc).timestamp()), # For easier date filtering
+        "pqc_algorithms": row.pqc_algorithms,
+    }
+    # Fetched by the page only when the row is opened
+    details = {
+        "error_message": row.error_message,
+        "cipher_suites": row.cipher_suites,
+        "certificate": {
+            "subject": row.cert_subject or "Unknown",
+            "issuer": row.cert_issuer or "Unknown",
+            "valid_from": row.valid_from.strftime("%Y-%m-%d") if row.valid_from else "Unknown",
+            "valid_until": row.valid_until.strftime("%Y-%m-%d") if row.valid_until else "Unknown",
+        }
+    }
+    return summary, details
+
+
+def snapshot_row(row: SimpleNamespace, summary: dict) -> dict:
+    """Columns of the latest-state snapshot for one streamed table row."""
+    return {**summary, "scan_result_id": row.scan_result_id, "cipher_suites": row.cipher_suites}
+
+
+def write_scan_data(db: Session, output_dir: str, total: int, trends: dict, expiry: dict, estimates: dict = None) -> dict:
+    """
+    Stream each domain's current scan into the summary index, detail shards and search index.
+
+    The same pass writes the columnar snapshot of the current state, staged like the
+    data and swapped in with it to output/snapshot, from which the facet cube is aggregated. The trend series, the expiry horizon and
+    the sampling estimates (if a design is stored) are published alongside.
+    """
+    writer = DashboardDataWriter(output_dir, total)
+    search = SearchIndexWriter(writer, total)
+    snapshot = ColumnarSnapshotWriter(os.path.join(output_dir, "snapshot" + STAGING_SUFFIX), LATEST_SCHEMA)
+    for row in iter_table_rows(db):
+        summary, details = summarize_row(row)
+        search.add(writer.add(summary, details), summary)
+        snapshot.add(snapshot_row(row, summary))
+
+    manifest = writer.close()
+    manifest["search"] = search.close(iter_row_ids_by_domain(db))
+    manifest["cube"] = write_facet_cube(writer, snapshot.close())
+    manifest["trends"] = writer.publish_json("trends", trends)
+    manifest["expiry"] = writer.publish_json("expiry", expiry)
+    if estimates:
+        manifest["estimates"] = writer.publish_json("estimates", estimates)
+    return manifest
+
 def generate_dashboard(output_dir: str = "output"):
     """Generate the static dashboard."""
     
@@ -27,170 +206,70 @@ def generate_dashboard(output_dir: str = "output"):
     db: Session = next(get_db())
     
     try:
-        # Fetch all successful scans
-        scans = db.query(ScanResult).filter(ScanResult.scan_status == "SUCCESS").all()
-        total_scans = len(scans)
+        # Aggregates: merge the per-day snapshots written alongside the scans
+        stats = load_current_statistics(db)
+        if not is_consistent(db, stats):
+            logger.info("Statistics snapshots are missing or stale; rebuilding from scan history")
+            rebuild_statistics(db)
+            db.commit()
+            stats = load_current_statistics(db)
+
+        # Trends: running sums over the daily rollups, replayed from history if they lag behind
+        trends = load_trends(db)
+        if (trends["all"]["domains"][-1:] or [0])[0] != stats.domains:
+            logger.info("Daily rollups are missing or stale; rebuilding from scan history")
+            rebuild_rollups(db)
+            db.commit()
+            trends = load_trends(db)
+
+        total_scans = stats.domains
         
         if total_scans == 0:
             logger.warning("No successful scans found. Dashboard will be empty.")
             return
 
-        # Aggregation variables
-        pqc_count = 0
-        total_score = 0
-        commercial_ca_count = 0
-        
-        grade_dist = Counter()
-        tls_dist = Counter()
-        pqc_algo_dist = Counter()
-        ca_dist = Counter()
-        cipher_dist = Counter()
-        geo_dist = Counter()
-        
-        all_scans_data = []
-        
-        for scan in scans:
-            # PQC Stats
-            is_pqc = False
-            if scan.pqc_info and scan.pqc_info.is_supported:
-                pqc_count += 1
-                is_pqc = True
-                # Count algorithms
-                if scan.pqc_info.supported_suites:
-                    for suite in scan.pqc_info.supported_suites.split(','):
-                        if suite.strip():
-                            pqc_algo_dist[suite.strip()] += 1
-            
-            # Score & Grade
-            if scan.scan_status == "ERROR":
-                grade = "Error"
-                score = 0.0
-            else:
-                grade = scan.grade or "Unknown"
-                score = float(scan.score) if scan.score is not None else 0.0
-            
-            total_score += score
-            grade_dist[grade] += 1
-            
-            # CA Stats
-            ca_type = "Unknown"
-            issuer_name = "Unknown"
-            if scan.certificate:
-                ca_type = scan.certificate.ca_type or "Unknown"
-                if ca_type == "COMMERCIAL_CA":
-                    commercial_ca_count += 1
-                
-                # Parse Issuer DN to get friendly name (O or CN)
-                # Format is usually <Name(CN=..., O=..., C=...)> or similar string representation
-                import re
-                issuer_str = scan.certificate.issuer
-                if issuer_str:
-                    # Try to find O=...
-                    # Handle potential escaped commas like "Cloudflare\, Inc."
-                    # We capture until we hit a comma that is NOT preceded by a backslash, or end of string
-                    # But simpler regex: just take until next comma, then clean up
-                    
-                    # Better approach: use a regex that handles optional quotes
-                    # Pattern: O=(?:")?([^",]+(?:\\.[^",]+)*)(?:")?
-                    # But let's stick to simple cleaning for now as the string format varies
-                    
-                    target = None
-                    o_match = re.search(r"O=([^,]+)", issuer_str)
-                    if o_match:
-                        target = o_match.group(1)
-                    else:
-                        cn_match = re.search(r"CN=([^,]+)", issuer_str)
-                        if cn_match:
-                            target = cn_match.group(1)
-                    
-                    if target:
-                        # Clean up: remove quotes, unescape backslashes
-                        issuer_name = target.strip().strip('"').strip("'").replace("\\", "").strip()
-                    else:
-                        issuer_name = issuer_str[:30] + "..." if len(issuer_str) > 30 else issuer_str
-            
-            # Use Issuer Name for distribution instead of generic type
-            ca_dist[issuer_name] += 1
-            
-            # TLS Stats
-            max_tls = "Unknown"
-            if scan.tls_versions:
-                supported = [v.version for v in scan.tls_versions if v.is_supported]
-                if supported:
-                    # Simple sort (works because TLS 1.3 > TLS 1.2 lexicographically)
-                    max_tls = sorted(supported)[-1]
-            tls_dist[max_tls] += 1
-            
-            # Cipher Suite Stats
-            if scan.cipher_suites:
-                for suite in scan.cipher_suites:
-                    cipher_dist[suite.name] += 1
-            
-            # GeoIP Stats
-            country = "Unknown"
-            if scan.geo_location and scan.geo_location.country_name:
-                country = scan.geo_location.country_name
-            geo_dist[country] += 1
-            
-            # Full Scan Data (for client-side filtering & details)
-            all_scans_data.append({
-                "domain": scan.domain.name,
-                "grade": grade,
-                "score": round(score, 1),
-                "pqc_supported": is_pqc,
-                "tls_version": max_tls,
-                "ca_type": ca_type,
-                "issuer": issuer_name,  # Add issuer name
-                "country": country,
-                "date": scan.scan_date.strftime("%Y-%m-%d %H:%M"),
-                "timestamp": scan.scan_date.timestamp(), # For easier date filtering
-                "details": {
-                    "error_message": scan.error_message,
-                    "pqc_algorithms": [s.strip() for s in scan.pqc_info.supported_suites.split(',')] if scan.pqc_info and scan.pqc_info.supported_suites else [],
-                    "cipher_suites": [c.name for c in scan.cipher_suites] if scan.cipher_suites else [],
-                    "certificate": {
-                        "subject": scan.certificate.subject if scan.certificate else "Unknown",
-                        "issuer": scan.certificate.issuer if scan.certificate else "Unknown",
-                        "valid_from": scan.certificate.valid_from.strftime("%Y-%m-%d") if scan.certificate else "Unknown",
-                        "valid_until": scan.certificate.valid_until.strftime("%Y-%m-%d") if scan.certificate else "Unknown",
-                    }
-                }
-            })
-        
         # Calculate averages/percentages
-        pqc_adoption_rate = round((pqc_count / total_scans) * 100, 1)
-        avg_score = round(total_score / total_scans, 1)
-        commercial_ca_rate = round((commercial_ca_count / total_scans) * 100, 1)
-        
-        # Sort by date (descending) by default
-        all_scans_data.sort(key=lambda x: x['timestamp'], reverse=True)
+        pqc_adoption_rate = round((stats.pqc_count / total_scans) * 100, 1)
+        avg_score = round(stats.score_sum / total_scans, 1)
+        commercial_ca_rate = round((stats.commercial_ca_count / total_scans) * 100, 1)
+        cipher_dist = Counter(stats.distribution("cipher"))
         
         # Prepare template context
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
         context = {
             "generation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "total_scans": total_scans,
-            "pqc_count": pqc_count,
+            "pqc_count": stats.pqc_count,
             "pqc_adoption_rate": pqc_adoption_rate,
             "avg_score": avg_score,
             "commercial_ca_rate": commercial_ca_rate,
-            "grade_distribution": dict(grade_dist),
-            "tls_distribution": dict(tls_dist),
-            "pqc_algo_distribution": dict(pqc_algo_dist),
-            "ca_distribution": dict(ca_dist),
+            "grade_distribution": stats.distribution("grade"),
+            "tls_distribution": stats.distribution("tls"),
+            "pqc_algo_distribution": stats.distribution("pqc_algo"),
+            "ca_distribution": stats.distribution("ca"),
             "cipher_distribution": dict(cipher_dist.most_common(10)),
-            "geo_distribution": dict(geo_dist),
-            "all_scans": all_scans_data
+            "geo_distribution": stats.distribution("geo"),
+            # Current state of each domain, as summary index + detail shards
+            "data_manifest": write_scan_data(
+                db, output_dir, total_scans, trends,
+                # Expiry horizon straight from the expiry index on latest_scans
+                load_expiry(db, now),
+                # Population estimates weighted by the stratified sampling design
+                load_estimates(db, now),
+            )
         }
         
-        # Render template
+        # Render template straight to disk; the page is never held in memory as a whole
         env = Environment(loader=FileSystemLoader("generator/templates"))
         template = env.get_template("index.html")
-        output_html = template.render(context)
         
-        # Write output
+        # Write output (to a temp file first, then swapped in with the staged data, so a
+        # failed build keeps the previous page and the data it points at)
         output_path = os.path.join(output_dir, "index.html")
-        with open(output_path, "w") as f:
-            f.write(output_html)
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            template.stream(context).dump(f)
+        swap_in_dashboard(output_dir, tmp_path)
             
         logger.info(f"Dashboard generated successfully at {output_path}")
         
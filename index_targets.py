@@ -0,0 +1,26 @@
+import os
+import argparse
+from scanner.loader import DomainLoader
+from scanner.target_list import build_target_list, index_path
+
+
+def index_targets(csv_path: str, output: str = None) -> str:
+    """Build the indexed target list of a Majestic Million CSV (validated and deduplicated)."""
+    output = output or index_path(csv_path)
+    with build_target_list(DomainLoader().iter_domains(csv_path), output) as targets:
+        print(f"Indexed {len(targets)} domains under {len(targets.tlds)} TLDs into {output} "
+              f"({os.path.getsize(output) / 1e6:.1f} MB)")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped target list index of a domain CSV")
+    parser.add_argument("--input", default="majestic_million.csv", help="Input CSV file path")
+    parser.add_argument("--output", help="Index file (default: next to the CSV, with a .targets extension)")
+    args = parser.parse_args()
+
+    index_targets(args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
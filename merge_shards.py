@@ -0,0 +1,36 @@
+import argparse
+import logging
+from scanner.database import get_db
+from scanner.shard_merge import merge_shards
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def run_merge(paths):
+    """Merge shard databases into the configured (SQLite) database and rebuild its aggregates."""
+    db = next(get_db())
+    try:
+        reports = merge_shards(db, paths)
+    finally:
+        db.close()
+
+    for report in reports:
+        print(f"{report.path}: {report.domains_added} domains, {report.scans_added} scans, "
+              f"{report.changes_added} configuration changes added ({report.scans_duplicate} scans already merged)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Combine the SQLite databases of sharded runs (run_scan.py --shard i/N) into the configured database"
+    )
+    parser.add_argument("shards", nargs="+", help="Shard database files, at the same schema revision as the database")
+    args = parser.parse_args()
+
+    run_merge(args.shards)
+
+
+if __name__ == "__main__":
+    main()
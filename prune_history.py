@@ -0,0 +1,32 @@
+import argparse
+from scanner.database import get_db, engine
+from scanner.retention import RetentionPolicy, DEFAULT_POLICY, run_retention, maintain_database
+
+
+def prune_history(policy: str = DEFAULT_POLICY, archive_dir: str = None, dry_run: bool = False, vacuum: bool = True):
+    db = next(get_db())
+    try:
+        plan = run_retention(db, RetentionPolicy.parse(policy), archive_dir=archive_dir, dry_run=dry_run)
+    finally:
+        db.close()
+
+    verb = "Would prune" if dry_run else "Pruned"
+    print(f"{verb} {len(plan.pruned)} of {plan.scanned} stored scans (policy: {policy})")
+    if vacuum and not dry_run:
+        maintain_database(engine, len(plan.pruned) / plan.scanned if plan.scanned else 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsample stored scan history according to a retention policy")
+    parser.add_argument("--policy", default=DEFAULT_POLICY,
+                        help=f"Comma-separated bucket:days tiers; the last may omit days to keep forever (default: {DEFAULT_POLICY})")
+    parser.add_argument("--archive-dir", help="Write pruned scans to a compressed columnar snapshot in this directory first")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many scans would be pruned")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip ANALYZE/VACUUM after pruning")
+    args = parser.parse_args()
+
+    prune_history(args.policy, args.archive_dir, args.dry_run, vacuum=not args.no_vacuum)
+
+
+if __name__ == "__main__":
+    main()
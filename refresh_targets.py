@@ -0,0 +1,42 @@
+import argparse
+from scanner.database import get_db
+from scanner.target_list import TARGET_LIST_PATH
+from scanner.target_refresh import refresh_target_list, MAJESTIC_URL
+from scanner.models import TargetListChange
+
+
+def run_refresh(url: str = MAJESTIC_URL, path: str = TARGET_LIST_PATH, show: int = 0):
+    db = next(get_db())
+    try:
+        report = refresh_target_list(db, url, path)
+        if not report.modified:
+            print(f"{path} is up to date")
+            return
+        print(f"Wrote {report.domains} domains to {path}")
+        print(f"{report.added} added, {report.removed} removed, {report.rank_shifted} rank-shifted")
+
+        if show and report.refresh_id:
+            newcomers = (
+                db.query(TargetListChange)
+                .filter(TargetListChange.refresh_id == report.refresh_id, TargetListChange.change == "added")
+                .order_by(TargetListChange.rank)
+                .limit(show)
+            )
+            for change in newcomers:
+                print(f"  + {change.rank:>8} {change.domain}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the target list if it changed and record what changed in it")
+    parser.add_argument("--url", default=MAJESTIC_URL, help="Where to download the CSV from")
+    parser.add_argument("--output", default=TARGET_LIST_PATH, help=f"Indexed target list to refresh (default: {TARGET_LIST_PATH})")
+    parser.add_argument("--show", type=int, default=0, help="Print this many of the best-ranked new entrants")
+    args = parser.parse_args()
+
+    run_refresh(args.url, args.output, show=args.show)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+from scanner.database import get_db
+from scanner.regrade import regrade
+
+
+def run_regrade(dry_run: bool = False, rebuild_trends: bool = True):
+    db = next(get_db())
+    try:
+        report = regrade(db, dry_run=dry_run, rebuild_trends=rebuild_trends)
+    finally:
+        db.close()
+
+    verb = "Would change" if dry_run else "Changed"
+    print(f"Graded {report.configurations} stored configurations ({report.weak_ciphers} weak cipher suite names)")
+    print(f"{verb} {report.changed_configurations} configurations" + ("" if dry_run else f" ({report.changed_scans} scans)"))
+    for (old, new), count in sorted(report.transitions.items()):
+        print(f"  {old} -> {new}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute grades of all stored scans with the current grading rules")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which grades would change")
+    parser.add_argument("--no-trends", action="store_true", help="Do not rebuild the daily rollups behind the trend charts")
+    args = parser.parse_args()
+
+    run_regrade(args.dry_run, rebuild_trends=not args.no_trends)
+
+
+if __name__ == "__main__":
+    main()
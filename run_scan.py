@@ -1,6 +1,15 @@
 import logging
 import sys
 from scanner.manager import ScanManager
+from scanner.database import get_db
+from scanner.target_list import TargetList, ensure_index, is_target_list, TARGET_LIST_PATH
+from scanner.scheduler import plan_scans
+from scanner.sampling import DEFAULT_STRATA, parse_strata, stratified_sample, save_design
+from scanner.target_refresh import refresh_target_list
+from scanner.daemon import ScanDaemon, DEFAULT_RATE_PER_HOUR
+from scanner.sharding import Shard
+from scanner.work_queue import QUEUE_URL, open_queue
+from scanner.queue_worker import QueueWorker
 
 # Configure logging
 logging.basicConfig(
@@ -10,6 +19,8 @@ logging.basicConfig(
 
 import argparse
 import logging
+import random
+from datetime import datetime, timezone
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +32,28 @@ logging.basicConfig(
     ]
 )
 
+def parse_rank_range(value: str):
+    """Parse FIRST-LAST (e.g. "1-10000") into (first, last)."""
+    first, _, last = value.partition("-")
+    try:
+        return int(first), int(last)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected FIRST-LAST, got {value!r}")
+
+def parse_strata_spec(value: str):
+    """argparse type for --strata."""
+    try:
+        return parse_strata(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_shard(value: str):
+    """argparse type for --shard."""
+    try:
+        return Shard.parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
 def main():
     parser = argparse.ArgumentParser(description="Run SSL/TLS and PQC Scan")
     parser.add_argument("--input", default="majestic_million.csv", help="Input CSV file path")
@@ -28,73 +61,105 @@ def main():
     parser.add_argument("--all", action="store_true", help="Scan ALL domains in the CSV (ignores --limit and --random)")
     parser.add_argument("--no-random", action="store_true", help="Disable random sampling (read from top)")
     parser.add_argument("--workers", type=int, default=5, help="Number of worker threads")
+    parser.add_argument("--ranks", type=parse_rank_range, help="Only domains ranked FIRST-LAST (e.g. 1-10000); combines with the other modes")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible random sampling")
+    parser.add_argument("--tld", help="Only domains under this TLD (e.g. jp); combines with the other modes")
+    parser.add_argument("--budget", type=int, help="Scan the BUDGET highest-priority due domains of the rescan schedule (by rank, change rate and first-seen status); overrides the other modes")
+    parser.add_argument("--strata", nargs="?", const=DEFAULT_STRATA, type=parse_strata_spec,
+                        help=f"Stratified sample: [TLD/]FIRST-LAST:SIZE,... (default design: {DEFAULT_STRATA}); overrides the other modes")
+    parser.add_argument("--daemon", action="store_true", help="Keep scanning the rescan schedule at a steady --rate until stopped (SIGINT/SIGTERM); overrides the other modes")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_HOUR, help=f"Scans started per hour in --daemon mode (default: {DEFAULT_RATE_PER_HOUR})")
+    parser.add_argument("--enqueue", action="store_true", help="Put the selected domains on the work queue instead of scanning them")
+    parser.add_argument("--worker", action="store_true", help="Scan domains leased from the work queue until it is empty; overrides the other modes")
+    parser.add_argument("--queue-url", default=QUEUE_URL,
+                        help="Work queue for --enqueue/--worker: an SQS queue URL or a database URL (default: $QUEUE_URL, else the scan database)")
+    parser.add_argument("--shard", type=parse_shard,
+                        help="Only this runner's shard INDEX/COUNT (e.g. 2/4) of the selection, by a stable hash of the domain; combine the shard databases with merge_shards.py")
     
     args = parser.parse_args()
+    if args.shard and (args.daemon or args.budget or args.worker):
+        parser.error("--shard splits list selections and --strata samples, not --daemon, --budget or --worker")
     
+    if args.worker:
+        # Workers on any number of hosts share the queue; leases of a worker that dies expire back to it
+        scanned = QueueWorker(open_queue(args.queue_url), max_workers=args.workers).run()
+        print(f"Queue drained after scanning {scanned} domains.")
+        return
+
     csv_path = args.input
-    target_csv = "scan_targets.csv"
     
-    # Check if CSV exists, if not download it (only for default majestic_million.csv)
+    # Without a local CSV, keep the indexed Majestic Million current instead (conditional download)
     import os
-    import requests
-    import random
     
     if csv_path == "majestic_million.csv" and not os.path.exists(csv_path):
-        print(f"Downloading {csv_path}...")
-        url = "http://downloads.majestic.com/majestic_million.csv"
+        csv_path = TARGET_LIST_PATH
+        print(f"Refreshing {csv_path}...")
+        db = next(get_db())
         try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            with open(csv_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print("Download complete.")
+            report = refresh_target_list(db, path=csv_path)
+            if report.modified:
+                print(f"Downloaded {report.domains} domains ({report.added} added, {report.removed} removed since the last list).")
+            else:
+                print("Target list is up to date.")
         except Exception as e:
-            print(f"Failed to download Majestic Million CSV: {e}")
-            print("Please manually place 'majestic_million.csv' in the current directory.")
-            return
-
-    # Prepare target list
-    if args.all:
-        print(f"Scanning ALL domains from {csv_path}...")
-        # Use the original CSV directly
-        final_target_csv = csv_path
-        limit = None
-    else:
-        # Sampling logic
-        if args.no_random:
-            print(f"Scanning top {args.limit} domains from {csv_path}...")
-            # We can just pass the original CSV with a limit to ScanManager, 
-            # but ScanManager.run_scan's limit applies to the loaded list.
-            # Loader reads sequentially, so limit=N means top N.
-            final_target_csv = csv_path
-            limit = args.limit
-        else:
-            print(f"Sampling {args.limit} random domains from {csv_path}...")
-            try:
-                with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    header = f.readline()
-                    lines = f.readlines()
-                    
-                if not lines:
-                    print("CSV file is empty.")
-                    return
-                    
-                sampled_lines = random.sample(lines, min(args.limit, len(lines)))
-                
-                with open(target_csv, 'w', encoding='utf-8') as f:
-                    f.write(header)
-                    f.writelines(sampled_lines)
-                    
-                print(f"Created {target_csv} with {len(sampled_lines)} domains.")
-                final_target_csv = target_csv
-                limit = args.limit # Actually limit doesn't matter here as file is already limited, but good for safety
-            except Exception as e:
-                print(f"Error processing CSV: {e}")
+            print(f"Failed to refresh the Majestic Million list: {e}")
+            if not is_target_list(csv_path):
+                print("Please manually place 'majestic_million.csv' in the current directory.")
                 return
+            print(f"Using the existing {csv_path}.")
+        finally:
+            db.close()
 
+    # Prepare target list (streamed straight into the scan; nothing is written out)
     manager = ScanManager(max_workers=args.workers)
-    manager.run_scan(final_target_csv, limit=limit)
+    loader = manager.loader
+    # Built once per CSV (and rebuilt when it changes); selections are then seeks
+    target_path = ensure_index(csv_path, loader)
+    selection = {"rank_range": args.ranks, "tld": args.tld, "shard": args.shard}
+    if args.daemon:
+        print(f"Scanning the rescan schedule of {target_path} continuously at {args.rate:g} domains/hour...")
+        # The default list is refreshed daily from Majestic; other lists as they are
+        ScanDaemon(target_path, max_workers=args.workers, rate_per_hour=args.rate,
+                   refresh=target_path == TARGET_LIST_PATH).run()
+        return
+    if args.budget:
+        print(f"Planning {args.budget} scans from the rescan schedule of {target_path}...")
+        db = next(get_db())
+        try:
+            with TargetList(target_path) as targets:
+                plan = plan_scans(db, args.budget, datetime.now(timezone.utc).replace(tzinfo=None), targets)
+        finally:
+            db.close()
+        print(f"{plan.due} domains due; scanning {len(plan.entries)} ({plan.planned_new} never scanned before).")
+        domains = plan.entries
+    elif args.strata:
+        print(f"Sampling {sum(stratum.size for stratum in args.strata)} domains across {len(args.strata)} strata from {target_path}...")
+        with TargetList(target_path) as targets:
+            domains, populations = stratified_sample(targets, args.strata, random.Random(args.seed))
+        if args.shard:
+            # Runners sharing a --seed draw the same sample, each scanning its part of it
+            domains = [entry for entry in domains if entry.domain in args.shard]
+        # The design and the draw are stored so the dashboard can weight each stratum's scans
+        db = next(get_db())
+        try:
+            save_design(db, args.strata, populations, domains, datetime.now(timezone.utc).replace(tzinfo=None))
+            db.commit()
+        finally:
+            db.close()
+    elif args.all:
+        print(f"Scanning ALL domains{f' of shard {args.shard}' if args.shard else ''} from {target_path}...")
+        domains = loader.iter_domains(target_path, **selection)
+    elif args.no_random:
+        print(f"Scanning top {args.limit} domains from {target_path}...")
+        domains = loader.iter_domains(target_path, limit=args.limit, **selection)
+    else:
+        print(f"Sampling {args.limit} random domains from {target_path}...")
+        domains = loader.iter_domains(target_path, sample=args.limit, seed=args.seed, **selection)
+
+    if args.enqueue:
+        print(f"Enqueued {open_queue(args.queue_url).put(domains)} domains.")
+        return
+    manager.run_scan(domains)
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,28 @@
-from typing import Optional
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+
+# Distinct issuers kept classified; real deployments see a few hundred
+ISSUER_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class IssuerInfo:
+    """Everything derived from a certificate issuer, computed once per distinct issuer."""
+    organization: Optional[str]
+    common_name: Optional[str]
+    display_name: str
+    ca_type: str
+
 
 class CAClassifier:
     """
     Classifies Certificate Authorities as Free or Commercial.
     """
-    
+
     # Known free CA issuers
     FREE_CAS = {
         "Let's Encrypt",
@@ -16,7 +34,7 @@ class CAClassifier:
         "R10", "R11",  # Let's Encrypt intermediates
         "E1", "E2",  # Let's Encrypt ECDSA intermediates
     }
-    
+
     # Known commercial CA issuers
     COMMERCIAL_CAS = {
         "DigiCert",
@@ -40,32 +58,115 @@ class CAClassifier:
         "Microsoft",
         "Apple",
     }
-    
+
+    # Both lists in one case-insensitive pattern. The lookahead tries every position,
+    # so overlapping names are all seen and a free CA anywhere wins, as before.
+    _MATCHER = re.compile(
+        "(?=(?:(?P<free>{})|(?P<commercial>{})))".format(
+            "|".join(re.escape(ca) for ca in sorted(FREE_CAS, key=len, reverse=True)),
+            "|".join(re.escape(ca) for ca in sorted(COMMERCIAL_CAS, key=len, reverse=True)),
+        ),
+        re.IGNORECASE,
+    )
+
+    # Attribute values in a DN string such as "<Name(C=US,O=Let's Encrypt,CN=R3)>"
+    _DN_ORGANIZATION = re.compile(r"(?:^|,)O=([^,]+)")
+    _DN_COMMON_NAME = re.compile(r"(?:^|,)CN=([^,]+)")
+
     @classmethod
     def classify(cls, issuer: str) -> str:
         """
         Classify CA based on issuer string.
-        
+
         Args:
             issuer: Certificate issuer DN string
-            
+
         Returns:
             "FREE_CA", "COMMERCIAL_CA", or "UNKNOWN"
         """
-        if not issuer:
-            return "UNKNOWN"
-        
-        issuer_upper = issuer.upper()
-        
-        # Check for free CAs
-        for ca in cls.FREE_CAS:
-            if ca.upper() in issuer_upper:
-                return "FREE_CA"
-        
-        # Check for commercial CAs
-        for ca in cls.COMMERCIAL_CAS:
-            if ca.upper() in issuer_upper:
-                return "COMMERCIAL_CA"
-        
-        # Unknown CA
-        return "UNKNOWN"
+        return cls.describe(issuer).ca_type
+
+    @classmethod
+    def display_name(cls, issuer: Optional[str]) -> str:
+        """
+        Extract a friendly issuer name (O, falling back to CN) from an issuer DN string.
+
+        Args:
+            issuer: Certificate issuer DN string, e.g. "<Name(C=US,O=Let's Encrypt,CN=R3)>"
+
+        Returns:
+            The cleaned organization/common name, or a truncated DN if neither is present
+        """
+        return cls.describe(issuer).display_name
+
+    @classmethod
+    def describe(cls, issuer: Optional[str], organization: Optional[str] = None,
+                 common_name: Optional[str] = None) -> IssuerInfo:
+        """
+        Classify and name an issuer, cached per issuer DN.
+
+        Args:
+            issuer: Certificate issuer DN string
+            organization: O of the issuer as stored at scan time (parsed from the DN if absent)
+            common_name: CN of the issuer as stored at scan time (parsed from the DN if absent)
+        """
+        return _describe(issuer or "", organization, common_name)
+
+    @staticmethod
+    def name_attributes(name: x509.Name) -> Tuple[Optional[str], Optional[str]]:
+        """(O, CN) of an x509 Name, taken from its attributes rather than its string form."""
+        def first(oid):
+            attributes = name.get_attributes_for_oid(oid)
+            return str(attributes[0].value) if attributes else None
+        return first(NameOID.ORGANIZATION_NAME), first(NameOID.COMMON_NAME)
+
+    @classmethod
+    def parse_dn(cls, issuer: str) -> Tuple[Optional[str], Optional[str]]:
+        """(O, CN) parsed from an issuer DN string, for certificates stored without them."""
+        if issuer.startswith("<Name(") and issuer.endswith(")>"):
+            issuer = issuer[len("<Name("):-len(")>")]
+        organization = cls._DN_ORGANIZATION.search(issuer)
+        common_name = cls._DN_COMMON_NAME.search(issuer)
+        return (
+            organization.group(1) if organization else None,
+            common_name.group(1) if common_name else None,
+        )
+
+    @classmethod
+    def _classify_uncached(cls, issuer: str) -> str:
+        free = commercial = False
+        for match in cls._MATCHER.finditer(issuer):
+            if match.group("free"):
+                free = True
+                break
+            commercial = True
+        if free:
+            return "FREE_CA"
+        return "COMMERCIAL_CA" if commercial else "UNKNOWN"
+
+
+def _clean(value: str) -> str:
+    # Remove quotes, unescape backslashes
+    return value.strip().strip('"').strip("'").replace("\\", "").strip()
+
+
+@lru_cache(maxsize=ISSUER_CACHE_SIZE)
+def _describe(issuer: str, organization: Optional[str], common_name: Optional[str]) -> IssuerInfo:
+    if not issuer:
+        return IssuerInfo(organization=None, common_name=None, display_name="Unknown", ca_type="UNKNOWN")
+
+    if organization is None and common_name is None:
+        organization, common_name = CAClassifier.parse_dn(issuer)
+
+    target = organization or common_name
+    if target:
+        display_name = _clean(target)
+    else:
+        display_name = issuer[:30] + "..." if len(issuer) > 30 else issuer
+
+    return IssuerInfo(
+        organization=organization,
+        common_name=common_name,
+        display_name=display_name,
+        ca_type=CAClassifier._classify_uncached(issuer),
+    )
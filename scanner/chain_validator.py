@@ -0,0 +1,236 @@
+import os
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from scanner.lru import LRUCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+# PEM bundle of trusted roots; defaults to the certifi bundle
+TRUST_STORE_PATH = os.getenv("TRUST_STORE_PATH")
+
+# Intermediate verdicts kept per process
+PATH_CACHE_SIZE = 10000
+
+# Longest chain of CA certificates followed above the leaf
+MAX_CHAIN_DEPTH = 8
+
+_EARLIEST = datetime.min.replace(tzinfo=timezone.utc)
+_LATEST = datetime.max.replace(tzinfo=timezone.utc)
+
+
+def fingerprint(cert: x509.Certificate) -> bytes:
+    """SHA-256 of the certificate's DER encoding."""
+    return cert.fingerprint(hashes.SHA256())
+
+
+def spki_hash(cert: x509.Certificate) -> bytes:
+    """SHA-256 of the certificate's SubjectPublicKeyInfo."""
+    return hashlib.sha256(cert.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )).digest()
+
+
+class TrustStore:
+    """Trusted root certificates, matched by subject and public key."""
+
+    def __init__(self, roots: List[x509.Certificate]):
+        self.by_subject: Dict[x509.Name, List[x509.Certificate]] = {}
+        self.anchors = set()
+        for root in roots:
+            self.by_subject.setdefault(root.subject, []).append(root)
+            self.anchors.add((root.subject, spki_hash(root)))
+
+    @classmethod
+    def from_pem(cls, data: bytes) -> "TrustStore":
+        return cls(x509.load_pem_x509_certificates(data))
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "TrustStore":
+        """Load a PEM bundle (TRUST_STORE_PATH, else the certifi bundle)."""
+        if path is None:
+            path = TRUST_STORE_PATH
+        if path is None:
+            import certifi
+            path = certifi.where()
+        with open(path, "rb") as f:
+            return cls.from_pem(f.read())
+
+    def is_anchor(self, cert: x509.Certificate) -> bool:
+        return (cert.subject, spki_hash(cert)) in self.anchors
+
+
+@dataclass(frozen=True)
+class PathVerdict:
+    """
+    Whether a CA certificate chains to a trust anchor, when every certificate on that
+    path is valid, and the fingerprints of the presented intermediates the path needs.
+    """
+    trusted: bool
+    not_before: datetime = _EARLIEST
+    not_after: datetime = _LATEST
+    requires: FrozenSet[bytes] = frozenset()
+
+
+_UNTRUSTED = PathVerdict(trusted=False)
+
+# A link that is fine itself but found no path upstream with the certificates one server
+# sent; another server may send the missing ones, so unlike _UNTRUSTED it is not cached
+_NO_PATH = PathVerdict(trusted=False)
+
+
+@dataclass(frozen=True)
+class ChainVerdict:
+    valid: bool
+    error: Optional[str] = None
+
+
+def hostname_matches(cert: x509.Certificate, hostname: str) -> bool:
+    """Match against the DNS SANs (CN only without SANs), with single-label wildcards."""
+    try:
+        names = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value.get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        names = [attribute.value for attribute in cert.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)]
+
+    hostname = hostname.lower().rstrip(".")
+    for name in names:
+        name = name.lower().rstrip(".")
+        if name == hostname:
+            return True
+        if name.startswith("*.") and "." in hostname and hostname.split(".", 1)[1] == name[2:]:
+            return True
+    return False
+
+
+def _is_ca(cert: x509.Certificate) -> bool:
+    try:
+        return cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+    except x509.ExtensionNotFound:
+        return False
+
+
+def _signed_by(cert: x509.Certificate, issuer: x509.Certificate) -> bool:
+    try:
+        cert.verify_directly_issued_by(issuer)
+        return True
+    except (ValueError, TypeError, InvalidSignature):
+        return False
+
+
+class ChainValidator:
+    """
+    Validates received certificate chains against a local trust store.
+
+    Per domain only the leaf is checked: validity period, hostname and its signature by
+    the issuing certificate. Whether that issuer chains to a trusted root is cached by
+    (issuer SPKI, certificate fingerprint) for every link of the path, so the few
+    intermediates shared by most sites are verified once per process. Verdicts carry
+    the validity window of their path, so the cache holds no time-dependent answers,
+    and they do not depend on which intermediates a server sent: a link is only cached
+    as untrusted for a fault of its own (not a CA, bad signature), and a trusted one
+    is only reused for chains that present the intermediates its path went through.
+    """
+
+    _shared: Optional["ChainValidator"] = None
+
+    def __init__(self, trust_store: TrustStore, cache_size: int = PATH_CACHE_SIZE):
+        self.trust_store = trust_store
+        self._cache = LRUCache(cache_size)
+
+    @classmethod
+    def shared(cls) -> "ChainValidator":
+        """The process-wide validator (loaded from the default trust store on first use)."""
+        if cls._shared is None:
+            cls._shared = cls(TrustStore.from_file())
+        return cls._shared
+
+    @classmethod
+    def shared_lookups(cls) -> Tuple[int, int]:
+        """(hits, misses) of the process-wide validator so far, (0, 0) before it is loaded."""
+        if cls._shared is None:
+            return (0, 0)
+        return (cls._shared._cache.hits, cls._shared._cache.misses)
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
+
+    def validate(self, chain: List[x509.Certificate], hostname: str, now: Optional[datetime] = None) -> ChainVerdict:
+        """
+        Validate a chain as received from the server (leaf first).
+
+        Returns:
+            ChainVerdict with the first problem found as error
+        """
+        if not chain:
+            return ChainVerdict(False, "No certificate received")
+        now = now or datetime.now(timezone.utc)
+        leaf, intermediates = chain[0], chain[1:]
+
+        if now < leaf.not_valid_before_utc:
+            return ChainVerdict(False, "Certificate not yet valid")
+        if now > leaf.not_valid_after_utc:
+            return ChainVerdict(False, "Certificate expired")
+        if not hostname_matches(leaf, hostname):
+            return ChainVerdict(False, "Hostname mismatch")
+        if self.trust_store.is_anchor(leaf):
+            return ChainVerdict(True)
+
+        presented = frozenset(fingerprint(cert) for cert in intermediates)
+        signed = False
+        for issuer in self._issuers(leaf, intermediates):
+            if not _signed_by(leaf, issuer):
+                continue
+            signed = True
+            path = self._path(issuer, intermediates, presented, 0)
+            if path.trusted and path.not_before <= now <= path.not_after:
+                return ChainVerdict(True)
+        return ChainVerdict(False, "Untrusted chain" if signed else "No valid issuer signature")
+
+    def _issuers(self, cert: x509.Certificate, intermediates: List[x509.Certificate]) -> List[x509.Certificate]:
+        """Presented and trusted certificates whose subject is the certificate's issuer."""
+        candidates = [c for c in intermediates if c.subject == cert.issuer and c is not cert]
+        candidates.extend(self.trust_store.by_subject.get(cert.issuer, []))
+        return candidates
+
+    def _path(self, cert: x509.Certificate, intermediates: List[x509.Certificate], presented: FrozenSet[bytes],
+              depth: int) -> PathVerdict:
+        """Best verdict over the issuers of a CA certificate."""
+        if self.trust_store.is_anchor(cert):
+            return PathVerdict(trusted=True)
+        if depth >= MAX_CHAIN_DEPTH:
+            return _UNTRUSTED
+
+        best = _UNTRUSTED
+        for issuer in self._issuers(cert, intermediates):
+            if fingerprint(issuer) == fingerprint(cert):
+                continue
+            key = (spki_hash(issuer), fingerprint(cert))
+            verdict = self._cache.get(key)
+            if verdict is MISSING or not verdict.requires <= presented:
+                verdict = self._verify_link(cert, issuer, intermediates, presented, depth)
+                if verdict is not _NO_PATH:
+                    self._cache.put(key, verdict)
+            if verdict.trusted and (not best.trusted or verdict.not_after > best.not_after):
+                best = verdict
+        return best
+
+    def _verify_link(self, cert: x509.Certificate, issuer: x509.Certificate, intermediates: List[x509.Certificate],
+                     presented: FrozenSet[bytes], depth: int) -> PathVerdict:
+        if not _is_ca(cert) or not _signed_by(cert, issuer):
+            return _UNTRUSTED
+        upstream = self._path(issuer, intermediates, presented, depth + 1)
+        if not upstream.trusted:
+            return _NO_PATH
+        issued_by = fingerprint(issuer)
+        return PathVerdict(
+            trusted=True,
+            not_before=max(cert.not_valid_before_utc, upstream.not_before),
+            not_after=min(cert.not_valid_after_utc, upstream.not_after),
+            # Trust store certificates are always at hand
+            requires=upstream.requires | {issued_by} if issued_by in presented else upstream.requires,
+        )
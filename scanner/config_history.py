@@ -0,0 +1,208 @@
+import json
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from scanner.models import Domain, ScanResult, Certificate, PQCInfo, ConfigChange
+from scanner.latest_scan import _naive_utc
+
+logger = logging.getLogger(__name__)
+
+# Child relationships of ScanResult that make up a configuration (the location is per IP, not part of it)
+COMPONENTS = ("tls_versions", "cipher_suites", "certificate", "pqc_info")
+
+# Columns that identify a stored row rather than describe the configuration
+_ROW_COLUMNS = ("id", "scan_result_id")
+
+# Columns derived from what the server presented (parsed issuer names, weak-cipher and CA
+# classifications, chain validity); they change when the classifiers, the trust store or
+# the clock do, e.g. on regrade or a certifi update, not with the server
+_DERIVED_COLUMNS = ("issuer_organization", "issuer_common_name", "is_weak", "ca_type", "is_valid")
+
+# Columns reported as "changed" rather than with their old and new values
+_OPAQUE_COLUMNS = ("certificate_pem",)
+
+
+def _canonical_value(value: Any) -> Any:
+    """Normalize a column value so in-memory and stored rows hash and compare alike."""
+    if isinstance(value, datetime):
+        return _naive_utc(value).isoformat()
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 6)
+    return value
+
+
+def _row_values(row) -> Dict[str, Any]:
+    return {
+        column.key: _canonical_value(getattr(row, column.key))
+        for column in row.__table__.columns
+        if column.key not in _ROW_COLUMNS and column.key not in _DERIVED_COLUMNS
+    }
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Configuration:
+    """The child rows of a scan that describe the server's configuration."""
+    tls_versions: list
+    cipher_suites: list
+    certificate: Optional[Certificate]
+    pqc_info: Optional[PQCInfo]
+
+    @classmethod
+    def of_scan(cls, scan_result: ScanResult) -> "Configuration":
+        return cls(
+            tls_versions=list(scan_result.tls_versions),
+            cipher_suites=list(scan_result.cipher_suites),
+            certificate=scan_result.certificate,
+            pqc_info=scan_result.pqc_info,
+        )
+
+    def canonical(self) -> Dict[str, Any]:
+        """Order-independent, JSON-serializable form of every component."""
+        canonical = {}
+        for name in COMPONENTS:
+            value = getattr(self, name)
+            if isinstance(value, list):
+                canonical[name] = sorted((_row_values(row) for row in value), key=_digest)
+            else:
+                canonical[name] = _row_values(value) if value is not None else None
+        return canonical
+
+    def detach(self, scan_result: ScanResult):
+        """Remove the child rows from scan_result so they are not inserted with it."""
+        scan_result.tls_versions = []
+        scan_result.cipher_suites = []
+        scan_result.certificate = None
+        scan_result.pqc_info = None
+
+
+def config_hash(component_hashes: Dict[str, str]) -> str:
+    """Hash of a whole configuration from its component hashes."""
+    return _digest(component_hashes)
+
+
+def diff_configurations(old: Dict[str, Any], new: Dict[str, Any], components: List[str]) -> Dict[str, Any]:
+    """
+    Describe what changed in the given components between two canonical configurations.
+
+    Versions and cipher suites are reported as added/removed names; single rows as
+    {column: [old, new]} for the columns that differ.
+    """
+    details: Dict[str, Any] = {}
+    for name in components:
+        if name == "tls_versions":
+            before = {row["version"] for row in old[name] if row["is_supported"]}
+            after = {row["version"] for row in new[name] if row["is_supported"]}
+            details[name] = {"added": sorted(after - before), "removed": sorted(before - after)}
+        elif name == "cipher_suites":
+            before = {row["name"] for row in old[name]}
+            after = {row["name"] for row in new[name]}
+            details[name] = {"added": sorted(after - before), "removed": sorted(before - after)}
+        else:
+            before, after = old[name] or {}, new[name] or {}
+            changed = {}
+            for column in sorted(set(before) | set(after)):
+                if before.get(column) != after.get(column):
+                    changed[column] = "changed" if column in _OPAQUE_COLUMNS else [before.get(column), after.get(column)]
+            details[name] = changed
+    return details
+
+
+def current_change(db: Session, domain_id: int, at: datetime) -> Optional[ConfigChange]:
+    """The change-log entry describing a domain's configuration at the given time."""
+    return (
+        db.query(ConfigChange)
+        .filter(
+            ConfigChange.domain_id == domain_id,
+            ConfigChange.changed_at <= at,
+            # Entries whose scan was pruned no longer have rows to reference
+            ConfigChange.scan_result_id.isnot(None),
+        )
+        .order_by(ConfigChange.changed_at.desc(), ConfigChange.id.desc())
+        .first()
+    )
+
+
+def store_configuration(db: Session, domain: Domain, scan_result: ScanResult) -> Configuration:
+    """
+    Store a new scan as a reference to the domain's current configuration if it is unchanged.
+
+    Must be called before scan_result is added to the session. An unchanged scan gets
+    config_scan_id pointing at the scan holding the configuration and its child rows are
+    detached, so none are inserted. A changed (or first) configuration keeps its child
+    rows and is recorded in config_changes. A stored hash that no longer matches its own
+    rows (hashed before derived columns were left out) is refreshed before comparing.
+
+    Returns:
+        The scan's configuration (still usable after the child rows were detached)
+    """
+    configuration = Configuration.of_scan(scan_result)
+    if scan_result.scan_status != "SUCCESS":
+        return configuration
+
+    canonical = configuration.canonical()
+    hashes = {name: _digest(value) for name, value in canonical.items()}
+    scan_result.config_hash = config_hash(hashes)
+
+    scan_date = _naive_utc(scan_result.scan_date)
+    previous = current_change(db, domain.id, scan_date)
+    previous_canonical = None
+    if previous is not None and previous.config_hash != scan_result.config_hash:
+        previous_scan = db.get(ScanResult, previous.scan_result_id)
+        previous_canonical = Configuration.of_scan(previous_scan).canonical()
+        previous_hashes = {name: _digest(value) for name, value in previous_canonical.items()}
+        if config_hash(previous_hashes) != previous.config_hash:
+            previous.config_hash = previous_scan.config_hash = config_hash(previous_hashes)
+            previous.component_hashes = json.dumps(previous_hashes, sort_keys=True)
+
+    if previous is not None and previous.config_hash == scan_result.config_hash:
+        scan_result.config_scan_id = previous.scan_result_id
+        configuration.detach(scan_result)
+        return configuration
+
+    changed: List[str] = []
+    details = None
+    if previous is not None:
+        previous_hashes = json.loads(previous.component_hashes)
+        changed = [name for name in COMPONENTS if previous_hashes.get(name) != hashes[name]]
+        details = json.dumps(diff_configurations(previous_canonical, canonical, changed))
+
+    db.add(ConfigChange(
+        domain_id=domain.id,
+        scan_result=scan_result,
+        previous_scan_id=previous.scan_result_id if previous is not None else None,
+        changed_at=scan_date,
+        config_hash=scan_result.config_hash,
+        component_hashes=json.dumps(hashes, sort_keys=True),
+        changed_components=",".join(changed),
+        details=details,
+    ))
+    return configuration
+
+
+def changes_since(db: Session, since: datetime, domain_name: Optional[str] = None, include_first: bool = False):
+    """
+    Query the change log for changes at or after since, newest first.
+
+    Args:
+        since: Start of the period
+        domain_name: Restrict to one domain
+        include_first: Also return the first configuration recorded for each domain
+    """
+    query = (
+        db.query(ConfigChange, Domain.name)
+        .join(Domain, Domain.id == ConfigChange.domain_id)
+        .filter(ConfigChange.changed_at >= since)
+    )
+    if domain_name:
+        query = query.filter(Domain.name == domain_name)
+    if not include_first:
+        query = query.filter(ConfigChange.changed_components != "")
+    return query.order_by(ConfigChange.changed_at.desc(), ConfigChange.id.desc())
@@ -0,0 +1,197 @@
+import signal
+import logging
+import threading
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from functools import partial
+from typing import Dict, List, Tuple
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
+from scanner.database import get_db
+from scanner.loader import DomainEntry
+from scanner.manager import ScanManager, process_domain_with_lookups, IN_FLIGHT_PER_WORKER, SAVE_BATCH_SIZE
+from scanner.models import ScanResult
+from scanner.scheduler import due_entries, sync_schedule
+from scanner.target_list import TargetList
+from scanner.target_refresh import refresh_target_list
+from scanner.geo_enrichment import enrich_locations
+
+logger = logging.getLogger(__name__)
+
+# Scans started per hour by default (24,000 a day)
+DEFAULT_RATE_PER_HOUR = 1000
+
+# How often the due queue is drained into the worker pool
+DRAIN_INTERVAL_SECONDS = 60
+
+# How often finished scans are saved, folding them into statistics and rollups
+FLUSH_INTERVAL_SECONDS = 300
+
+# How often new scan IPs are located
+ENRICH_INTERVAL_SECONDS = 3600
+
+# How often the target list is refreshed and the schedule synced with it
+SYNC_INTERVAL_HOURS = 24
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _ignore_interrupts():
+    # Workers leave Ctrl-C to the daemon, which lets their scans finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ScanDaemon:
+    """
+    Scans continuously at a steady rate instead of in a nightly burst.
+
+    The worker pool (with each worker's DNS, chain validation and GeoIP state), the
+    target list map and the scheduler stay up between jobs, so startup is paid once.
+    Every DRAIN_INTERVAL_SECONDS the daemon tops the pool up from the rescan schedule
+    (scanner.scheduler) with as many due domains as the rate allows; finished scans
+    are saved every FLUSH_INTERVAL_SECONDS (or once SAVE_BATCH_SIZE are waiting).
+    Jobs run one at a time on a single thread, so they never contend for the database.
+    """
+
+    def __init__(self, target_path: str, max_workers: int = 5, rate_per_hour: float = DEFAULT_RATE_PER_HOUR,
+                 refresh: bool = False):
+        self.target_path = target_path
+        self.rate_per_hour = rate_per_hour
+        # Only the default Majestic list has a download to refresh from
+        self.refresh = refresh
+        self.manager = ScanManager(max_workers=max_workers)
+        self.window = max_workers * IN_FLIGHT_PER_WORKER
+        self.executor = None
+        self.lock = threading.Lock()
+        # Submitted, and finished but not yet saved: both are skipped when planning
+        self.in_flight: Dict[str, DomainEntry] = {}
+        self.finished: List[Tuple[DomainEntry, ScanResult]] = []
+        # Scans the rate allows that have not been started yet
+        self.credit = 0.0
+        self.cache_hits = self.cache_misses = 0
+        self.saved = 0
+
+        self.scheduler = BlockingScheduler(
+            executors={"default": ThreadPoolExecutor(1)},
+            job_defaults={"coalesce": True, "max_instances": 1},
+            timezone="UTC",
+        )
+
+    def run(self):
+        """Run until SIGINT or SIGTERM, then finish the scans in flight and save them."""
+        self._start_pool()
+        now = datetime.now(timezone.utc)
+        self.scheduler.add_job(self.sync, "interval", hours=SYNC_INTERVAL_HOURS, next_run_time=now)
+        self.scheduler.add_job(self.drain, "interval", seconds=DRAIN_INTERVAL_SECONDS, next_run_time=now)
+        self.scheduler.add_job(self.flush, "interval", seconds=FLUSH_INTERVAL_SECONDS)
+        self.scheduler.add_job(self.enrich, "interval", seconds=ENRICH_INTERVAL_SECONDS)
+        signal.signal(signal.SIGTERM, lambda *_: self.scheduler.shutdown(wait=False))
+        # A line per job run every minute would drown the scan log
+        logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+        logger.info(f"Scan daemon started: {self.rate_per_hour:g} scans/hour, {self.manager.max_workers} workers")
+        try:
+            self.scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            if self.scheduler.running:
+                self.scheduler.shutdown(wait=False)
+            logger.info(f"Stopping; waiting for {len(self.in_flight)} scans in flight")
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.flush()
+            logger.info(f"Scan daemon stopped after saving {self.saved} scans")
+
+    def _start_pool(self):
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.manager.max_workers,
+                                                               initializer=_ignore_interrupts)
+
+    def _submit(self, entry: DomainEntry) -> concurrent.futures.Future:
+        """Submit a scan, replacing the pool once if a worker died (OOM, a crash in the TLS library) and broke it."""
+        try:
+            return self.executor.submit(process_domain_with_lookups, entry)
+        except BrokenProcessPool:
+            logger.error("Worker pool broken by a dead worker; starting a new one")
+            # The broken pool's futures fail with BrokenProcessPool and leave in_flight in _finished
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self._start_pool()
+            return self.executor.submit(process_domain_with_lookups, entry)
+
+    def sync(self):
+        """Refresh the target list (conditional download) and sync the schedule with it."""
+        db = next(get_db())
+        try:
+            if self.refresh:
+                try:
+                    refresh_target_list(db, path=self.target_path)
+                except Exception as e:
+                    logger.error(f"Target list refresh failed, keeping the current list: {e}")
+            with TargetList(self.target_path) as targets:
+                sync_schedule(db, targets, _utcnow())
+            db.commit()
+        finally:
+            db.close()
+
+    def drain(self):
+        """Start as many of the highest-priority due domains as the rate has earned since the last drain."""
+        self.credit = min(self.credit + self.rate_per_hour * DRAIN_INTERVAL_SECONDS / 3600, self.window)
+        with self.lock:
+            wanted = min(int(self.credit), self.window - len(self.in_flight))
+            skipped = set(self.in_flight) | {entry.domain for entry, _ in self.finished}
+            waiting = len(self.finished)
+
+        if wanted > 0:
+            db = next(get_db())
+            try:
+                # Domains in flight or waiting to be saved are still due; read past them
+                entries = due_entries(db, wanted + len(skipped), _utcnow())
+            finally:
+                db.close()
+            for entry in [entry for entry in entries if entry.domain not in skipped][:wanted]:
+                future = self._submit(entry)
+                # Registered only once submitted; the callback runs after this at the earliest
+                with self.lock:
+                    self.in_flight[entry.domain] = entry
+                future.add_done_callback(partial(self._finished, entry))
+                self.credit -= 1
+
+        if waiting >= SAVE_BATCH_SIZE:
+            self.flush()
+
+    def _finished(self, entry: DomainEntry, future: concurrent.futures.Future):
+        # Runs on the pool's management thread
+        if future.cancelled() or isinstance(future.exception(), BrokenProcessPool):
+            # Not scanned: the domain stays due for the next drain
+            with self.lock:
+                del self.in_flight[entry.domain]
+            return
+        result, hits, misses = self.manager.result_of(entry, future)
+        with self.lock:
+            del self.in_flight[entry.domain]
+            self.finished.append((entry, result))
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def flush(self):
+        """Save finished scans; their statistics, rollups and next due times follow."""
+        with self.lock:
+            results, self.finished = self.finished, []
+            in_flight = len(self.in_flight)
+            lookups = self.cache_hits + self.cache_misses
+            hit_rate = self.cache_hits / lookups if lookups else 0.0
+        if results:
+            self.manager.save_results(results)
+            self.saved += len(results)
+        logger.info(f"Saved {len(results)} scans ({self.saved} since start), {in_flight} in flight, "
+                    f"chain cache hit rate {hit_rate:.1%}")
+
+    def enrich(self):
+        """Locate the IPs of new scans with the process's GeoIP resolver."""
+        db = next(get_db())
+        try:
+            enrich_locations(db)
+        finally:
+            db.close()
@@ -1,88 +1,46 @@
 import logging
-import json
-import os
-import csv
-import boto3
-from botocore.exceptions import ClientError
-import itertools
+from scanner.loader import DomainLoader
+from scanner.target_list import TARGET_LIST_PATH
+from scanner.work_queue import QUEUE_URL, open_queue
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-sqs = boto3.resource('sqs')
-queue_url = os.getenv("QUEUE_URL")
+loader = DomainLoader()
 
 def handler(event, context):
     """
     Dispatcher handler.
-    Input event: {"limit": 100, "offset": 0, "csv_path": "majestic_million.csv"}
+    Input event: {"limit": 100, "offset": 0, "target_list": "majestic_million.targets",
+                  "ranks": [1, 10000], "tld": "jp"}
+    "ranks" and "tld" are optional; "csv_path" is still accepted for a plain CSV.
+    Domains go to the queue at QUEUE_URL: SQS, or a database queue (scanner.work_queue).
     """
     limit = event.get("limit", 100)
     offset = event.get("offset", 0)
-    csv_path = event.get("csv_path", "majestic_million.csv")
+    path = event.get("target_list") or event.get("csv_path") or TARGET_LIST_PATH
+    rank_range = tuple(event["ranks"]) if event.get("ranks") else None
+    tld = event.get("tld")
     
-    if not queue_url:
+    if not QUEUE_URL:
         logger.error("QUEUE_URL environment variable not set")
         return {"statusCode": 500, "body": "QUEUE_URL not set"}
         
-    queue = sqs.Queue(queue_url)
+    queue = open_queue(QUEUE_URL)
     
-    logger.info(f"Dispatching {limit} domains from {csv_path} starting at {offset}")
+    logger.info(f"Dispatching {limit} domains from {path} starting at {offset}")
     
     sent_count = 0
     
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            # Skip header
-            next(reader, None)
-            
-            # Skip offset
-            # itertools.islice is efficient
-            start_index = offset
-            end_index = offset + limit
-            
-            # Create an iterator for the slice
-            target_rows = itertools.islice(reader, start_index, end_index)
-            
-            batch = []
-            for row in target_rows:
-                if len(row) < 3:
-                    continue
-                    
-                try:
-                    rank = int(row[0])
-                    domain = row[2]
-                    tld = row[3]
-                    
-                    message = {
-                        "rank": rank,
-                        "domain": domain,
-                        "tld": tld
-                    }
-                    
-                    batch.append({
-                        'Id': str(rank),
-                        'MessageBody': json.dumps(message)
-                    })
-                    
-                    if len(batch) == 10:
-                        queue.send_message_batch(Entries=batch)
-                        sent_count += len(batch)
-                        batch = []
-                        
-                except ValueError:
-                    continue
-            
-            # Send remaining
-            if batch:
-                queue.send_message_batch(Entries=batch)
-                sent_count += len(batch)
+        # An indexed target list seeks straight to the slice instead of parsing the rows before it
+        domains = loader.iter_domains(path, limit=limit, offset=offset, rank_range=rank_range, tld=tld)
+        sent_count = queue.put(domains)
                 
     except FileNotFoundError:
-        logger.error(f"CSV file not found: {csv_path}")
-        return {"statusCode": 500, "body": "CSV file not found"}
+        logger.error(f"Target list not found: {path}")
+        return {"statusCode": 500, "body": "Target list not found"}
     except Exception as e:
         logger.error(f"Error dispatching domains: {e}")
         return {"statusCode": 500, "body": str(e)}
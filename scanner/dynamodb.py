@@ -7,6 +7,7 @@ import json
 from typing import Any
 
 from scanner.models import ScanResult
+from scanner.geoip import GeoIPResolver
 
 logger = logging.getLogger(__name__)
 
@@ -80,13 +81,15 @@ class DynamoDBManager:
                 for c in result.cipher_suites
             ]
 
-        # Geo Location
-        if result.geo_location:
+        # Geo Location (no enrichment stage runs for DynamoDB, so resolve here with the cached resolver)
+        item["ip_address"] = result.ip_address
+        geo_location = GeoIPResolver.shared().lookup(result.ip_address) if result.ip_address else None
+        if geo_location:
             item["geo_location"] = {
-                "country_code": result.geo_location.country_code,
-                "country_name": result.geo_location.country_name,
-                "city": result.geo_location.city,
-                "ip_address": result.geo_location.ip_address
+                "country_code": geo_location.country_code,
+                "country_name": geo_location.country_name,
+                "city": geo_location.city,
+                "ip_address": geo_location.ip_address
             }
 
         # Remove None values (DynamoDB doesn't like them sometimes, or just cleaner)
@@ -0,0 +1,92 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from scanner.models import Domain, LatestScan
+
+logger = logging.getLogger(__name__)
+
+# Weeks shown on the expiry horizon, besides "expired" and "later"
+HORIZON_WEEKS = 13
+
+# Domains listed as expiring soonest on the dashboard
+SOONEST_LIMIT = 25
+
+
+def week_of(value: datetime) -> datetime:
+    """Monday 00:00 of the week a (naive UTC) datetime falls in: the expiry bucket."""
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+
+def horizon_end(now: datetime, weeks: int = HORIZON_WEEKS) -> datetime:
+    """Start of the first week past the horizon."""
+    return week_of(now) + timedelta(weeks=weeks)
+
+
+def expiring_between(db: Session, start: Optional[datetime], end: datetime, limit: Optional[int] = None):
+    """
+    Domains whose current certificate expires in [start, end), soonest first.
+
+    A range scan on ix_latest_scans_valid_until; start=None includes everything already expired.
+
+    Returns:
+        Query of (domain name, valid_until, issuer, ca_type, grade)
+    """
+    query = (
+        db.query(Domain.name, LatestScan.valid_until, LatestScan.issuer, LatestScan.ca_type, LatestScan.grade)
+        .join(Domain, Domain.id == LatestScan.domain_id)
+        .filter(LatestScan.valid_until < end)
+    )
+    if start is not None:
+        query = query.filter(LatestScan.valid_until >= start)
+    query = query.order_by(LatestScan.valid_until, Domain.name)
+    return query.limit(limit) if limit else query
+
+
+def expiry_horizon(db: Session, now: datetime, weeks: int = HORIZON_WEEKS) -> Dict[str, Any]:
+    """
+    Count current certificates by expiry week, from the expiry index alone.
+
+    Returns:
+        {"expired": n, "weeks": [[week start, n], ...] for the next weeks weeks (this one
+        first), "later": n} where every count covers certificates not yet expired at now
+    """
+    this_week = week_of(now)
+    end = horizon_end(now, weeks)
+
+    expired = db.query(func.count()).select_from(LatestScan).filter(LatestScan.valid_until < now).scalar()
+    later = db.query(func.count()).select_from(LatestScan).filter(LatestScan.valid_until >= end).scalar()
+
+    counts = dict(
+        db.query(LatestScan.expiry_week, func.count())
+        .filter(LatestScan.expiry_week >= this_week, LatestScan.expiry_week < end, LatestScan.valid_until >= now)
+        .group_by(LatestScan.expiry_week)
+    )
+    return {
+        "expired": expired,
+        "weeks": [[week, counts.get(week, 0)] for week in (this_week + timedelta(weeks=i) for i in range(weeks))],
+        "later": later,
+    }
+
+
+def load_expiry(db: Session, now: datetime, weeks: int = HORIZON_WEEKS, soonest: int = SOONEST_LIMIT) -> Dict[str, Any]:
+    """Expiry horizon plus the soonest-expiring domains, JSON-serializable for the dashboard."""
+    horizon = expiry_horizon(db, now, weeks)
+    return {
+        "generated_at": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "expired": horizon["expired"],
+        "later": horizon["later"],
+        "weeks": [[week.strftime("%Y-%m-%d"), count] for week, count in horizon["weeks"]],
+        "soonest": [
+            {
+                "domain": name,
+                "valid_until": valid_until.strftime("%Y-%m-%d"),
+                "issuer": issuer or "Unknown",
+                "ca_type": ca_type or "Unknown",
+                "grade": grade or "N/A",
+            }
+            for name, valid_until, issuer, ca_type, grade in expiring_between(db, now, horizon_end(now, weeks), limit=soonest)
+        ],
+    }
@@ -0,0 +1,137 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import Table, Column, String, MetaData, select, delete, or_
+from sqlalchemy.orm import Session
+from scanner.models import Domain, ScanResult, GeoLocation, LatestScan
+from scanner.geoip import GeoIPResolver
+from scanner.latest_scan import LatestScanChange, HOT_FIELDS
+from scanner.statistics import DailyStatisticsWriter
+from scanner.rollups import DailyRollupWriter, rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# IPs resolved and written per batch
+RESOLVE_CHUNK_SIZE = 5000
+
+_LOCATION_FIELDS = ("country_code", "country_name", "region", "city", "latitude", "longitude")
+
+
+@dataclass
+class EnrichmentReport:
+    database_build: Optional[datetime] = None
+    # Distinct IPs without a location, or located with an older database
+    resolved_ips: int = 0
+    # Of those, IPs the database has a location for
+    located_ips: int = 0
+    # Domains whose current country changed
+    changed_domains: int = 0
+
+
+def _pending_ips(db: Session, database_build: datetime, refresh: bool) -> List[str]:
+    """Distinct scanned IPs whose location is missing or stale (every IP with refresh)."""
+    query = (
+        db.query(ScanResult.ip_address)
+        .outerjoin(GeoLocation, GeoLocation.ip_address == ScanResult.ip_address)
+        .filter(ScanResult.ip_address.isnot(None))
+    )
+    if not refresh:
+        query = query.filter(or_(
+            GeoLocation.id.is_(None),
+            GeoLocation.database_build.is_(None),
+            GeoLocation.database_build < database_build,
+        ))
+    return [ip_address for (ip_address,) in query.distinct()]
+
+
+def _store_locations(db: Session, ips: Table, resolver: GeoIPResolver, pending: List[str], database_build: datetime) -> int:
+    """Replace the locations of the pending IPs, a chunk at a time; returns how many were found."""
+    locations = GeoLocation.__table__
+    located = 0
+    for start in range(0, len(pending), RESOLVE_CHUNK_SIZE):
+        chunk = pending[start:start + RESOLVE_CHUNK_SIZE]
+        db.execute(ips.insert(), [{"ip_address": ip_address} for ip_address in chunk])
+
+        rows = []
+        for ip_address, location in resolver.resolve_many(chunk).items():
+            # IPs missing from the database get an empty row, so they count as resolved
+            row = {field: getattr(location, field) if location else None for field in _LOCATION_FIELDS}
+            row.update(ip_address=ip_address, database_build=database_build)
+            rows.append(row)
+            located += location is not None
+
+        db.execute(delete(locations).where(locations.c.ip_address.in_(chunk)))
+        db.execute(locations.insert(), rows)
+    return located
+
+
+def _update_current_countries(db: Session, ips: Table) -> int:
+    """
+    Move the country hot field of domains whose current scan used a re-resolved IP,
+    folding the moves into the statistics and rollups of the scan's day.
+    """
+    rows = (
+        db.query(LatestScan, Domain.tld, GeoLocation.country_name)
+        .join(ScanResult, ScanResult.id == LatestScan.scan_result_id)
+        .join(Domain, Domain.id == LatestScan.domain_id)
+        .join(GeoLocation, GeoLocation.ip_address == ScanResult.ip_address)
+        .filter(ScanResult.ip_address.in_(select(ips.c.ip_address)))
+        .filter(LatestScan.country.is_distinct_from(GeoLocation.country_name))
+        .all()
+    )
+
+    statistics = DailyStatisticsWriter(db)
+    rollups = DailyRollupWriter(db)
+    for latest, tld, country in rows:
+        previous = {key: getattr(latest, key) for key in HOT_FIELDS}
+        latest.country = country
+        change = LatestScanChange(domain_id=latest.domain_id, previous=previous, current=dict(previous, country=country))
+        statistics.record_hot_fields(change)
+        rollups.record(change, tld)
+    statistics.flush()
+    rollups.flush()
+    return len(rows)
+
+
+def enrich_locations(db: Session, resolver: Optional[GeoIPResolver] = None, refresh: bool = False,
+                     rebuild_trends: bool = False) -> EnrichmentReport:
+    """
+    Fill geo_locations for every scanned IP that has no location yet, or one resolved
+    with an older GeoLite2 build, then update the current country of affected domains.
+
+    Each distinct IP is looked up once however many scans used it. Commits.
+
+    Args:
+        resolver: Resolver to use (the process-wide one by default)
+        refresh: Re-resolve every scanned IP, not only missing and stale ones
+        rebuild_trends: Replay history into daily_rollups, so past days use the new
+            locations too (without it only the current state moves)
+    """
+    resolver = resolver or GeoIPResolver.shared()
+    report = EnrichmentReport(database_build=resolver.database_build)
+    if report.database_build is None:
+        logger.warning("No GeoIP database available; skipping location enrichment")
+        return report
+
+    pending = _pending_ips(db, report.database_build, refresh)
+    report.resolved_ips = len(pending)
+    if not pending:
+        return report
+
+    ips = Table(
+        "enrichment_ips", MetaData(),
+        Column("ip_address", String(45), primary_key=True),
+        prefixes=["TEMPORARY"],
+    )
+    ips.create(db.connection())
+    report.located_ips = _store_locations(db, ips, resolver, pending, report.database_build)
+    report.changed_domains = _update_current_countries(db, ips)
+    ips.drop(db.connection())
+
+    if rebuild_trends:
+        rebuild_rollups(db)
+    db.commit()
+    logger.info(f"Resolved {report.resolved_ips} IPs ({report.located_ips} located); "
+                f"{report.changed_domains} domains changed country")
+    return report
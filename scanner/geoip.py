@@ -1,24 +1,120 @@
 import geoip2.database
+import geoip2.errors
 import logging
+import maxminddb
 import os
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
 from scanner.models import GeoLocation
+from scanner.lru import LRUCache, MISSING
 import socket
 
 logger = logging.getLogger(__name__)
 
+# GeoLite2 City database location
+GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH", "./data/GeoLite2-City.mmdb")
+
+# How the database is opened: "mmap" (shared pages, C extension when available) or "memory"
+GEOIP_MODE = os.getenv("GEOIP_MODE", "mmap")
+
+# Distinct IPs and /24 blocks kept resolved per process
+GEOIP_CACHE_SIZE = 50000
+
+# IPv4 lookups are cached per /24 when the database record covers the whole block
+BLOCK_PREFIX = 24
+
+
+def _reader_mode(mode: str) -> int:
+    if mode == "memory":
+        return maxminddb.MODE_MEMORY
+    if mode != "mmap":
+        raise ValueError(f"Unknown GEOIP_MODE {mode!r} (expected 'mmap' or 'memory')")
+    try:
+        from maxminddb import extension  # noqa: F401
+        return maxminddb.MODE_MMAP_EXT
+    except ImportError:
+        return maxminddb.MODE_MMAP
+
+
+def _block(ip_address: str) -> Optional[str]:
+    """Cache key of the /24 around a dotted IPv4 address ("192.0.2"), None for IPv6."""
+    if ":" in ip_address:
+        return None
+    return ip_address.rpartition(".")[0]
+
+
 class GeoIPResolver:
-    def __init__(self, db_path: str = "./data/GeoLite2-City.mmdb"):
+    """
+    Resolves IP addresses to locations with the GeoLite2 City database.
+
+    Lookups go through a bounded LRU keyed by IP, or by /24 for IPv4 addresses whose
+    database network spans the block, so the thousands of sites behind the same CDN
+    ranges cost one database read. Use shared() for the process-wide instance.
+    """
+
+    _shared: Optional["GeoIPResolver"] = None
+
+    def __init__(self, db_path: str = GEOIP_DB_PATH, mode: str = GEOIP_MODE, cache_size: int = GEOIP_CACHE_SIZE):
         self.db_path = db_path
         self.reader = None
+        self._cache = LRUCache(cache_size)
         if os.path.exists(db_path):
             try:
-                self.reader = geoip2.database.Reader(db_path)
+                self.reader = geoip2.database.Reader(db_path, mode=_reader_mode(mode))
             except Exception as e:
                 logger.error(f"Failed to open GeoIP database: {e}")
         else:
             logger.warning(f"GeoIP database not found at {db_path}. GeoIP resolution will be disabled.")
 
+    @classmethod
+    def shared(cls) -> "GeoIPResolver":
+        """The process-wide resolver (opened on first use and kept open)."""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
+
+    @property
+    def database_build(self) -> Optional[datetime]:
+        """Build time of the open database (naive UTC), None without one."""
+        if not self.reader:
+            return None
+        return datetime.fromtimestamp(self.reader.metadata().build_epoch, timezone.utc).replace(tzinfo=None)
+
+    def lookup(self, ip_address: str) -> Optional[GeoLocation]:
+        """Location of an IP address, or None if it is invalid or not in the database."""
+        if not self.reader:
+            return None
+
+        # Blocks and addresses share the cache; a block key has one dot less
+        block = _block(ip_address)
+        fields = self._cache.get_first((block, ip_address) if block else (ip_address,))
+        if fields is MISSING:
+            fields, network = self._read(ip_address)
+            # Without a network the read failed (e.g. an invalid address); nothing to cache
+            if network is not None:
+                covers_block = block is not None and network.prefixlen <= BLOCK_PREFIX
+                self._cache.put(block if covers_block else ip_address, fields)
+        if fields is None:
+            return None
+
+        country_code, country_name, region, city, latitude, longitude = fields
+        return GeoLocation(
+            ip_address=ip_address,
+            country_code=country_code,
+            country_name=country_name,
+            region=region,
+            city=city,
+            latitude=latitude,
+            longitude=longitude
+        )
+
+    def resolve_many(self, ip_addresses: Iterable[str]) -> Dict[str, Optional[GeoLocation]]:
+        """Locations of many IP addresses, each distinct address looked up once."""
+        return {ip: self.lookup(ip) for ip in dict.fromkeys(ip_addresses)}
+
     def resolve(self, domain: str) -> Optional[GeoLocation]:
         if not self.reader:
             return None
@@ -26,29 +122,33 @@ class GeoIPResolver:
         try:
             # Resolve domain to IP
             ip_address = socket.gethostbyname(domain)
-            
-            # Lookup IP
-            response = self.reader.city(ip_address)
-            
-            return GeoLocation(
-                ip_address=ip_address,
-                country_code=response.country.iso_code,
-                country_name=response.country.name,
-                region=response.subdivisions.most_specific.name if response.subdivisions else None,
-                city=response.city.name,
-                latitude=response.location.latitude,
-                longitude=response.location.longitude
-            )
         except socket.gaierror:
             logger.warning(f"Could not resolve IP for domain: {domain}")
             return None
-        except geoip2.errors.AddressNotFoundError:
+        return self.lookup(ip_address)
+
+    def _read(self, ip_address: str):
+        """(location fields or None, database network of the answer or None)."""
+        try:
+            response = self.reader.city(ip_address)
+        except geoip2.errors.AddressNotFoundError as e:
             logger.warning(f"IP address not found in GeoIP database: {ip_address}")
-            return None
+            return None, e.network
         except Exception as e:
-            logger.error(f"Error resolving GeoIP for {domain}: {e}")
-            return None
+            logger.error(f"Error resolving GeoIP for {ip_address}: {e}")
+            return None, None
+
+        fields = (
+            response.country.iso_code,
+            response.country.name,
+            response.subdivisions.most_specific.name if response.subdivisions else None,
+            response.city.name,
+            response.location.latitude,
+            response.location.longitude,
+        )
+        return fields, response.traits.network
 
     def close(self):
         if self.reader:
             self.reader.close()
+            self.reader = None
@@ -1,9 +1,7 @@
 import logging
-import json
-import os
 from scanner.manager import process_domain
-from scanner.loader import DomainEntry
 from scanner.dynamodb import DynamoDBManager
+from scanner.work_queue import decode_entry
 
 # Configure logging
 logger = logging.getLogger()
@@ -35,24 +33,11 @@ def handler(event, context):
             # Parse body
             # Expecting JSON: {"domain": "example.com", "rank": 1, "tld": "com"}
             # Or just raw string: "example.com"
-            try:
-                domain_data = json.loads(body)
-                if isinstance(domain_data, str):
-                     domain_data = {"domain": domain_data}
-            except json.JSONDecodeError:
-                domain_data = {"domain": body}
-            
-            domain_name = domain_data.get("domain")
-            if not domain_name:
+            entry = decode_entry(body)
+            if entry is None:
                 logger.warning(f"No domain found in record: {body}")
                 continue
-            
-            # Create DomainEntry
-            entry = DomainEntry(
-                domain=domain_name,
-                rank=domain_data.get("rank", 0),
-                tld=domain_data.get("tld", "")
-            )
+            domain_name = entry.domain
             
             # Run Scan
             logger.info(f"Starting scan for {domain_name}")
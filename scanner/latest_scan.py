@@ -0,0 +1,218 @@
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+from sqlalchemy import Table, Column, Integer, String, MetaData, select, insert, update, delete, exists, func, true, bindparam
+from sqlalchemy.orm import Session
+from scanner.models import Domain, ScanResult, LatestScan, Certificate, TLSVersion, PQCInfo, GeoLocation
+from scanner.ca_classifier import CAClassifier
+from scanner.expiry import week_of
+
+logger = logging.getLogger(__name__)
+
+
+# Hot fields copied from a scan into latest_scans
+HOT_FIELDS = (
+    "scan_result_id", "config_scan_id", "scan_date", "scan_status", "grade", "score",
+    "max_tls_version", "pqc_supported", "issuer", "ca_type", "country",
+    "valid_until", "expiry_week",
+)
+
+
+@dataclass
+class LatestScanChange:
+    """A move of a domain's latest-scan pointer: the hot fields before and after."""
+    domain_id: int
+    previous: Optional[Dict[str, Any]]
+    current: Dict[str, Any]
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Normalize a datetime to naive UTC so in-memory and stored values compare safely."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def max_tls_version(configuration) -> Optional[str]:
+    """Return the highest supported protocol version of a scan's configuration, or None."""
+    supported = [v.version for v in configuration.tls_versions if v.is_supported]
+    if not supported:
+        return None
+    # Simple sort (works because TLS 1.3 > TLS 1.2 lexicographically)
+    return sorted(supported)[-1]
+
+
+def summarize_scan(scan_result: ScanResult, configuration=None) -> Dict[str, Any]:
+    """
+    Extract the hot fields of a scan that are denormalized into latest_scans.
+
+    Args:
+        scan_result: Scan result
+        configuration: Its configuration (child rows); loaded through
+            scan_result.configuration_scan if not given
+
+    Returns:
+        Dictionary of LatestScan column values (excluding domain_id)
+    """
+    if configuration is None:
+        configuration = scan_result.configuration_scan
+    certificate = configuration.certificate
+    # Locations belong to the scanned IP rather than the configuration
+    geo_location = scan_result.geo_location
+    valid_until = _naive_utc(certificate.valid_until) if certificate and certificate.valid_until else None
+
+    return {
+        "scan_result_id": scan_result.id,
+        "config_scan_id": scan_result.config_scan_id or scan_result.id,
+        "scan_date": _naive_utc(scan_result.scan_date),
+        "scan_status": scan_result.scan_status,
+        "grade": scan_result.grade,
+        "score": scan_result.score,
+        "max_tls_version": max_tls_version(configuration),
+        "pqc_supported": bool(configuration.pqc_info and configuration.pqc_info.is_supported),
+        "issuer": CAClassifier.describe(
+            certificate.issuer, certificate.issuer_organization, certificate.issuer_common_name
+        ).display_name if certificate else None,
+        "ca_type": certificate.ca_type if certificate else None,
+        "country": geo_location.country_name if geo_location else None,
+        "valid_until": valid_until,
+        "expiry_week": week_of(valid_until) if valid_until else None,
+    }
+
+
+def update_latest_scan(db: Session, domain: Domain, scan_result: ScanResult, configuration=None) -> Optional[LatestScanChange]:
+    """
+    Point the domain's latest_scans row at scan_result if it is newer than the current one.
+
+    Must be called inside the writer's transaction after scan_result has been flushed,
+    so the pointer and the scan it references are committed together. configuration
+    is the scan's configuration when its child rows were not stored with it.
+
+    Returns:
+        The change that was applied, or None if the domain already has a newer scan
+    """
+    if scan_result.id is None:
+        raise ValueError("scan_result must be flushed before updating latest_scans")
+
+    values = summarize_scan(scan_result, configuration)
+    latest = db.get(LatestScan, domain.id)
+
+    if latest is None:
+        db.add(LatestScan(domain_id=domain.id, **values))
+        return LatestScanChange(domain_id=domain.id, previous=None, current=values)
+
+    if _naive_utc(latest.scan_date) > values["scan_date"]:
+        # An older scan arrived late; the current pointer stays
+        return None
+
+    previous = {key: getattr(latest, key) for key in HOT_FIELDS}
+    for key, value in values.items():
+        setattr(latest, key, value)
+    return LatestScanChange(domain_id=domain.id, previous=previous, current=values)
+
+
+def rebuild_latest_scans(db: Session, domain_ids: Optional[List[int]] = None) -> int:
+    """
+    Recompute latest_scans from scan history, for every domain or only the given ones
+    (e.g. after some of their scans were deleted).
+
+    One INSERT ... SELECT picks each domain's newest scan with its hot fields; issuer
+    names are then filled per distinct issuer DN and expiry weeks per distinct week.
+
+    Returns:
+        Number of domains with a latest scan
+    """
+    latest, scans = LatestScan.__table__, ScanResult.__table__
+    certificates, locations = Certificate.__table__, GeoLocation.__table__
+    tls_versions, pqc_info = TLSVersion.__table__, PQCInfo.__table__
+    selected = true()
+    if domain_ids is not None:
+        # A temporary table rather than an IN list, which executemany below cannot expand
+        rebuilt = Table("latest_rebuilt", MetaData(), Column("domain_id", Integer, primary_key=True), prefixes=["TEMPORARY"])
+        rebuilt.create(db.connection())
+        if domain_ids:
+            db.execute(rebuilt.insert(), [{"domain_id": domain_id} for domain_id in domain_ids])
+        selected = latest.c.domain_id.in_(select(rebuilt.c.domain_id))
+    db.execute(delete(latest).where(selected))
+
+    newest = (
+        select(scans.c.id, func.row_number().over(
+            partition_by=scans.c.domain_id, order_by=(scans.c.scan_date.desc(), scans.c.id.desc()),
+        ).label("position"))
+        .where(scans.c.domain_id.isnot(None))
+    )
+    if domain_ids is not None:
+        newest = newest.where(scans.c.domain_id.in_(select(rebuilt.c.domain_id)))
+    newest = newest.subquery()
+
+    # Unchanged scans keep their configuration rows on the scan they reference
+    configuration = func.coalesce(scans.c.config_scan_id, scans.c.id)
+
+    def certificate(column):
+        return select(func.max(column)).where(certificates.c.scan_result_id == configuration).scalar_subquery()
+
+    rows = (
+        select(
+            scans.c.domain_id, scans.c.id, configuration, scans.c.scan_date, scans.c.scan_status,
+            scans.c.grade, scans.c.score,
+            select(func.max(tls_versions.c.version))
+            .where(tls_versions.c.scan_result_id == configuration, tls_versions.c.is_supported.is_(True))
+            .scalar_subquery(),
+            exists().where(pqc_info.c.scan_result_id == configuration, pqc_info.c.is_supported.is_(True)),
+            # The issuer DN for now (empty if the certificate has none); named below
+            certificate(func.coalesce(certificates.c.issuer, "")),
+            certificate(certificates.c.ca_type),
+            select(func.max(locations.c.country_name)).where(locations.c.ip_address == scans.c.ip_address).scalar_subquery(),
+            certificate(certificates.c.valid_until),
+        )
+        .select_from(scans)
+        .join(newest, newest.c.id == scans.c.id)
+        .where(newest.c.position == 1)
+    )
+    count = db.execute(insert(latest).from_select(
+        ["domain_id", "scan_result_id", "config_scan_id", "scan_date", "scan_status", "grade", "score",
+         "max_tls_version", "pqc_supported", "issuer", "ca_type", "country", "valid_until"],
+        rows,
+    )).rowcount
+
+    issuers = Table(
+        "latest_issuers", MetaData(),
+        Column("issuer", String(255), primary_key=True),
+        Column("name", String(255)),
+        prefixes=["TEMPORARY"],
+    )
+    issuers.create(db.connection())
+    dns = (
+        select(func.coalesce(certificates.c.issuer, ""), func.max(certificates.c.issuer_organization),
+               func.max(certificates.c.issuer_common_name))
+        .join(latest, latest.c.config_scan_id == certificates.c.scan_result_id)
+        .where(selected)
+        .group_by(func.coalesce(certificates.c.issuer, ""))
+    )
+    names = [
+        {"issuer": issuer, "name": CAClassifier.describe(issuer, organization, common_name).display_name}
+        for issuer, organization, common_name in db.execute(dns)
+    ]
+    if names:
+        db.execute(issuers.insert(), names)
+        db.execute(
+            update(latest).where(selected, latest.c.issuer.isnot(None))
+            .values(issuer=select(issuers.c.name).where(issuers.c.issuer == latest.c.issuer).scalar_subquery())
+        )
+    issuers.drop(db.connection())
+
+    weeks = {week_of(_naive_utc(value)) for (value,) in db.execute(
+        select(latest.c.valid_until).distinct().where(selected, latest.c.valid_until.isnot(None))
+    )}
+    if weeks:
+        db.execute(
+            update(latest).where(selected, latest.c.valid_until >= bindparam("start"), latest.c.valid_until < bindparam("end"))
+            .values(expiry_week=bindparam("week")),
+            [{"start": week, "end": week + timedelta(weeks=1), "week": week} for week in weeks],
+        )
+    if domain_ids is not None:
+        rebuilt.drop(db.connection())
+
+    logger.info(f"Rebuilt latest_scans for {count} domains")
+    return count
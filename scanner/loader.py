@@ -1,8 +1,12 @@
 import csv
 import logging
-from typing import List, Optional
+import random
+from array import array
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 import re
+from scanner.sharding import Shard
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +16,77 @@ class DomainEntry:
     domain: str
     tld: str
 
+
+class SeenSet:
+    """
+    Set of domain hashes in one flat array with open addressing.
+
+    Slots are 8 bytes and kept at most half full, so it takes 16 to 32 bytes per domain
+    (32 right after the table doubles), beyond the initial 512 KiB. A Python set of the
+    names takes several times that, so deduplicating a million-row list stays small
+    (at most 32 MB). Hashes are 64-bit, so a
+    collision (which would drop one domain) is ~1e-8 likely over a million domains.
+    """
+
+    def __init__(self, capacity: int = 1 << 16):
+        self._slots = array("q", bytes(8 * capacity))
+        self._mask = capacity - 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, domain: str) -> bool:
+        """Add a domain; False if it was already present."""
+        # 0 marks an empty slot
+        key = hash(domain) or 1
+        if not self._insert(self._slots, self._mask, key):
+            return False
+        self._size += 1
+        if self._size * 2 > len(self._slots):
+            self._grow()
+        return True
+
+    @staticmethod
+    def _insert(slots: array, mask: int, key: int) -> bool:
+        i = key & mask
+        while True:
+            current = slots[i]
+            if current == 0:
+                slots[i] = key
+                return True
+            if current == key:
+                return False
+            i = (i + 1) & mask
+
+    def _grow(self):
+        slots = array("q", bytes(16 * len(self._slots)))
+        mask = len(slots) - 1
+        for key in self._slots:
+            if key:
+                self._insert(slots, mask, key)
+        self._slots, self._mask = slots, mask
+
+
+def reservoir_sample(entries: Iterable[DomainEntry], k: int, rng: Optional[random.Random] = None) -> List[DomainEntry]:
+    """
+    Uniform sample of k entries in one pass, holding only k entries (Algorithm R).
+
+    Returns:
+        The sample ordered by rank
+    """
+    rng = rng or random.Random()
+    reservoir: List[DomainEntry] = []
+    for seen, entry in enumerate(entries):
+        if seen < k:
+            reservoir.append(entry)
+        else:
+            slot = rng.randrange(seen + 1)
+            if slot < k:
+                reservoir[slot] = entry
+    return sorted(reservoir, key=lambda entry: entry.rank)
+
+
 class DomainLoader:
     def __init__(self):
         # Simple regex for domain validation
@@ -19,49 +94,106 @@ class DomainLoader:
             r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$'
         )
 
-    def load_from_csv(self, file_path: str, limit: Optional[int] = None) -> List[DomainEntry]:
+    def iter_rows(self, file_path: str) -> Iterator[List[str]]:
         """
-        Load domains from Majestic Million CSV.
+        Stream the data rows of a Majestic Million CSV.
         Format: GlobalRank,TldRank,Domain,TLD,RefSubNets,RefIPs,...
         """
-        domains = []
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
                 reader = csv.reader(f)
-                next(reader)  # Skip header
-                
-                for row in reader:
-                    if limit and len(domains) >= limit:
-                        break
-                        
-                    if len(row) < 4:
-                        continue
-                        
-                    try:
-                        rank = int(row[0])
-                        domain = row[2]
-                        tld = row[3]
-                        
-                        if self.validate_domain(domain):
-                            domains.append(DomainEntry(rank=rank, domain=domain, tld=tld))
-                    except ValueError:
-                        logger.warning(f"Invalid rank in row: {row}")
-                        continue
-                        
+                next(reader, None)  # Skip header
+                yield from reader
         except FileNotFoundError:
             logger.error(f"File not found: {file_path}")
             raise
-            
-        return self.deduplicate(domains)
+
+    def parse(self, rows: Iterable[List[str]], rank_range: Optional[Tuple[int, int]] = None) -> Iterator[DomainEntry]:
+        """
+        Turn rows into entries, skipping short rows, bad ranks and invalid domain names.
+
+        With a rank range, rows outside it are skipped before validation and reading
+        stops past its last rank, as the list is ordered by rank.
+        """
+        first, last = rank_range or (1, None)
+        match = self.domain_regex.match
+        for row in rows:
+            if len(row) < 4:
+                continue
+
+            try:
+                rank = int(row[0])
+            except ValueError:
+                logger.warning(f"Invalid rank in row: {row}")
+                continue
+            if rank < first:
+                continue
+            if last is not None and rank > last:
+                return
+
+            domain = row[2]
+            if match(domain):
+                yield DomainEntry(rank=rank, domain=domain, tld=row[3])
+
+    def unique(self, entries: Iterable[DomainEntry]) -> Iterator[DomainEntry]:
+        """Drop repeated domains, keeping the first (best-ranked) occurrence."""
+        seen = SeenSet()
+        for entry in entries:
+            if seen.add(entry.domain):
+                yield entry
+
+    def iter_domains(self, file_path: str, limit: Optional[int] = None, sample: Optional[int] = None,
+                     rank_range: Optional[Tuple[int, int]] = None, seed: Optional[int] = None,
+                     tld: Optional[str] = None, offset: int = 0, shard: Optional[Shard] = None) -> Iterator[DomainEntry]:
+        """
+        Lazily load domains: parse, validate, dedupe, then select.
+
+        Memory stays constant in the file size apart from the seen-set (16 to 32 bytes
+        per distinct domain) and, when sampling, the sample itself. file_path may also be
+        an indexed target list (scanner.target_list), already validated and deduplicated,
+        where every selection is a seek instead of a pass over the file.
+
+        Args:
+            limit: Stop after this many domains (the top of the selection)
+            sample: Uniform random sample of this many domains (one pass over the file)
+            rank_range: Only domains ranked first..last (inclusive)
+            seed: Seed for reproducible sampling
+            tld: Only domains under this TLD
+            offset: Skip this many domains of the selection first (ignored when sampling)
+            shard: Only domains of this shard (scanner.sharding); limit, offset and sample
+                then apply within the shard
+        """
+        from scanner.target_list import TargetList, is_target_list
+
+        if is_target_list(file_path):
+            with TargetList(file_path) as targets:
+                if sample is not None:
+                    yield from targets.sample(sample, rank_range, tld, random.Random(seed), shard)
+                else:
+                    yield from targets.slice(offset, limit, rank_range, tld, shard)
+            return
+
+        entries = self.unique(self.parse(self.iter_rows(file_path), rank_range))
+        if tld is not None:
+            entries = (entry for entry in entries if entry.tld == tld)
+        if shard is not None:
+            entries = (entry for entry in entries if entry.domain in shard)
+
+        if sample is not None:
+            yield from reservoir_sample(entries, sample, random.Random(seed))
+            return
+        yield from islice(entries, offset, offset + limit if limit else None)
+
+    def load_from_csv(self, file_path: str, limit: Optional[int] = None) -> List[DomainEntry]:
+        """
+        Load domains from Majestic Million CSV.
+        Format: GlobalRank,TldRank,Domain,TLD,RefSubNets,RefIPs,...
+        """
+        return list(self.iter_domains(file_path, limit=limit))
 
     def validate_domain(self, domain: str) -> bool:
         return bool(self.domain_regex.match(domain))
 
     def deduplicate(self, domains: List[DomainEntry]) -> List[DomainEntry]:
-        seen = set()
-        unique_domains = []
-        for d in domains:
-            if d.domain not in seen:
-                seen.add(d.domain)
-                unique_domains.append(d)
-        return unique_domains
+        return list(self.unique(domains))
+
@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable
+
+# Returned by LRUCache.get on a miss (None is a valid cached value)
+MISSING = object()
+
+
+class LRUCache:
+    """Bounded, thread-safe least-recently-used cache that counts its hits and misses."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        return self.get_first((key,))
+
+    def get_first(self, keys: Iterable[Hashable]) -> Any:
+        """Value of the first key present, counted as one lookup."""
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key, MISSING)
+                if value is not MISSING:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return MISSING
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+        }
@@ -1,15 +1,27 @@
 import logging
 import concurrent.futures
-from typing import List
+from itertools import islice
+from typing import Iterable, List, Tuple
 from scanner.loader import DomainLoader, DomainEntry
 from scanner.scanner import TLSScanner
-from scanner.geoip import GeoIPResolver
 from scanner.database import get_db
 from scanner.models import Domain, ScanResult
+from scanner.latest_scan import update_latest_scan
+from scanner.config_history import store_configuration
+from scanner.statistics import DailyStatisticsWriter
+from scanner.rollups import DailyRollupWriter
+from scanner.scheduler import update_intervals
+from scanner.chain_validator import ChainValidator
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# Domains submitted ahead of each worker; bounds memory for target lists of any length
+IN_FLIGHT_PER_WORKER = 4
+
+# Results saved (and folded into statistics and rollups) per transaction
+SAVE_BATCH_SIZE = 500
+
 def process_domain(domain_entry: DomainEntry) -> ScanResult:
     """
     Worker function to process a single domain.
@@ -27,56 +39,93 @@ def process_domain(domain_entry: DomainEntry) -> ScanResult:
             result.pqc_info = pqc_info
         except Exception as e:
             logger.error(f"PQC scan failed for {domain_entry.domain}: {e}")
-            
-        # 3. GeoIP Resolution
-        try:
-            geoip = GeoIPResolver()
-            geo_location = geoip.resolve(domain_entry.domain)
-            if geo_location:
-                result.geo_location = geo_location
-            geoip.close()
-        except Exception as e:
-            logger.error(f"GeoIP resolution failed for {domain_entry.domain}: {e}")
-        
+
+    # Locations are filled later from result.ip_address (scanner.geo_enrichment)
     return result
 
+def process_domain_with_lookups(domain_entry: DomainEntry) -> tuple[ScanResult, tuple[int, int]]:
+    """
+    process_domain, plus the (hits, misses) of the chain-validation cache it caused.
+
+    The cache lives in the worker process, so the counts travel back with the result.
+    """
+    hits, misses = ChainValidator.shared_lookups()
+    result = process_domain(domain_entry)
+    after_hits, after_misses = ChainValidator.shared_lookups()
+    return result, (after_hits - hits, after_misses - misses)
+
 class ScanManager:
     def __init__(self, max_workers: int = 10):
         self.max_workers = max_workers
         self.loader = DomainLoader()
 
-    def run_scan(self, csv_path: str, limit: int = 100):
-        logger.info(f"Loading domains from {csv_path} (limit={limit})")
-        domains = self.loader.load_from_csv(csv_path, limit=limit)
-        
-        logger.info(f"Starting scan for {len(domains)} domains with {self.max_workers} workers")
-        
+    def run_scan(self, domains: Iterable[DomainEntry]):
+        """
+        Scan a stream of domains (e.g. DomainLoader.iter_domains).
+
+        Only a bounded window of domains is submitted ahead of the workers and results
+        are saved in batches, so memory does not grow with the length of the stream.
+        """
+        logger.info(f"Starting scan with {self.max_workers} workers")
+        domains = iter(domains)
+        window = self.max_workers * IN_FLIGHT_PER_WORKER
+
         results = []
+        scanned = cache_hits = cache_misses = 0
         with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-            # Map domains to futures
-            future_to_domain = {executor.submit(process_domain, d): d for d in domains}
-            
-            for future in concurrent.futures.as_completed(future_to_domain):
-                domain_entry = future_to_domain[future]
-                try:
-                    result = future.result()
+            future_to_domain = {}
+
+            def submit():
+                for d in islice(domains, window - len(future_to_domain)):
+                    future_to_domain[executor.submit(process_domain_with_lookups, d)] = d
+
+            submit()
+            while future_to_domain:
+                done, _ = concurrent.futures.wait(future_to_domain, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    domain_entry = future_to_domain.pop(future)
+                    scanned += 1
+                    result, hits, misses = self.result_of(domain_entry, future)
+                    cache_hits += hits
+                    cache_misses += misses
                     results.append((domain_entry, result))
-                    logger.info(f"Completed {domain_entry.domain}: {result.scan_status}")
-                except Exception as exc:
-                    logger.error(f"{domain_entry.domain} generated an exception: {exc}")
-                    # Create an error result for the failed domain
-                    error_result = ScanResult(
-                        scan_date=datetime.now(timezone.utc),
-                        scan_status="ERROR",
-                        error_message=str(exc)
-                    )
-                    results.append((domain_entry, error_result))
-        
-        self._save_results(results)
 
-    def _save_results(self, results: List[tuple[DomainEntry, ScanResult]]):
+                if len(results) >= SAVE_BATCH_SIZE:
+                    self.save_results(results)
+                    results = []
+                submit()
+
+        if results:
+            self.save_results(results)
+        logger.info(f"Scanned {scanned} domains")
+
+        lookups = cache_hits + cache_misses
+        if lookups:
+            logger.info(f"Chain validation cache: {cache_hits}/{lookups} intermediate verdicts reused ({cache_hits / lookups:.1%})")
+
+    @staticmethod
+    def result_of(domain_entry: DomainEntry, future: concurrent.futures.Future) -> Tuple[ScanResult, int, int]:
+        """Result of a finished scan with its chain cache hits and misses (an ERROR result if the worker raised)."""
+        try:
+            result, (hits, misses) = future.result()
+            logger.info(f"Completed {domain_entry.domain}: {result.scan_status}")
+            return result, hits, misses
+        except Exception as exc:
+            logger.error(f"{domain_entry.domain} generated an exception: {exc}")
+            # Create an error result for the failed domain
+            error_result = ScanResult(
+                scan_date=datetime.now(timezone.utc),
+                scan_status="ERROR",
+                error_message=str(exc)
+            )
+            return error_result, 0, 0
+
+    def save_results(self, results: List[tuple[DomainEntry, ScanResult]]):
         logger.info("Saving results to database...")
         db = next(get_db())
+        statistics = DailyStatisticsWriter(db)
+        rollups = DailyRollupWriter(db)
+        saved_domains = []
         try:
             for domain_entry, scan_result in results:
                 # 1. Get or Create Domain
@@ -89,11 +138,29 @@ class ScanManager:
                     )
                     db.add(domain)
                     db.flush() # Get ID
+                elif domain_entry.rank and domain.global_rank != domain_entry.rank:
+                    # Keep the rank current: sampling strata are assigned by it
+                    domain.global_rank = domain_entry.rank
                 
-                # 2. Save Scan Result
+                # 2. Save Scan Result (child rows only if the configuration changed)
                 scan_result.domain_id = domain.id
+                configuration = store_configuration(db, domain, scan_result)
                 db.add(scan_result)
+                db.flush() # Get ID
+                saved_domains.append(domain.id)
+
+                # 3. Move the domain's latest-scan pointer (same transaction)
+                change = update_latest_scan(db, domain, scan_result, configuration)
+                if change:
+                    statistics.record(change, configuration)
+                    rollups.record(change, domain.tld)
             
+            # 4. Fold this batch into the per-day statistics snapshots and rollups
+            statistics.flush()
+            rollups.flush()
+            # 5. Reschedule the scanned domains from their new scans (read back, so flush them first)
+            db.flush()
+            update_intervals(db, saved_domains)
             db.commit()
             logger.info("Results saved successfully.")
         except Exception as e:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, DECIMAL, func
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Float, DECIMAL, Index, UniqueConstraint, func
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime
 
@@ -15,6 +15,8 @@ class Domain(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
     scan_results = relationship("ScanResult", back_populates="domain")
+    latest_scan = relationship("LatestScan", uselist=False, back_populates="domain")
+    config_changes = relationship("ConfigChange", back_populates="domain")
 
 class ScanResult(Base):
     __tablename__ = 'scan_results'
@@ -26,14 +28,27 @@ class ScanResult(Base):
     error_message = Column(Text)
     grade = Column(String(5))
     score = Column(DECIMAL(5, 2))
+    config_hash = Column(String(64))  # Hash of the configuration (child rows), SUCCESS scans only
+    config_scan_id = Column(Integer, ForeignKey('scan_results.id'))  # Earlier scan holding the same configuration
+    ip_address = Column(String(45), index=True)  # Address scanned (None if the name did not resolve)
     created_at = Column(DateTime, default=func.now())
 
     domain = relationship("Domain", back_populates="scan_results")
+    config_scan = relationship("ScanResult", remote_side=[id])
     certificate = relationship("Certificate", uselist=False, back_populates="scan_result")
     tls_versions = relationship("TLSVersion", back_populates="scan_result")
     cipher_suites = relationship("CipherSuite", back_populates="scan_result")
     pqc_info = relationship("PQCInfo", uselist=False, back_populates="scan_result")
-    geo_location = relationship("GeoLocation", uselist=False, back_populates="scan_result")
+    # Filled per distinct IP by the enrichment stage (scanner.geo_enrichment), not at scan time
+    geo_location = relationship(
+        "GeoLocation", uselist=False, viewonly=True,
+        primaryjoin="foreign(ScanResult.ip_address) == GeoLocation.ip_address",
+    )
+
+    @property
+    def configuration_scan(self) -> "ScanResult":
+        """The scan whose child rows describe this scan's configuration (itself unless unchanged)."""
+        return self.config_scan or self
 
 class Certificate(Base):
     __tablename__ = 'certificates'
@@ -44,6 +59,8 @@ class Certificate(Base):
     public_key_algorithm = Column(String(100))
     public_key_size = Column(Integer)
     issuer = Column(String(255))
+    issuer_organization = Column(String(255))  # O of the issuer
+    issuer_common_name = Column(String(255))  # CN of the issuer
     subject = Column(String(255))  # Subject DN
     ca_type = Column(String(50))
     valid_from = Column(DateTime)
@@ -94,19 +111,50 @@ class PQCInfo(Base):
     scan_result = relationship("ScanResult", back_populates="pqc_info")
 
 class GeoLocation(Base):
+    """Location of one IP address; scans refer to it through ScanResult.ip_address."""
     __tablename__ = 'geo_locations'
+    __table_args__ = (
+        Index('ix_geo_locations_ip_address', 'ip_address', unique=True),
+    )
 
     id = Column(Integer, primary_key=True)
-    scan_result_id = Column(Integer, ForeignKey('scan_results.id'))
-    ip_address = Column(String(45))
+    ip_address = Column(String(45), nullable=False)
     country_code = Column(String(2))
     country_name = Column(String(100))
     region = Column(String(100))
     city = Column(String(100))
     latitude = Column(DECIMAL(10, 8))
     longitude = Column(DECIMAL(11, 8))
+    database_build = Column(DateTime)  # Build time of the GeoLite2 database it was resolved with
 
-    scan_result = relationship("ScanResult", back_populates="geo_location")
+class LatestScan(Base):
+    """Current state of each domain: a pointer to its most recent scan plus the hot fields."""
+    __tablename__ = 'latest_scans'
+    __table_args__ = (
+        Index('ix_latest_scans_status_date', 'scan_status', 'scan_date'),
+        # Expiry index: windows are range scans on valid_until, the horizon an index-only group-by
+        Index('ix_latest_scans_valid_until', 'valid_until'),
+        Index('ix_latest_scans_expiry_week', 'expiry_week', 'valid_until'),
+    )
+
+    domain_id = Column(Integer, ForeignKey('domains.id'), primary_key=True)
+    scan_result_id = Column(Integer, ForeignKey('scan_results.id'), nullable=False)
+    config_scan_id = Column(Integer, ForeignKey('scan_results.id'))  # Scan holding the current configuration rows
+    scan_date = Column(DateTime, nullable=False)
+    scan_status = Column(String(50), nullable=False)
+    grade = Column(String(5))
+    score = Column(DECIMAL(5, 2))
+    max_tls_version = Column(String(50))
+    pqc_supported = Column(Boolean)
+    issuer = Column(String(255))  # Friendly issuer name (O or CN)
+    ca_type = Column(String(50))
+    country = Column(String(100))
+    valid_until = Column(DateTime)  # Expiry of the current certificate
+    expiry_week = Column(DateTime)  # Monday 00:00 UTC of the week valid_until falls in
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    domain = relationship("Domain", back_populates="latest_scan")
+    scan_result = relationship("ScanResult", foreign_keys=[scan_result_id])
 
 class StatisticsCache(Base):
     __tablename__ = 'statistics_cache'
@@ -115,3 +163,155 @@ class StatisticsCache(Base):
     scan_date = Column(DateTime, unique=True, nullable=False)
     statistics_json = Column(Text, nullable=False)
     created_at = Column(DateTime, default=func.now())
+
+class DailyRollup(Base):
+    """
+    Net change one day's writes made to the current-state aggregates of a segment.
+
+    scope is "all" (scope_key ""), "tld" or "country"; summing a segment's rows up to a
+    day gives its state at the end of that day.
+    """
+    __tablename__ = 'daily_rollups'
+    __table_args__ = (
+        UniqueConstraint('day', 'scope', 'scope_key', name='uq_daily_rollups_day_scope_key'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    day = Column(DateTime, nullable=False)
+    scope = Column(String(20), nullable=False)
+    scope_key = Column(String(100), nullable=False)
+    statistics_json = Column(Text, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class ConfigChange(Base):
+    """
+    One change of a domain's configuration, or the first configuration recorded for it.
+
+    Scans whose configuration hash matches the domain's current one store no child rows
+    and reference the scan that introduced the configuration instead, so this table has
+    one row per real change.
+    """
+    __tablename__ = 'config_changes'
+    __table_args__ = (
+        Index('ix_config_changes_domain_changed', 'domain_id', 'changed_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    domain_id = Column(Integer, ForeignKey('domains.id'), nullable=False)
+    # Scans holding the new and the replaced configuration (NULL once pruned by retention)
+    scan_result_id = Column(Integer, ForeignKey('scan_results.id'))
+    previous_scan_id = Column(Integer, ForeignKey('scan_results.id'))
+    changed_at = Column(DateTime, nullable=False, index=True)
+    config_hash = Column(String(64), nullable=False)
+    component_hashes = Column(Text, nullable=False)  # JSON: component -> hash
+    changed_components = Column(String(255), nullable=False)  # Comma-separated; empty for the first configuration
+    details = Column(Text)  # JSON: what changed per component
+
+    domain = relationship("Domain", back_populates="config_changes")
+    scan_result = relationship("ScanResult", foreign_keys=[scan_result_id])
+
+class TargetListRefresh(Base):
+    """
+    One download of the target list that changed it, with the response's validators
+    (ETag / Last-Modified) for the next conditional request.
+    """
+    __tablename__ = 'target_list_refreshes'
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String(500), nullable=False)
+    fetched_at = Column(DateTime, nullable=False, index=True)
+    etag = Column(String(255))
+    last_modified = Column(String(64))  # HTTP date, sent back verbatim
+    domains = Column(Integer, nullable=False)
+    added = Column(Integer, nullable=False)
+    removed = Column(Integer, nullable=False)
+    rank_shifted = Column(Integer, nullable=False)
+
+class TargetListChange(Base):
+    """A domain that entered, left or moved sharply within the target list at a refresh."""
+    __tablename__ = 'target_list_changes'
+    __table_args__ = (
+        Index('ix_target_list_changes_refresh_change', 'refresh_id', 'change'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    refresh_id = Column(Integer, ForeignKey('target_list_refreshes.id'), nullable=False)
+    domain = Column(String(255), nullable=False, index=True)
+    change = Column(String(20), nullable=False)  # added, removed or rank_shifted
+    rank = Column(Integer)  # None if removed
+    previous_rank = Column(Integer)  # None if added
+
+class SamplingStratum(Base):
+    """
+    One stratum of the current sampling design: a rank band, optionally within one TLD,
+    with its size in the target list when the design was last drawn. Scans of the
+    domains drawn for it (SampledDomain) are weighted by population / scanned in the
+    dashboard's estimates.
+    """
+    __tablename__ = 'sampling_strata'
+
+    id = Column(Integer, primary_key=True)
+    rank_first = Column(Integer, nullable=False)
+    rank_last = Column(Integer, nullable=False)
+    tld = Column(String(50))  # None: every TLD
+    population = Column(Integer, nullable=False)
+    sample_size = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+class SampledDomain(Base):
+    """
+    A domain drawn for a stratum by a stratified run. Estimates only count the scans of
+    drawn domains, a uniform sample of the stratum, not those of budget, top-N or full
+    runs that happen to fall in its band.
+    """
+    __tablename__ = 'sampled_domains'
+    __table_args__ = (
+        Index('ix_sampled_domains_stratum_sampled', 'stratum_id', 'sampled_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    stratum_id = Column(Integer, ForeignKey('sampling_strata.id'), nullable=False)
+    domain = Column(String(255), nullable=False)  # By name: drawn before its first scan
+    sampled_at = Column(DateTime, nullable=False)
+
+class ScanSchedule(Base):
+    """
+    Rescan schedule of every domain on the target list: when it is next due, from its
+    rank and how often its configuration has changed, and its place in the queue of due
+    domains (scanner.scheduler.priority_at). Rows follow the target list;
+    last_scanned is None for domains never scanned yet (new entrants).
+    """
+    __tablename__ = 'scan_schedule'
+
+    id = Column(Integer, primary_key=True)
+    domain = Column(String(255), unique=True, nullable=False)
+    rank = Column(Integer, nullable=False, index=True)
+    tld = Column(String(50), nullable=False)
+    first_seen = Column(DateTime, nullable=False)  # First sync that found it on the list
+    last_scanned = Column(DateTime)
+    change_rate = Column(Float)  # Smoothed configuration changes per day
+    interval_days = Column(Float)
+    next_due = Column(DateTime, nullable=False, index=True)
+    # When its priority reaches a top-ranked domain's on coming due; due domains are scanned in this order
+    priority_at = Column(DateTime, nullable=False, index=True)
+
+class QueuedDomain(Base):
+    """
+    A domain waiting in the database work queue (scanner.work_queue.DatabaseQueue).
+
+    A worker's lease hides the row until visible_at; renewing pushes that out, finishing
+    deletes the row, and the domains of a worker that died reappear once it passes.
+    """
+    __tablename__ = 'scan_queue'
+    __table_args__ = (
+        Index('ix_scan_queue_visible', 'visible_at', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    domain = Column(String(255), nullable=False)
+    rank = Column(Integer, nullable=False)
+    tld = Column(String(50), nullable=False)
+    enqueued_at = Column(DateTime, nullable=False)
+    visible_at = Column(DateTime, nullable=False)  # Leasable from then on: enqueue time, or end of the current lease
+    lease_token = Column(String(32))  # Of the lease holding it (None until first leased)
+    attempts = Column(Integer, nullable=False, default=0)  # Leases so far, including expired ones
@@ -0,0 +1,86 @@
+import time
+import logging
+import concurrent.futures
+from typing import Dict, List
+from scanner.manager import ScanManager, process_domain_with_lookups, IN_FLIGHT_PER_WORKER, SAVE_BATCH_SIZE
+from scanner.work_queue import WorkQueue, Lease, LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Leases are renewed (and finished scans saved) this many times per lease period, so
+# one slow database round trip does not cost a lease
+RENEWALS_PER_LEASE = 3
+
+# Seconds an idle worker waits before looking again while other workers hold leases
+IDLE_POLL_SECONDS = 5
+
+
+class QueueWorker:
+    """
+    Scans domains leased from a WorkQueue until it is drained.
+
+    The pool is topped up a batch at a time once half of its window has finished, so a
+    faster host simply leases more often. Finished scans are saved (and their domains
+    completed) at least every LEASE_SECONDS / RENEWALS_PER_LEASE, when the leases of
+    the scans still running are renewed; a domain leaves the queue only once stored.
+    A worker with nothing left to lease stays until the domains other workers hold are
+    done too, since the leases of a worker that dies expire back to the queue.
+    """
+
+    def __init__(self, queue: WorkQueue, max_workers: int = 5, lease_seconds: int = LEASE_SECONDS):
+        self.queue = queue
+        self.manager = ScanManager(max_workers=max_workers)
+        self.lease_seconds = lease_seconds
+
+    def run(self) -> int:
+        """Work the queue until it is empty; returns how many domains were scanned."""
+        window = self.manager.max_workers * IN_FLIGHT_PER_WORKER
+        interval = self.lease_seconds / RENEWALS_PER_LEASE
+        in_flight: Dict[concurrent.futures.Future, Lease] = {}
+        results = []
+        finished: List[Lease] = []
+        scanned = 0
+        renewed_at = time.monotonic()
+
+        def save():
+            nonlocal results, finished, scanned
+            if results:
+                self.manager.save_results(results)
+                completed = self.queue.complete(finished)
+                if completed < len(finished):
+                    logger.warning(f"{len(finished) - completed} leases expired before their scans were saved; "
+                                   f"those domains may be scanned again")
+                scanned += len(results)
+            results, finished = [], []
+
+        logger.info(f"Working the scan queue with {self.manager.max_workers} workers")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.manager.max_workers) as executor:
+            while True:
+                if len(in_flight) <= window // 2:
+                    # Only wait for new domains when there is nothing else to do
+                    for lease in self.queue.lease(window - len(in_flight), self.lease_seconds, wait=not in_flight):
+                        in_flight[executor.submit(process_domain_with_lookups, lease.entry)] = lease
+                if not in_flight:
+                    save()
+                    if not self.queue.pending():
+                        break
+                    time.sleep(IDLE_POLL_SECONDS)
+                    continue
+
+                done, _ = concurrent.futures.wait(in_flight, timeout=interval, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    lease = in_flight.pop(future)
+                    result, _, _ = self.manager.result_of(lease.entry, future)
+                    results.append((lease.entry, result))
+                    finished.append(lease)
+
+                if len(results) >= SAVE_BATCH_SIZE or time.monotonic() - renewed_at >= interval:
+                    save()
+                    if in_flight:
+                        renewed = self.queue.renew(list(in_flight.values()), self.lease_seconds)
+                        if renewed < len(in_flight):
+                            logger.warning(f"{len(in_flight) - renewed} leases were lost; another worker may scan those domains too")
+                    renewed_at = time.monotonic()
+
+        logger.info(f"Scan queue drained; scanned {scanned} domains")
+        return scanned
@@ -0,0 +1,184 @@
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict
+import numpy as np
+from sqlalchemy import Table, Column, Integer, String, Float, MetaData, select, update, case, func, type_coerce
+from sqlalchemy.orm import Session
+from scanner.models import ScanResult, TLSVersion, CipherSuite, PQCInfo, LatestScan
+from scanner.security_grader import SecurityGrader
+from scanner.statistics import rebuild_statistics
+from scanner.rollups import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany insert of changed grades
+INSERT_CHUNK_SIZE = 5000
+
+@dataclass
+class RegradeReport:
+    configurations: int = 0
+    weak_ciphers: int = 0
+    changed_configurations: int = 0
+    changed_scans: int = 0
+    # (old grade, new grade) -> configurations moved
+    transitions: Counter = field(default_factory=Counter)
+
+
+def _weak_cipher_names(db: Session):
+    """Cipher suite names the current keywords mark weak, evaluated once per distinct name."""
+    return sorted(name for (name,) in db.query(CipherSuite.name).distinct() if SecurityGrader.is_weak_cipher(name))
+
+
+def _features(db: Session, weak_names) -> Dict[str, np.ndarray]:
+    """
+    Grading features of every stored configuration, aggregated in the database.
+
+    Only scans holding their own configuration rows are graded; scans stored by
+    reference share the grade of the scan they reference.
+    """
+    deprecated = list(SecurityGrader.DEPRECATED_TLS_VERSIONS)
+    versions = (
+        db.query(
+            TLSVersion.scan_result_id,
+            func.max(case((TLSVersion.version.in_(deprecated), 1), else_=0)).label("deprecated"),
+            func.max(case((TLSVersion.version == "TLS 1.2", 1), else_=0)).label("tls12"),
+            func.max(case((TLSVersion.version == "TLS 1.3", 1), else_=0)).label("tls13"),
+        )
+        .filter(TLSVersion.is_supported.is_(True))
+        .group_by(TLSVersion.scan_result_id)
+        .subquery()
+    )
+    weak = (
+        db.query(CipherSuite.scan_result_id, func.count().label("count"))
+        .filter(CipherSuite.name.in_(weak_names))
+        .group_by(CipherSuite.scan_result_id)
+        .subquery()
+    )
+    # Plain Core rows: no ORM loading, and scores as floats rather than Decimals
+    rows = db.connection().execute(
+        select(
+            ScanResult.id,
+            versions.c.deprecated,
+            versions.c.tls12,
+            versions.c.tls13,
+            weak.c.count,
+            PQCInfo.is_supported,
+            ScanResult.grade,
+            type_coerce(ScanResult.score, Float),
+        )
+        .outerjoin(versions, versions.c.scan_result_id == ScanResult.id)
+        .outerjoin(weak, weak.c.scan_result_id == ScanResult.id)
+        .outerjoin(PQCInfo, PQCInfo.scan_result_id == ScanResult.id)
+        .where(ScanResult.scan_status == "SUCCESS", ScanResult.config_scan_id.is_(None))
+    ).all()
+
+    # Transpose into columns (None becomes NaN or 0 below)
+    ids, deprecated_, tls12, tls13, weak_count, pqc, grade, score = zip(*rows) if rows else ([],) * 8
+    grade_codes = {g: i for i, g in enumerate(SecurityGrader.GRADES)}
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "has_deprecated": np.array(deprecated_, dtype=float) == 1,
+        "has_tls12": np.array(tls12, dtype=float) == 1,
+        "has_tls13": np.array(tls13, dtype=float) == 1,
+        "weak_count": np.nan_to_num(np.array(weak_count, dtype=float)).astype(np.int64),
+        "has_pqc": np.array(pqc, dtype=float) == 1,
+        # -1 for scans never graded
+        "grade": np.array([grade_codes.get(g, -1) for g in grade], dtype=np.int64),
+        "score": np.array(score, dtype=np.float64),
+    }
+
+
+def _write_grades(db: Session, ids: np.ndarray, codes: np.ndarray, scores: np.ndarray) -> int:
+    """Write new grades of configurations to every scan using them, one statement per table."""
+    grades = Table(
+        "regrade_grades", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("grade", String(2)),
+        Column("score", Float),
+        prefixes=["TEMPORARY"],
+    )
+    grades.create(db.connection())
+    rows = [
+        {"id": int(i), "grade": SecurityGrader.GRADES[code], "score": float(score)}
+        for i, code, score in zip(ids, codes, scores)
+    ]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(grades.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+
+    scans = ScanResult.__table__
+    configuration_id = func.coalesce(scans.c.config_scan_id, scans.c.id)
+    changed = db.execute(
+        update(scans)
+        .where(configuration_id.in_(select(grades.c.id)))
+        .values(
+            grade=select(grades.c.grade).where(grades.c.id == configuration_id).scalar_subquery(),
+            score=select(grades.c.score).where(grades.c.id == configuration_id).scalar_subquery(),
+        )
+    ).rowcount
+
+    latest = LatestScan.__table__
+    db.execute(
+        update(latest)
+        .where(latest.c.config_scan_id.in_(select(grades.c.id)))
+        .values(
+            grade=select(grades.c.grade).where(grades.c.id == latest.c.config_scan_id).scalar_subquery(),
+            score=select(grades.c.score).where(grades.c.id == latest.c.config_scan_id).scalar_subquery(),
+        )
+    )
+    grades.drop(db.connection())
+    return changed
+
+
+def regrade(db: Session, dry_run: bool = False, rebuild_trends: bool = True) -> RegradeReport:
+    """
+    Recompute grade and score of every stored scan with the current SecurityGrader rules.
+
+    Weak cipher suites are re-evaluated per distinct name, the features of every stored
+    configuration are aggregated in the database, graded as NumPy arrays and only the
+    changed grades are written back, followed by rebuilding the statistics and rollups
+    that count grades. Commits unless dry_run.
+
+    Args:
+        dry_run: Only report what would change
+        rebuild_trends: Replay history into daily_rollups (the slowest step); without it
+            the grade trends keep the old grades until rebuild_rollups runs
+    """
+    report = RegradeReport()
+    weak_names = _weak_cipher_names(db)
+    report.weak_ciphers = len(weak_names)
+
+    features = _features(db, weak_names)
+    report.configurations = len(features["id"])
+    codes, scores = SecurityGrader.grade_features(
+        features["has_deprecated"], features["has_tls12"], features["has_tls13"],
+        features["weak_count"], features["has_pqc"],
+    )
+    changed = (codes != features["grade"]) | ~np.isclose(scores, features["score"])
+    report.changed_configurations = int(changed.sum())
+
+    if report.changed_configurations:
+        labels = ("Unknown",) + SecurityGrader.GRADES
+        pairs, counts = np.unique(np.stack([features["grade"][changed], codes[changed]]), axis=1, return_counts=True)
+        for (old, new), count in zip(pairs.T, counts):
+            report.transitions[(labels[old + 1], labels[new + 1])] = int(count)
+
+    if dry_run:
+        return report
+
+    # Keep the stored flags in line with the keywords, touching only rows that differ
+    cipher_suites = CipherSuite.__table__
+    is_weak = cipher_suites.c.name.in_(weak_names)
+    db.execute(update(cipher_suites).where(cipher_suites.c.is_weak.is_distinct_from(is_weak)).values(is_weak=is_weak))
+    if not report.changed_configurations:
+        db.commit()
+        return report
+
+    report.changed_scans = _write_grades(db, features["id"][changed], codes[changed], scores[changed])
+
+    rebuild_statistics(db)
+    if rebuild_trends:
+        rebuild_rollups(db)
+    db.commit()
+    logger.info(f"Regraded {report.changed_configurations} configurations ({report.changed_scans} scans)")
+    return report
@@ -0,0 +1,364 @@
+import os
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import Table, Column, Integer, MetaData, select, update, delete, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from scanner.models import (
+    ScanResult, Certificate, TLSVersion, CipherSuite, PQCInfo, GeoLocation, LatestScan, ConfigChange,
+)
+from scanner.snapshot import ColumnarSnapshotWriter, HISTORY_SCHEMA, iter_history_rows
+from scanner.latest_scan import LatestScanChange, HOT_FIELDS, rebuild_latest_scans
+from scanner.statistics import DailyStatisticsWriter, day_of
+from scanner.rollups import DailyRollupWriter, iter_scan_history
+
+logger = logging.getLogger(__name__)
+
+# Tables whose rows belong to a scan through scan_result_id
+CHILD_TABLES = (TLSVersion, CipherSuite, Certificate, PQCInfo)
+
+BUCKETS = ("day", "week", "month")
+
+# Keep one scan per domain per day for 30 days, per week up to 180 days, then per month
+DEFAULT_POLICY = os.getenv("RETENTION_POLICY", "day:30,week:180,month")
+
+# Fraction of scans pruned in one run above which SQLite is VACUUMed (a full rewrite)
+VACUUM_THRESHOLD = 0.1
+
+# Rows per executemany insert into the temporary id tables
+INSERT_CHUNK_SIZE = 5000
+
+# Rows fetched per round trip while scanning the history
+STREAM_BATCH_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class RetentionTier:
+    """Keep one scan per domain and bucket for scans younger than days (None: no age limit)."""
+    bucket: str
+    days: Optional[int]
+
+
+class RetentionPolicy:
+    """
+    Declarative downsampling of scan history, e.g. "day:30,week:180,month:730".
+
+    Tiers apply by scan age in order; within a tier each domain keeps its newest
+    successful scan per bucket (or its newest scan if none succeeded). Scans older
+    than the last tier are deleted; a last tier without days keeps its buckets forever.
+    """
+
+    def __init__(self, tiers: List[RetentionTier]):
+        if not tiers:
+            raise ValueError("A retention policy needs at least one tier")
+        previous = 0
+        for i, tier in enumerate(tiers):
+            if tier.bucket not in BUCKETS:
+                raise ValueError(f"Unknown retention bucket '{tier.bucket}' (expected one of {', '.join(BUCKETS)})")
+            if tier.days is None and i != len(tiers) - 1:
+                raise ValueError("Only the last retention tier may omit its number of days")
+            if tier.days is not None:
+                if tier.days <= previous:
+                    raise ValueError("Retention tiers must cover increasing ages")
+                previous = tier.days
+        self.tiers = tiers
+
+    @classmethod
+    def parse(cls, spec: str) -> "RetentionPolicy":
+        tiers = []
+        for part in spec.split(","):
+            bucket, _, days = part.strip().partition(":")
+            tiers.append(RetentionTier(bucket=bucket.strip(), days=int(days) if days else None))
+        return cls(tiers)
+
+    def bucket_of(self, scan_date: datetime, now: datetime) -> Optional[Tuple]:
+        """The bucket a scan falls into, or None if it is older than every tier."""
+        age = now - scan_date
+        for tier in self.tiers:
+            if tier.days is None or age < timedelta(days=tier.days):
+                if tier.bucket == "day":
+                    return ("day", scan_date.date())
+                if tier.bucket == "week":
+                    return ("week",) + tuple(scan_date.isocalendar())[:2]
+                return ("month", scan_date.year, scan_date.month)
+        return None
+
+    def __str__(self) -> str:
+        return ",".join(f"{t.bucket}:{t.days}" if t.days is not None else t.bucket for t in self.tiers)
+
+
+@dataclass
+class RetentionPlan:
+    """Scans to delete and configuration rows to move before deleting them."""
+    scanned: int = 0
+    pruned: List[int] = field(default_factory=list)
+    # Pruned scan holding configuration rows -> kept scan that takes them over
+    rehomed: Dict[int, int] = field(default_factory=dict)
+
+
+def _protected_scan_ids(db: Session) -> Set[int]:
+    """Scans that must survive: current pointers and the holders of current configurations."""
+    protected: Set[int] = set()
+    for scan_result_id, config_scan_id in db.query(LatestScan.scan_result_id, LatestScan.config_scan_id):
+        protected.add(scan_result_id)
+        if config_scan_id:
+            protected.add(config_scan_id)
+
+    # New scans are deduplicated against the newest change-log entry of their domain
+    newest = (
+        db.query(ConfigChange.domain_id, func.max(ConfigChange.id).label("id"))
+        .group_by(ConfigChange.domain_id)
+        .subquery()
+    )
+    for (scan_result_id,) in db.query(ConfigChange.scan_result_id).join(newest, newest.c.id == ConfigChange.id):
+        if scan_result_id:
+            protected.add(scan_result_id)
+    return protected
+
+
+def plan_retention(db: Session, policy: RetentionPolicy, now: Optional[datetime] = None) -> RetentionPlan:
+    """
+    Decide which scans the policy prunes, streaming only (id, domain, date, status, reference).
+
+    A pruned scan whose configuration rows are still referenced by kept scans hands them
+    over to the oldest of those scans.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    protected = _protected_scan_ids(db)
+    plan = RetentionPlan()
+
+    rows = (
+        db.query(ScanResult.id, ScanResult.domain_id, ScanResult.scan_date, ScanResult.scan_status, ScanResult.config_scan_id)
+        .order_by(ScanResult.domain_id, ScanResult.scan_date.desc(), ScanResult.id.desc())
+        .yield_per(STREAM_BATCH_SIZE)
+    )
+    for _, scans in groupby(rows, key=lambda row: row.domain_id):
+        scans = list(scans)
+        plan.scanned += len(scans)
+
+        # Newest successful scan per bucket, else the newest scan of the bucket
+        keepers: Dict[Tuple, Tuple[int, bool]] = {}
+        for scan in scans:
+            bucket = policy.bucket_of(scan.scan_date, now)
+            if bucket is None:
+                continue
+            success = scan.scan_status == "SUCCESS"
+            if bucket not in keepers or (success and not keepers[bucket][1]):
+                keepers[bucket] = (scan.id, success)
+        kept = {scan_id for scan_id, _ in keepers.values()} | ({scan.id for scan in scans} & protected)
+
+        pruned = {scan.id for scan in scans if scan.id not in kept}
+        plan.pruned.extend(sorted(pruned))
+
+        # Scans run newest first, so the last kept referencer seen is the oldest one
+        for scan in scans:
+            if scan.id in kept and scan.config_scan_id in pruned:
+                plan.rehomed[scan.config_scan_id] = scan.id
+    return plan
+
+
+def handover_targets(db: Session, scan_result_ids: List[int]) -> Dict[int, int]:
+    """For scans about to be deleted, the oldest surviving scan referencing each one's configuration rows."""
+    doomed = set(scan_result_ids)
+    rehomed: Dict[int, int] = {}
+    rows = (
+        db.query(ScanResult.id, ScanResult.config_scan_id)
+        .filter(ScanResult.config_scan_id.in_(scan_result_ids))
+        .order_by(ScanResult.scan_date, ScanResult.id)
+    )
+    for scan_result_id, config_scan_id in rows:
+        if scan_result_id not in doomed:
+            rehomed.setdefault(config_scan_id, scan_result_id)
+    return rehomed
+
+
+def _id_table(db: Session, name: str, *columns: str) -> Table:
+    """Create a temporary table of integer ids on the session's connection."""
+    table = Table(
+        name, MetaData(),
+        *(Column(column, Integer, primary_key=(i == 0)) for i, column in enumerate(columns)),
+        prefixes=["TEMPORARY"],
+    )
+    table.create(db.connection())
+    return table
+
+
+def _fill(db: Session, table: Table, rows: List[dict]):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(table.insert(), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def delete_scans(db: Session, scan_result_ids: List[int], rehomed: Optional[Dict[int, int]] = None) -> int:
+    """
+    Delete scans and their child rows with one set-based statement per table.
+
+    Configuration rows of pruned scans listed in rehomed are first moved to the kept
+    scan that takes them over, and every reference is pointed at it. Change-log entries
+    of configurations that are gone keep their details with NULL scan references, and
+    locations of IPs no scan uses any more are dropped. Runs inside the caller's transaction.
+
+    Returns:
+        Number of scans deleted
+    """
+    if not scan_result_ids:
+        return 0
+
+    if rehomed:
+        moves = _id_table(db, "retention_rehome", "old_id", "new_id")
+        _fill(db, moves, [{"old_id": old, "new_id": new} for old, new in rehomed.items()])
+        moved = select(moves.c.old_id)
+
+        def new_id(column):
+            return select(moves.c.new_id).where(moves.c.old_id == column).scalar_subquery()
+
+        for model in CHILD_TABLES:
+            table = model.__table__
+            db.execute(update(table).where(table.c.scan_result_id.in_(moved)).values(scan_result_id=new_id(table.c.scan_result_id)))
+
+        scans = ScanResult.__table__
+        db.execute(update(scans).where(scans.c.config_scan_id.in_(moved)).values(config_scan_id=new_id(scans.c.config_scan_id)))
+        # The new holders now reference themselves
+        db.execute(update(scans).where(scans.c.config_scan_id == scans.c.id).values(config_scan_id=None))
+
+        latest = LatestScan.__table__
+        db.execute(update(latest).where(latest.c.config_scan_id.in_(moved)).values(config_scan_id=new_id(latest.c.config_scan_id)))
+
+        changes = ConfigChange.__table__
+        db.execute(update(changes).where(changes.c.scan_result_id.in_(moved)).values(scan_result_id=new_id(changes.c.scan_result_id)))
+        db.execute(update(changes).where(changes.c.previous_scan_id.in_(moved)).values(previous_scan_id=new_id(changes.c.previous_scan_id)))
+        moves.drop(db.connection())
+
+    pruned_table = _id_table(db, "retention_pruned", "id")
+    _fill(db, pruned_table, [{"id": scan_result_id} for scan_result_id in scan_result_ids])
+    pruned = select(pruned_table.c.id)
+
+    for model in CHILD_TABLES:
+        table = model.__table__
+        db.execute(delete(table).where(table.c.scan_result_id.in_(pruned)))
+
+    changes = ConfigChange.__table__
+    db.execute(update(changes).where(changes.c.scan_result_id.in_(pruned)).values(scan_result_id=None))
+    db.execute(update(changes).where(changes.c.previous_scan_id.in_(pruned)).values(previous_scan_id=None))
+
+    scans = ScanResult.__table__
+    # Pruned scans may still reference each other; clear that first so the order of deletion is free
+    db.execute(update(scans).where(scans.c.id.in_(pruned), scans.c.config_scan_id.isnot(None)).values(config_scan_id=None))
+    deleted = db.execute(delete(scans).where(scans.c.id.in_(pruned))).rowcount
+    pruned_table.drop(db.connection())
+
+    locations = GeoLocation.__table__
+    db.execute(delete(locations).where(~select(scans.c.id).where(scans.c.ip_address == locations.c.ip_address).exists()))
+    return deleted
+
+
+def discard_scans(db: Session, scan_result_ids: List[int]) -> int:
+    """
+    Delete scans as if they had never been stored, e.g. the results of a broken run.
+
+    Unlike pruning, which never touches current scans, a discarded scan may be its
+    domain's latest: latest_scans is recomputed for the affected domains only, and the
+    statistics snapshots and daily rollups get withdraw/add deltas for those domains
+    instead of being rebuilt. Runs inside the caller's transaction.
+
+    Returns:
+        Number of scans deleted
+    """
+    if not scan_result_ids:
+        return 0
+    domain_ids = [
+        domain_id for (domain_id,) in
+        db.query(ScanResult.domain_id).filter(ScanResult.id.in_(scan_result_ids), ScanResult.domain_id.isnot(None)).distinct()
+    ]
+    statistics = DailyStatisticsWriter(db)
+    rollups = DailyRollupWriter(db)
+
+    def current() -> List[Dict]:
+        columns = [getattr(LatestScan, key) for key in HOT_FIELDS]
+        return [dict(zip(HOT_FIELDS, row)) for row in db.query(*columns).filter(LatestScan.domain_id.in_(domain_ids))]
+
+    def replay(sign: int):
+        # Every pointer move of the domains' history, taken back (-1) or recorded again (1)
+        previous: Dict[int, Dict] = {}
+        for domain_id, tld, hot in iter_scan_history(db, domain_ids):
+            rollups.record(LatestScanChange(domain_id=domain_id, previous=previous.get(domain_id), current=hot), tld, sign=sign)
+            previous[domain_id] = hot
+
+    replay(-1)
+    for hot in current():
+        statistics.record_stored(day_of(hot["scan_date"]), hot, sign=-1)
+    # Withdrawn while their configuration rows still exist
+    statistics.flush()
+
+    latest = LatestScan.__table__
+    db.execute(delete(latest).where(latest.c.domain_id.in_(domain_ids)))
+    deleted = delete_scans(db, scan_result_ids, handover_targets(db, scan_result_ids))
+    rebuild_latest_scans(db, domain_ids)
+
+    replay(1)
+    for hot in current():
+        statistics.record_stored(day_of(hot["scan_date"]), hot)
+    statistics.flush()
+    rollups.flush()
+    return deleted
+
+
+def archive_scans(db: Session, scan_result_ids: List[int], directory: str) -> str:
+    """Write the hot fields of the given scans to a compressed columnar snapshot before they are deleted."""
+    ids = _id_table(db, "retention_archive", "id")
+    _fill(db, ids, [{"id": scan_result_id} for scan_result_id in scan_result_ids])
+
+    path = os.path.join(directory, datetime.now(timezone.utc).strftime("pruned-%Y%m%dT%H%M%SZ"))
+    writer = ColumnarSnapshotWriter(path, HISTORY_SCHEMA, compressed=True)
+    for row in iter_history_rows(db, select(ids.c.id)):
+        writer.add(row)
+    writer.close()
+    ids.drop(db.connection())
+    return path
+
+
+def maintain_database(engine: Engine, pruned_fraction: float):
+    """
+    Refresh planner statistics after a prune, and reclaim space when enough was deleted.
+
+    SQLite is ANALYZEd every run and VACUUMed (a full rewrite) once a run prunes at
+    least VACUUM_THRESHOLD of the scans; PostgreSQL gets VACUUM ANALYZE on the touched
+    tables, which does not block writers.
+    """
+    tables = [model.__tablename__ for model in (ScanResult, *CHILD_TABLES, GeoLocation, ConfigChange)]
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "sqlite":
+            if pruned_fraction >= VACUUM_THRESHOLD:
+                logger.info("Vacuuming database")
+                conn.exec_driver_sql("VACUUM")
+            conn.exec_driver_sql("ANALYZE")
+        elif engine.dialect.name == "postgresql":
+            for table in tables:
+                conn.exec_driver_sql(f"VACUUM ANALYZE {table}")
+        else:
+            logger.info(f"No maintenance defined for {engine.dialect.name}; skipping")
+
+
+def run_retention(db: Session, policy: RetentionPolicy, archive_dir: Optional[str] = None,
+                  dry_run: bool = False, now: Optional[datetime] = None) -> RetentionPlan:
+    """
+    Apply a retention policy: plan, optionally archive, delete and commit.
+
+    Returns:
+        The executed (or, with dry_run, the proposed) plan
+    """
+    plan = plan_retention(db, policy, now)
+    logger.info(f"Retention policy {policy}: pruning {len(plan.pruned)} of {plan.scanned} scans "
+                f"({len(plan.rehomed)} configurations handed over to kept scans)")
+    if dry_run or not plan.pruned:
+        return plan
+
+    if archive_dir:
+        logger.info(f"Archived pruned scans to {archive_scans(db, plan.pruned, archive_dir)}")
+
+    deleted = delete_scans(db, plan.pruned, plan.rehomed)
+    db.commit()
+    logger.info(f"Deleted {deleted} scans")
+    return plan
@@ -0,0 +1,232 @@
+import logging
+from datetime import datetime
+from collections import defaultdict
+from itertools import groupby
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from scanner.models import Domain, ScanResult, Certificate, PQCInfo, TLSVersion, GeoLocation, DailyRollup
+from scanner.latest_scan import LatestScanChange, _naive_utc
+from scanner.statistics import ScanStatistics, day_of
+from scanner.ca_classifier import CAClassifier
+
+logger = logging.getLogger(__name__)
+
+# Segments every domain's current scan is rolled up into, besides "all"
+SEGMENT_SCOPES = ("tld", "country")
+
+# Segments per scope (largest by current domain count) given a trend series
+TREND_SEGMENTS = 8
+
+# Distributions carried into the trend series
+TREND_DISTRIBUTIONS = ("grade", "tls", "ca")
+
+# Rows fetched per round trip while replaying scan history
+STREAM_BATCH_SIZE = 1000
+
+
+def segment_keys(tld: str, hot: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(scope, scope_key) pairs a scan with the given hot fields is rolled up into."""
+    return [
+        ("all", ""),
+        ("tld", tld or "Unknown"),
+        ("country", hot["country"] or "Unknown"),
+    ]
+
+
+class DailyRollupWriter:
+    """
+    Accumulates per-day, per-segment deltas in daily_rollups as latest-scan pointers move.
+
+    Like the statistics snapshots, each row holds the net change that day's writes made
+    to a segment, so a segment's rows summed up to a day give its state at that day's end.
+    Only the hot fields are rolled up; cipher and PQC algorithm details are not.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.days: Dict[datetime, Dict[Tuple[str, str], ScanStatistics]] = {}
+
+    def record(self, change: LatestScanChange, tld: str, sign: int = 1):
+        """
+        Record the replacement of a domain's current scan (hot fields in change), or take
+        a recorded one back with sign=-1 (e.g. when the scan is deleted from history).
+        """
+        day = day_of(change.current["scan_date"])
+        if day not in self.days:
+            self.days[day] = defaultdict(ScanStatistics)
+        segments = self.days[day]
+        if change.previous:
+            # The previous scan may sit in another segment (e.g. the server moved country)
+            for key in segment_keys(tld, change.previous):
+                segments[key].add_scan(change.previous, [], [], sign=-sign)
+        for key in segment_keys(tld, change.current):
+            segments[key].add_scan(change.current, [], [], sign=sign)
+
+    def flush(self):
+        """Merge the accumulated deltas into daily_rollups (inside the caller's transaction)."""
+        for day, segments in self.days.items():
+            existing = {
+                (row.scope, row.scope_key): row
+                for row in self.db.query(DailyRollup).filter(DailyRollup.day == day)
+            }
+            for (scope, scope_key), delta in segments.items():
+                if delta.is_zero():
+                    continue
+                row = existing.get((scope, scope_key))
+                if row is None:
+                    self.db.add(DailyRollup(day=day, scope=scope, scope_key=scope_key, statistics_json=delta.to_json()))
+                else:
+                    merged = ScanStatistics.from_json(row.statistics_json)
+                    merged.merge(delta)
+                    row.statistics_json = merged.to_json()
+        self.days = {}
+
+
+def iter_scan_history(db: Session, domain_ids: Optional[List[int]] = None) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+    """
+    Stream (domain_id, tld, hot fields) of every stored scan (of the given domains only,
+    if any) in latest-pointer order.
+
+    Uses a fixed number of queries regardless of how much history is stored.
+    """
+    # Unchanged scans keep their configuration rows on the scan they reference
+    configuration_id = func.coalesce(ScanResult.config_scan_id, ScanResult.id)
+    max_tls = (
+        db.query(TLSVersion.scan_result_id, func.max(TLSVersion.version).label("version"))
+        .filter(TLSVersion.is_supported.is_(True))
+        .group_by(TLSVersion.scan_result_id)
+        .subquery()
+    )
+
+    rows = (
+        db.query(
+            ScanResult.domain_id,
+            Domain.tld,
+            ScanResult.id,
+            ScanResult.scan_date,
+            ScanResult.scan_status,
+            ScanResult.grade,
+            ScanResult.score,
+            max_tls.c.version,
+            PQCInfo.is_supported,
+            Certificate.issuer,
+            Certificate.issuer_organization,
+            Certificate.issuer_common_name,
+            Certificate.ca_type,
+            GeoLocation.country_name,
+        )
+        .join(Domain, Domain.id == ScanResult.domain_id)
+        .outerjoin(max_tls, max_tls.c.scan_result_id == configuration_id)
+        .outerjoin(PQCInfo, PQCInfo.scan_result_id == configuration_id)
+        .outerjoin(Certificate, Certificate.scan_result_id == configuration_id)
+        .outerjoin(GeoLocation, GeoLocation.ip_address == ScanResult.ip_address)
+    )
+    if domain_ids is not None:
+        rows = rows.filter(ScanResult.domain_id.in_(domain_ids))
+    rows = rows.order_by(ScanResult.scan_date, ScanResult.id).yield_per(STREAM_BATCH_SIZE)
+
+    for domain_id, tld, scan_result_id, scan_date, status, grade, score, tls, pqc, issuer, organization, common_name, ca_type, country in rows:
+        yield domain_id, tld, {
+            "scan_result_id": scan_result_id,
+            "scan_date": _naive_utc(scan_date),
+            "scan_status": status,
+            "grade": grade,
+            "score": score,
+            "max_tls_version": tls,
+            "pqc_supported": bool(pqc),
+            "issuer": CAClassifier.describe(issuer, organization, common_name).display_name if issuer else None,
+            "ca_type": ca_type,
+            "country": country,
+        }
+
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recompute daily_rollups by replaying every stored scan in order.
+
+    Used for databases written before rollups existed, or after stored scans were
+    changed in place. Unlike the statistics baseline, the full history is kept.
+
+    Returns:
+        Number of rollup rows written
+    """
+    db.query(DailyRollup).delete(synchronize_session=False)
+
+    writer = DailyRollupWriter(db)
+    current: Dict[int, Dict[str, Any]] = {}
+    for domain_id, tld, hot in iter_scan_history(db):
+        writer.record(LatestScanChange(domain_id=domain_id, previous=current.get(domain_id), current=hot), tld)
+        current[domain_id] = hot
+    writer.flush()
+    db.flush()
+
+    count = db.query(DailyRollup).count()
+    logger.info(f"Rebuilt {count} daily rollup rows for {len(current)} domains")
+    return count
+
+
+def load_trends(db: Session, segments: int = TREND_SEGMENTS) -> Dict[str, Any]:
+    """
+    Turn daily_rollups into per-day trend series with running sums.
+
+    Returns:
+        {"days": [...], "all": {...}, "tld": {key: {...}}, "country": {key: {...}}} where every
+        series has one value per day: domains, pqc_count and score_sum for each segment, plus
+        grade/tls/ca counts for "all". Only the largest segments of each scope are included.
+    """
+    rows = (
+        db.query(DailyRollup.day, DailyRollup.scope, DailyRollup.scope_key, DailyRollup.statistics_json)
+        .order_by(DailyRollup.day)
+    )
+
+    days: List[str] = []
+    running: Dict[Tuple[str, str], ScanStatistics] = {}
+    # (scope, key) -> per-day (domains, pqc_count, score_sum), filled from the first day the segment appears
+    series: Dict[Tuple[str, str], List[Tuple[int, int, float]]] = {}
+    # Per-day counts of the trend distributions of "all"
+    overall: List[Dict[str, Dict[str, int]]] = []
+
+    for day, group in groupby(rows, key=lambda row: row.day):
+        for _, scope, scope_key, statistics_json in group:
+            running.setdefault((scope, scope_key), ScanStatistics()).merge(ScanStatistics.from_json(statistics_json))
+
+        index = len(days)
+        days.append(day.strftime("%Y-%m-%d"))
+        for key, stats in running.items():
+            points = series.setdefault(key, [])
+            points.extend([(0, 0, 0.0)] * (index - len(points)))
+            points.append((stats.domains, stats.pqc_count, round(stats.score_sum, 1)))
+
+        totals = running.get(("all", ""), ScanStatistics())
+        overall.append({name: totals.distribution(name) for name in TREND_DISTRIBUTIONS})
+
+    def columns(points: List[Tuple[int, int, float]]) -> Dict[str, list]:
+        return {
+            "domains": [p[0] for p in points],
+            "pqc_count": [p[1] for p in points],
+            "score_sum": [p[2] for p in points],
+        }
+
+    trends: Dict[str, Any] = {"days": days, "all": columns(series.get(("all", ""), []))}
+    final = overall[-1] if overall else {}
+    for name in TREND_DISTRIBUTIONS:
+        # The largest values by current count get a series; the rest are summed into "Other"
+        counts = final.get(name, {})
+        kept = sorted(counts, key=lambda key: (-counts[key], key))[:segments]
+        distribution = {key: [counts_of_day[name].get(key, 0) for counts_of_day in overall] for key in kept}
+        other = [
+            sum(count for key, count in counts_of_day[name].items() if key not in kept)
+            for counts_of_day in overall
+        ]
+        if any(other):
+            distribution["Other"] = other
+        trends["all"][name] = distribution
+
+    for scope in SEGMENT_SCOPES:
+        largest = sorted(
+            (key for key in running if key[0] == scope and running[key].domains > 0),
+            key=lambda key: (-running[key].domains, key),
+        )[:segments]
+        trends[scope] = {scope_key: columns(series[(scope, scope_key)]) for _, scope_key in largest}
+    return trends
@@ -0,0 +1,234 @@
+import math
+import random
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, case, insert, select
+from sqlalchemy.orm import Session
+from scanner.loader import DomainEntry
+from scanner.models import Domain, LatestScan, SamplingStratum, SampledDomain
+from scanner.target_list import TargetList
+
+logger = logging.getLogger(__name__)
+
+# Rank bands of a nightly design: each band is sampled separately, so the top of the
+# list is never drowned out by the long tail (TLD/FIRST-LAST:SIZE, TLD optional)
+DEFAULT_STRATA = "1-1000:250,1001-10000:250,10001-100000:250,100001-1000000:250"
+
+# Only scans this recent count towards the estimates
+ESTIMATE_WINDOW_DAYS = 30
+
+# Two-sided 95% normal interval
+CONFIDENCE = 0.95
+Z_SCORE = 1.959964
+
+
+@dataclass
+class Stratum:
+    rank_first: int
+    rank_last: int
+    size: int
+    tld: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        band = f"{self.rank_first}-{self.rank_last}"
+        return f".{self.tld} {band}" if self.tld else band
+
+    def contains(self, entry: DomainEntry) -> bool:
+        return (self.tld is None or self.tld == entry.tld) and self.rank_first <= entry.rank <= self.rank_last
+
+    def overlaps(self, other: "Stratum") -> bool:
+        same_domains = self.tld is None or other.tld is None or self.tld == other.tld
+        return same_domains and self.rank_first <= other.rank_last and other.rank_first <= self.rank_last
+
+
+def parse_strata(spec: str) -> List[Stratum]:
+    """
+    Parse a design such as "1-1000:200,1001-1000000:300,jp/1-1000000:100".
+
+    Raises:
+        ValueError: On malformed items or overlapping strata (every domain must fall in
+            at most one stratum for the weights to hold)
+    """
+    strata = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            tld, _, band = item.rpartition("/")
+            ranks, _, size = band.partition(":")
+            first, _, last = ranks.partition("-")
+            stratum = Stratum(int(first), int(last), int(size), tld or None)
+        except ValueError:
+            raise ValueError(f"Expected [TLD/]FIRST-LAST:SIZE, got {item!r}")
+        if stratum.rank_first > stratum.rank_last or stratum.size < 1:
+            raise ValueError(f"Empty stratum {item!r}")
+        for other in strata:
+            if stratum.overlaps(other):
+                raise ValueError(f"Strata {other.label} and {stratum.label} overlap")
+        strata.append(stratum)
+    if not strata:
+        raise ValueError("No strata given")
+    return strata
+
+
+def stratified_sample(targets: TargetList, strata: List[Stratum], rng: Optional[random.Random] = None) -> Tuple[List[DomainEntry], List[int]]:
+    """
+    Draw a uniform sample of each stratum's size from its domains in the target list.
+
+    Returns:
+        (sample in rank order, population of each stratum)
+    """
+    rng = rng or random.Random()
+    sample: List[DomainEntry] = []
+    populations = []
+    for stratum in strata:
+        selection = (stratum.rank_first, stratum.rank_last)
+        populations.append(len(targets.select(selection, stratum.tld)))
+        sample.extend(targets.sample(stratum.size, selection, stratum.tld, rng))
+        logger.info(f"Stratum {stratum.label}: sampled {min(stratum.size, populations[-1])} of {populations[-1]} domains")
+    sample.sort(key=lambda entry: entry.rank)
+    return sample, populations
+
+
+def save_design(db: Session, strata: List[Stratum], populations: List[int], sample: List[DomainEntry], now: datetime):
+    """
+    Store the sampling design and the domains drawn for it (inside the caller's transaction).
+
+    An unchanged design keeps its earlier draws, so the estimates pool the draws within
+    their window; a changed one replaces the strata and drops their draws.
+    """
+    stored = db.query(SamplingStratum).order_by(SamplingStratum.id).all()
+    if [(row.rank_first, row.rank_last, row.tld) for row in stored] != [(s.rank_first, s.rank_last, s.tld) for s in strata]:
+        db.query(SampledDomain).delete(synchronize_session=False)
+        db.query(SamplingStratum).delete(synchronize_session=False)
+        stored = [SamplingStratum(rank_first=s.rank_first, rank_last=s.rank_last, tld=s.tld) for s in strata]
+        db.add_all(stored)
+    for row, stratum, population in zip(stored, strata, populations):
+        row.population = population
+        row.sample_size = stratum.size
+    db.flush()
+
+    drawn = []
+    for entry in sample:
+        # Strata do not overlap, so an entry belongs to one at most
+        row = next((row for row, stratum in zip(stored, strata) if stratum.contains(entry)), None)
+        if row is not None:
+            drawn.append({"stratum_id": row.id, "domain": entry.domain, "sampled_at": now})
+    if drawn:
+        db.execute(insert(SampledDomain.__table__), drawn)
+
+
+@dataclass
+class Estimate:
+    value: float
+    low: float
+    high: float
+
+    def to_json(self) -> Dict[str, float]:
+        """Percentages, rounded for display."""
+        return {key: round(100 * getattr(self, key), 1) for key in ("value", "low", "high")}
+
+
+def stratified_proportion(strata: List[Tuple[int, int, int]]) -> Optional[Estimate]:
+    """
+    Estimate a population proportion from per-stratum samples.
+
+    Each stratum is (population N_h, scanned n_h, matching x_h); strata without scans
+    are left out, so the estimate describes the strata covered. Standard error of the
+    stratified mean with finite population correction:
+    sqrt(sum W_h^2 (1 - n_h/N_h) p_h (1 - p_h) / (n_h - 1)), W_h = N_h / N.
+    """
+    covered = [(population, scanned, matching) for population, scanned, matching in strata if scanned]
+    total = sum(population for population, _, _ in covered)
+    if not total:
+        return None
+
+    value = variance = 0.0
+    for population, scanned, matching in covered:
+        weight = population / total
+        share = matching / scanned
+        value += weight * share
+        correction = max(0.0, 1 - scanned / population)
+        variance += weight ** 2 * correction * share * (1 - share) / max(scanned - 1, 1)
+    margin = Z_SCORE * math.sqrt(variance)
+    return Estimate(value, max(0.0, value - margin), min(1.0, value + margin))
+
+
+def _stratum_counts(db: Session, stratum: SamplingStratum, since: datetime) -> Tuple[int, int, int, Dict[str, int]]:
+    """(scanned, PQC, TLS 1.3, count per grade) over the recent successful scans of the domains drawn for a stratum."""
+    drawn = (
+        select(SampledDomain.domain)
+        .where(SampledDomain.stratum_id == stratum.id, SampledDomain.sampled_at >= since)
+        .distinct()
+        .subquery()
+    )
+    query = (
+        db.query(
+            LatestScan.grade,
+            func.count(),
+            func.sum(case((LatestScan.pqc_supported.is_(True), 1), else_=0)),
+            func.sum(case((LatestScan.max_tls_version == "TLS 1.3", 1), else_=0)),
+        )
+        .join(Domain, Domain.id == LatestScan.domain_id)
+        .join(drawn, drawn.c.domain == Domain.name)
+        .filter(LatestScan.scan_status == "SUCCESS", LatestScan.scan_date >= since)
+        .group_by(LatestScan.grade)
+    )
+
+    scanned = pqc = tls13 = 0
+    grades: Dict[str, int] = {}
+    for grade, count, pqc_count, tls13_count in query:
+        scanned += count
+        pqc += int(pqc_count or 0)
+        tls13 += int(tls13_count or 0)
+        grades[grade or "Unknown"] = count
+    return scanned, pqc, tls13, grades
+
+
+def load_estimates(db: Session, now: datetime, window_days: int = ESTIMATE_WINDOW_DAYS) -> Optional[Dict[str, Any]]:
+    """
+    Design-weighted estimates, with confidence intervals, of PQC adoption, TLS 1.3 share
+    and grade mix over the population the sampling design covers; JSON-serializable for
+    the dashboard. None without a stored design.
+
+    Only the domains stratified runs drew within the window count, so each stratum's
+    scans are a uniform sample of it whatever else was scanned in its band.
+    """
+    strata = db.query(SamplingStratum).order_by(SamplingStratum.tld, SamplingStratum.rank_first).all()
+    if not strata:
+        return None
+
+    since = now - timedelta(days=window_days)
+    rows = []
+    pqc, tls13 = [], []
+    grades: Dict[str, List[Tuple[int, int, int]]] = defaultdict(list)
+    counts = [_stratum_counts(db, stratum, since) for stratum in strata]
+    grade_names = sorted({grade for _, _, _, stratum_grades in counts for grade in stratum_grades})
+    for stratum, (scanned, pqc_count, tls13_count, stratum_grades) in zip(strata, counts):
+        population = stratum.population
+        rows.append({
+            "label": Stratum(stratum.rank_first, stratum.rank_last, stratum.sample_size, stratum.tld).label,
+            "population": population,
+            "scanned": scanned,
+        })
+        pqc.append((population, scanned, pqc_count))
+        tls13.append((population, scanned, tls13_count))
+        for grade in grade_names:
+            grades[grade].append((population, scanned, stratum_grades.get(grade, 0)))
+
+    def estimate(strata_counts):
+        result = stratified_proportion(strata_counts)
+        return result.to_json() if result else None
+
+    return {
+        "generated_at": now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "window_days": window_days,
+        "confidence": CONFIDENCE,
+        "population": sum(row["population"] for row in rows if row["scanned"]),
+        "scanned": sum(row["scanned"] for row in rows),
+        "strata": rows,
+        "metrics": {"PQC adoption": estimate(pqc), "TLS 1.3": estimate(tls13)},
+        "grades": {grade: estimate(strata_counts) for grade, strata_counts in grades.items()},
+    }
@@ -8,11 +8,12 @@ from sslyze import (
     ScanCommand,
     ServerScanResult,
 )
-from sslyze.errors import ConnectionToServerFailed
+from sslyze.errors import ConnectionToServerFailed, ServerHostnameCouldNotBeResolved
 from scanner.models import ScanResult, TLSVersion, CipherSuite, Certificate, PQCInfo
 from scanner.pqc_scanner import PQCScanner
 from scanner.ca_classifier import CAClassifier
 from scanner.security_grader import SecurityGrader
+from scanner.chain_validator import ChainValidator
 
 # PQC Codepoints (IANA & Drafts)
 # Based on https://github.com/google/boringssl/blob/master/include/openssl/nid.h and other sources
@@ -35,13 +36,28 @@ class TLSScanner:
             logger.info("PQC scanning enabled via pqcscan")
         else:
             logger.warning("PQC scanning disabled (pqcscan not available)")
+        try:
+            self.chain_validator = ChainValidator.shared()
+        except Exception as e:
+            logger.warning(f"Certificate chain validation disabled (trust store not loaded: {e})")
+            self.chain_validator = None
     
     def scan_domain(self, domain: str) -> ScanResult:
         logger.info(f"Starting scan for {domain}")
         scan_start_time = datetime.now(timezone.utc)
-        
+
         try:
             location = ServerNetworkLocation(hostname=domain, port=443)
+        except ServerHostnameCouldNotBeResolved as e:
+            return self._create_error_result(domain, scan_start_time, f"DNS resolution failed: {str(e)}")
+
+        result = self._scan_location(domain, location, scan_start_time)
+        # Kept with every scan, failed or not; GeoIP enrichment resolves it later
+        result.ip_address = location.ip_address
+        return result
+
+    def _scan_location(self, domain: str, location: ServerNetworkLocation, scan_start_time: datetime) -> ScanResult:
+        try:
             scan_request = ServerScanRequest(
                 server_location=location,
                 scan_commands=[
@@ -99,7 +115,7 @@ class TLSScanner:
         self._parse_tls_versions_and_ciphers(result, scan_result)
 
         # 2. Certificate Info
-        self._parse_certificate_info(result, scan_result)
+        self._parse_certificate_info(domain, result, scan_result)
 
         # 3. PQC Info (Prototype logic)
         self._parse_pqc_info(result, scan_result)
@@ -143,7 +159,7 @@ class TLSScanner:
                             # We might need to refine attribute access based on exact sslyze version objects
                             # For now, storing name is most critical
                             tls_version=version_str,
-                            is_weak="NULL" in suite.name or "EXPORT" in suite.name or "RC4" in suite.name or "DES" in suite.name
+                            is_weak=SecurityGrader.is_weak_cipher(suite.name)
                         ))
 
             scan_result_model.tls_versions.append(TLSVersion(
@@ -151,13 +167,14 @@ class TLSScanner:
                 is_supported=is_supported
             ))
 
-    def _parse_certificate_info(self, result: ServerScanResult, scan_result_model: ScanResult):
+    def _parse_certificate_info(self, domain: str, result: ServerScanResult, scan_result_model: ScanResult):
         cert_result = result.certificate_info
         if cert_result and cert_result.status == "COMPLETED":
             deployments = cert_result.result.certificate_deployments
             if deployments:
                 # Use the leaf certificate of the first deployment
-                leaf_cert = deployments[0].received_certificate_chain[0]
+                received_chain = deployments[0].received_certificate_chain
+                leaf_cert = received_chain[0]
                 
                 # Get certificate PEM
                 from cryptography.hazmat.primitives import serialization
@@ -165,18 +182,29 @@ class TLSScanner:
                 
                 # Classify CA type
                 issuer_str = str(leaf_cert.issuer)
-                ca_type = CAClassifier.classify(issuer_str)
+                organization, common_name = CAClassifier.name_attributes(leaf_cert.issuer)
+                ca_type = CAClassifier.describe(issuer_str, organization, common_name).ca_type
+
+                # Validate against the local trust store (None if it could not be loaded)
+                is_valid = None
+                if self.chain_validator:
+                    verdict = self.chain_validator.validate(received_chain, domain)
+                    is_valid = verdict.valid
+                    if not verdict.valid:
+                        logger.info(f"Certificate of {domain} failed validation: {verdict.error}")
                 
                 scan_result_model.certificate = Certificate(
                     signature_algorithm=getattr(leaf_cert.signature_algorithm_oid, "_name", str(leaf_cert.signature_algorithm_oid)), 
                     public_key_algorithm=getattr(leaf_cert.public_key().algorithm_oid, "_name", str(leaf_cert.public_key().algorithm_oid)) if hasattr(leaf_cert.public_key(), "algorithm_oid") else "Unknown",
                     public_key_size=leaf_cert.public_key().key_size,
                     issuer=issuer_str,
+                    issuer_organization=organization,
+                    issuer_common_name=common_name,
                     subject=str(leaf_cert.subject),
                     ca_type=ca_type,
                     valid_from=leaf_cert.not_valid_before_utc,
                     valid_until=leaf_cert.not_valid_after_utc,
-                    is_valid=True,  # Simplified validation
+                    is_valid=is_valid,
                     certificate_pem=cert_pem
                 )
 
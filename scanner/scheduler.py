@@ -0,0 +1,232 @@
+import math
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, update, delete, exists, func, bindparam
+from sqlalchemy.orm import Session
+from scanner.loader import DomainEntry
+from scanner.models import Domain, LatestScan, ConfigChange, ScanSchedule
+from scanner.target_list import TargetList
+
+logger = logging.getLogger(__name__)
+
+# Bounds of a domain's rescan interval
+MIN_INTERVAL_DAYS = 1.0
+MAX_INTERVAL_DAYS = 30.0
+
+# Domains ranked up to TOP_RANK are due daily; the interval then grows by
+# RANK_INTERVAL_GROWTH days per tenfold rank (about 22 days at rank 1,000,000)
+TOP_RANK = 1000
+RANK_INTERVAL_GROWTH = 7.0
+
+# Rescan often enough to expect this many configuration changes between two scans
+CHANGES_PER_INTERVAL = 0.5
+
+# Prior of the change rate (one change a month), so a few scans do not swing it
+PRIOR_CHANGES = 1.0
+PRIOR_DAYS = 30.0
+
+# Urgency of a domain never scanned, as if it were a full interval overdue
+NEW_ENTRANT_URGENCY = 2.0
+
+# Target list rows inserted per statement while syncing
+SYNC_BATCH_SIZE = 5000
+
+
+@dataclass
+class ScanPlan:
+    entries: List[DomainEntry]
+    # Domains due at planning time, scanned and never scanned
+    due: int = 0
+    due_new: int = 0
+    # Of the planned entries, domains never scanned
+    planned_new: int = 0
+
+
+def rank_interval(rank: int) -> float:
+    """Rescan interval the rank alone warrants, in days."""
+    if rank <= TOP_RANK:
+        return MIN_INTERVAL_DAYS
+    return min(MAX_INTERVAL_DAYS, MIN_INTERVAL_DAYS + RANK_INTERVAL_GROWTH * math.log10(rank / TOP_RANK))
+
+
+def change_rate(changes: int, observed_days: float) -> float:
+    """Configuration changes per day, smoothed towards the prior."""
+    return (changes + PRIOR_CHANGES) / (max(observed_days, 0.0) + PRIOR_DAYS)
+
+
+def rescan_interval(rank: int, rate: float) -> float:
+    """The rank's interval, shortened for domains that change often enough to need it."""
+    return max(MIN_INTERVAL_DAYS, min(rank_interval(rank), CHANGES_PER_INTERVAL / rate))
+
+
+def priority_at(rank: int, due: datetime, interval_days: float) -> datetime:
+    """
+    When a domain's priority reaches 1, that of a top-ranked domain just coming due.
+
+    Priority is a rank weight (1 / log10(rank + 9)) times urgency, which is 1 when the
+    domain comes due and grows by 1 per interval it stays overdue. Due domains are
+    scanned in order of this time, which is stored and indexed, rather than of their
+    priority at planning time, so picking a budget reads only the domains picked.
+    """
+    return due + timedelta(days=interval_days * (math.log10(rank + 9) - 1))
+
+
+def entrant_priority_at(rank: int, first_seen: datetime) -> datetime:
+    """priority_at of a domain never scanned: its rank's interval, NEW_ENTRANT_URGENCY - 1 of them overdue when listed."""
+    interval = rank_interval(rank)
+    return priority_at(rank, first_seen - timedelta(days=interval * (NEW_ENTRANT_URGENCY - 1)), interval)
+
+
+def sync_schedule(db: Session, targets: TargetList, now: datetime):
+    """
+    Make the schedule follow the target list, set-wise through a temporary table:
+    new entrants are added due now, dropped domains removed, moved domains re-ranked.
+    Then every domain's interval and priority are recomputed, which also picks up
+    re-ranked domains, entrants scanned before and scans stored outside save_results
+    (merges, discards).
+    """
+    schedule = ScanSchedule.__table__
+    listed = Table(
+        "schedule_targets", MetaData(),
+        Column("domain", String(255), primary_key=True),
+        Column("rank", Integer, nullable=False),
+        Column("tld", String(50), nullable=False),
+        Column("priority_at", DateTime, nullable=False),
+        prefixes=["TEMPORARY"],
+    )
+    listed.create(db.connection())
+
+    batch = []
+    for index in range(len(targets)):
+        entry = targets.entry(index)
+        batch.append({"domain": entry.domain, "rank": entry.rank, "tld": entry.tld,
+                      "priority_at": entrant_priority_at(entry.rank, now)})
+        if len(batch) >= SYNC_BATCH_SIZE:
+            db.execute(listed.insert(), batch)
+            batch = []
+    if batch:
+        db.execute(listed.insert(), batch)
+
+    added = db.execute(schedule.insert().from_select(
+        ["domain", "rank", "tld", "first_seen", "next_due", "priority_at"],
+        select(listed.c.domain, listed.c.rank, listed.c.tld, bindparam("now", now), bindparam("due", now),
+               listed.c.priority_at)
+        .where(~exists().where(schedule.c.domain == listed.c.domain)),
+    )).rowcount
+    removed = db.execute(
+        delete(schedule).where(~exists().where(listed.c.domain == schedule.c.domain))
+    ).rowcount
+    moved = (
+        select(listed.c.rank)
+        .where(listed.c.domain == schedule.c.domain, listed.c.rank != schedule.c.rank)
+    )
+    reranked = db.execute(
+        update(schedule).values(rank=moved.scalar_subquery()).where(exists(moved))
+    ).rowcount
+
+    listed.drop(db.connection())
+    moved = update_intervals(db)
+    logger.info(f"Schedule synced with the target list: {added} added, {removed} removed, {reranked} re-ranked, "
+                f"{moved} moved")
+
+
+def update_intervals(db: Session, domain_ids: Optional[List[int]] = None) -> int:
+    """
+    Recompute interval, next due time and priority_at of scheduled domains from their
+    current scan and configuration history: the domains just saved (domain_ids), or
+    every domain on the schedule (those never scanned by rank and first sighting).
+    Returns how many rows moved.
+    """
+    # Correlated, so a batch of saved domains reads only their own history (by the domain index)
+    of_domain = ConfigChange.domain_id == Domain.id
+    # The first row records the first configuration, not a change
+    changes = (
+        select(func.count(ConfigChange.id)).where(of_domain, ConfigChange.changed_components != "")
+        .scalar_subquery()
+    )
+    first_change = select(func.min(ConfigChange.changed_at)).where(of_domain).scalar_subquery()
+    rows = (
+        db.query(ScanSchedule.id, ScanSchedule.rank, ScanSchedule.first_seen, ScanSchedule.next_due,
+                 ScanSchedule.interval_days, ScanSchedule.priority_at, LatestScan.scan_date, changes, first_change)
+        .outerjoin(Domain, Domain.name == ScanSchedule.domain)
+        .outerjoin(LatestScan, LatestScan.domain_id == Domain.id)
+    )
+    if domain_ids is not None:
+        if not domain_ids:
+            return 0
+        rows = rows.filter(Domain.id.in_(domain_ids))
+
+    updates = []
+    for schedule_id, rank, listed_at, next_due, interval_days, stored_priority, scanned_at, changes, first_change in rows:
+        if scanned_at is None:
+            due, priority, rate, interval = next_due, entrant_priority_at(rank, listed_at), None, None
+        else:
+            observed_days = (scanned_at - first_change).total_seconds() / 86400 if first_change else 0.0
+            rate = change_rate(int(changes or 0), observed_days)
+            interval = rescan_interval(rank, rate)
+            due = scanned_at + timedelta(days=interval)
+            priority = priority_at(rank, due, interval)
+        if due != next_due or interval != interval_days or priority != stored_priority:
+            updates.append({"b_id": schedule_id, "b_scanned": scanned_at, "b_rate": rate,
+                            "b_interval": interval, "b_due": due, "b_priority": priority})
+
+    if updates:
+        schedule = ScanSchedule.__table__
+        db.execute(
+            update(schedule).where(schedule.c.id == bindparam("b_id")).values(
+                last_scanned=bindparam("b_scanned"), change_rate=bindparam("b_rate"),
+                interval_days=bindparam("b_interval"), next_due=bindparam("b_due"),
+                priority_at=bindparam("b_priority"),
+            ),
+            updates,
+        )
+    return len(updates)
+
+
+def due_entries(db: Session, limit: int, now: datetime) -> List[DomainEntry]:
+    """
+    The limit highest-priority due domains, best first: one ordered, LIMIT-ed read of
+    the priority_at index, so its cost follows the limit rather than the schedule.
+    """
+    rows = (
+        db.query(ScanSchedule.rank, ScanSchedule.domain, ScanSchedule.tld)
+        .filter(ScanSchedule.next_due <= now)
+        .order_by(ScanSchedule.priority_at, ScanSchedule.id)
+        .limit(limit)
+    )
+    return [DomainEntry(rank=rank, domain=domain, tld=tld) for rank, domain, tld in rows]
+
+
+def plan_scans(db: Session, budget: int, now: datetime, targets: Optional[TargetList] = None) -> ScanPlan:
+    """
+    Pick tonight's budget of domains: the highest-priority domains that are due.
+
+    Syncs the schedule with the target list first (when given); the intervals and
+    priorities of scanned domains were already moved when their scans were saved,
+    so the budget is read in priority order straight from the schedule. Commits.
+    """
+    if targets is not None:
+        sync_schedule(db, targets, now)
+
+    due = ScanSchedule.next_due <= now
+    plan = ScanPlan(entries=[])
+    plan.due = db.query(func.count(ScanSchedule.id)).filter(due).scalar()
+    plan.due_new = db.query(func.count(ScanSchedule.id)).filter(due, ScanSchedule.last_scanned.is_(None)).scalar()
+
+    picked = (
+        db.query(ScanSchedule.rank, ScanSchedule.domain, ScanSchedule.tld, ScanSchedule.last_scanned)
+        .filter(due)
+        .order_by(ScanSchedule.priority_at, ScanSchedule.id)
+        .limit(budget)
+        .all()
+    )
+    plan.entries = sorted((DomainEntry(rank=rank, domain=domain, tld=tld) for rank, domain, tld, _ in picked),
+                          key=lambda entry: entry.rank)
+    plan.planned_new = sum(1 for *_, last_scanned in picked if last_scanned is None)
+    db.commit()
+
+    logger.info(f"Planned {len(plan.entries)} of {plan.due} due domains ({plan.planned_new} never scanned, "
+                f"{plan.due_new} of those due)")
+    return plan
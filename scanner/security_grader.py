@@ -1,4 +1,5 @@
 from typing import List
+import numpy as np
 from scanner.models import ScanResult, TLSVersion, CipherSuite, PQCInfo
 
 
@@ -21,6 +22,57 @@ class SecurityGrader:
         "SSL 2.0", "SSL 3.0", "TLS 1.0", "TLS 1.1"
     }
     
+    # Grades indexed by the codes grade_features returns
+    GRADES = ("S", "A", "B", "F")
+
+    @classmethod
+    def is_weak_cipher(cls, name: str) -> bool:
+        """Whether a cipher suite name contains any of the weak keywords."""
+        name = name.upper()
+        return any(keyword in name for keyword in cls.WEAK_CIPHER_KEYWORDS)
+
+    @classmethod
+    def grade_features(cls, has_deprecated, has_tls12, has_tls13, weak_count, has_pqc) -> tuple:
+        """
+        Grade scans from their features, element-wise over NumPy arrays (or scalars).
+
+        Args:
+            has_deprecated: Any deprecated protocol version supported
+            has_tls12: TLS 1.2 supported
+            has_tls13: TLS 1.3 supported
+            weak_count: Number of weak cipher suites accepted
+            has_pqc: PQC key exchange supported
+
+        Returns:
+            Tuple of (grade codes into GRADES, scores)
+        """
+        has_deprecated, has_tls12, has_tls13, has_pqc = (
+            np.asarray(flag, dtype=bool) for flag in (has_deprecated, has_tls12, has_tls13, has_pqc)
+        )
+        weak_count = np.asarray(weak_count, dtype=np.int64)
+        has_weak = weak_count > 0
+
+        # Checked in order, the first matching rule wins
+        rules = [
+            has_deprecated,                                # F: deprecated protocols
+            has_tls13 & has_pqc & ~has_weak,               # S: future-proof
+            (has_tls12 | has_tls13) & ~has_weak,           # A: secure
+            has_tls12 & has_weak,                          # B: acceptable but has weaknesses
+        ]
+        codes = np.select(rules, [3, 0, 1, 2], default=3)
+        scores = np.select(rules, [
+            40.0,
+            100.0,
+            np.where(has_tls13, 95.0, 90.0),               # Slight penalty for no TLS 1.3
+            70.0 - weak_count * 2.0,                       # Penalty for each weak cipher
+        ], default=40.0)
+
+        # Bonus for PQC support
+        scores = scores + np.where(has_pqc & ((codes == 1) | (codes == 2)), 5.0, 0.0)
+
+        # Ensure score is in valid range
+        return codes, np.clip(scores, 0.0, 100.0)
+
     @classmethod
     def calculate_grade(cls, scan_result: ScanResult) -> tuple[str, float]:
         """
@@ -34,53 +86,14 @@ class SecurityGrader:
             Grade is one of: "S", "A", "B", "F"
             Score is 0-100
         """
-        score = 100.0
-        
         # Get supported TLS versions
         supported_versions = [v.version for v in scan_result.tls_versions if v.is_supported]
-        
-        # Check for deprecated/insecure protocols
-        has_deprecated = any(v in cls.DEPRECATED_TLS_VERSIONS for v in supported_versions)
-        has_tls12 = "TLS 1.2" in supported_versions
-        has_tls13 = "TLS 1.3" in supported_versions
-        
-        # Check cipher suites
-        weak_ciphers = [c for c in scan_result.cipher_suites if c.is_weak]
-        has_weak_ciphers = len(weak_ciphers) > 0
-        
-        # Check PQC support
-        has_pqc = scan_result.pqc_info and scan_result.pqc_info.is_supported
-        
-        # Grading logic
-        if has_deprecated:
-            # F grade for deprecated protocols
-            score -= 60
-            grade = "F"
-        elif has_tls13 and has_pqc and not has_weak_ciphers:
-            # S grade: Future-proof
-            grade = "S"
-            score = 100.0
-        elif (has_tls12 or has_tls13) and not has_weak_ciphers:
-            # A grade: Secure
-            grade = "A"
-            score = 95.0
-            if not has_tls13:
-                score -= 5  # Slight penalty for no TLS 1.3
-        elif has_tls12 and has_weak_ciphers:
-            # B grade: Acceptable but has weaknesses
-            grade = "B"
-            score = 70.0
-            score -= len(weak_ciphers) * 2  # Penalty for each weak cipher
-        else:
-            # F grade: Insecure
-            grade = "F"
-            score = 40.0
-        
-        # Additional scoring adjustments
-        if has_pqc and grade in ["A", "B"]:
-            score += 5  # Bonus for PQC support
-        
-        # Ensure score is in valid range
-        score = max(0.0, min(100.0, score))
-        
-        return (grade, score)
+
+        code, score = cls.grade_features(
+            has_deprecated=any(v in cls.DEPRECATED_TLS_VERSIONS for v in supported_versions),
+            has_tls12="TLS 1.2" in supported_versions,
+            has_tls13="TLS 1.3" in supported_versions,
+            weak_count=sum(1 for c in scan_result.cipher_suites if c.is_weak),
+            has_pqc=bool(scan_result.pqc_info and scan_result.pqc_info.is_supported),
+        )
+        return (cls.GRADES[int(code)], float(score))
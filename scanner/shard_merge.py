@@ -0,0 +1,225 @@
+import os
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from sqlalchemy import Table, Column, Integer, MetaData, select, insert, delete, exists, func, literal, and_
+from sqlalchemy.orm import Session
+from scanner.models import (
+    Domain, ScanResult, LatestScan, ConfigChange, GeoLocation, ScanSchedule, SamplingStratum, SampledDomain,
+)
+from scanner.retention import CHILD_TABLES
+from scanner.statistics import rebuild_statistics
+from scanner.rollups import rebuild_rollups
+from scanner.scheduler import update_intervals
+
+logger = logging.getLogger(__name__)
+
+# Name the shard database is attached under
+SHARD_SCHEMA = "shard"
+
+
+@dataclass
+class MergeReport:
+    path: str
+    domains_added: int = 0
+    scans_added: int = 0
+    # Scans already in the merged database (same domain and scan time), e.g. from a shared base
+    scans_duplicate: int = 0
+    changes_added: int = 0
+    latest_updated: int = 0
+
+
+def _shard_table(model):
+    # Aliased, so the shard's tables never clash with the merged database's of the same name
+    table = model.__table__
+    return table.to_metadata(MetaData(), schema=SHARD_SCHEMA).alias(f"{SHARD_SCHEMA}_{table.name}")
+
+
+def _id_map(db: Session, name: str) -> Table:
+    """Temporary table mapping the shard's ids to the merged database's."""
+    table = Table(
+        name, MetaData(),
+        Column("shard_id", Integer, primary_key=True),
+        Column("id", Integer, nullable=False),
+        Column("new", Integer, nullable=False, default=0),
+        prefixes=["TEMPORARY"],
+    )
+    table.create(db.connection())
+    return table
+
+
+def _schema_version(db: Session, schema: str) -> str:
+    return db.connection().exec_driver_sql(f"SELECT version_num FROM {schema}.alembic_version").scalar()
+
+
+def _remapped(table: Table, shard, **replaced) -> Tuple[List[str], list]:
+    """Columns to insert into table (id only if replaced) and what to select for each from the shard."""
+    columns = [column.name for column in table.c if column.name != "id" or "id" in replaced]
+    return columns, [replaced.get(column, shard.c[column]) for column in columns]
+
+
+def _copy_missing(db: Session, model, key: Optional[str]) -> int:
+    """Insert the shard's rows of a table, skipping those whose natural key is already present (key None: all)."""
+    table, shard = model.__table__, _shard_table(model)
+    columns, values = _remapped(table, shard)
+    rows = select(*values)
+    if key:
+        rows = rows.where(~exists().where(table.c[key] == shard.c[key]))
+    return db.execute(insert(table).from_select(columns, rows)).rowcount
+
+
+def merge_shard(db: Session, path: str) -> MergeReport:
+    """
+    Merge the scans of one shard database into the session's SQLite database. Commits.
+
+    Domains are matched by name and scans by domain and scan time, so overlapping shards
+    (or a shard merged twice) add nothing twice. Every shard id is remapped set-wise:
+    new scans keep their id shifted past the merged database's largest, and each table
+    is copied with one INSERT ... SELECT through the id maps. A domain's latest scan is
+    the newer of the two. Statistics and rollups are left stale; merge_shards rebuilds them.
+
+    Raises:
+        ValueError: If the database is not SQLite or the shard's schema revision differs
+    """
+    report = MergeReport(path=path)
+    if db.get_bind().dialect.name != "sqlite":
+        raise ValueError("Shard databases can only be merged into a SQLite database")
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    # ATTACH is not allowed inside a transaction, so it goes first
+    db.connection().exec_driver_sql(f"ATTACH DATABASE ? AS {SHARD_SCHEMA}", (path,))
+    try:
+        shard_version, version = _schema_version(db, SHARD_SCHEMA), _schema_version(db, "main")
+        if shard_version != version:
+            raise ValueError(f"{path} is at schema revision {shard_version}, the database at {version}; "
+                             f"upgrade both with alembic first")
+
+        domains, shard_domains = Domain.__table__, _shard_table(Domain)
+        report.domains_added = _copy_missing(db, Domain, "name")
+        domain_map = _id_map(db, "merge_domains")
+        db.execute(insert(domain_map).from_select(
+            ["shard_id", "id"],
+            select(shard_domains.c.id, domains.c.id).join(domains, domains.c.name == shard_domains.c.name),
+        ))
+
+        scans, shard_scans = ScanResult.__table__, _shard_table(ScanResult)
+        scan_map = _id_map(db, "merge_scans")
+        report.scans_duplicate = db.execute(insert(scan_map).from_select(
+            ["shard_id", "id", "new"],
+            select(shard_scans.c.id, func.min(scans.c.id), literal(0))
+            .join(domain_map, domain_map.c.shard_id == shard_scans.c.domain_id)
+            .join(scans, and_(scans.c.domain_id == domain_map.c.id, scans.c.scan_date == shard_scans.c.scan_date))
+            .group_by(shard_scans.c.id),
+        )).rowcount
+        offset = db.execute(select(func.coalesce(func.max(scans.c.id), 0))).scalar()
+        report.scans_added = db.execute(insert(scan_map).from_select(
+            ["shard_id", "id", "new"],
+            select(shard_scans.c.id, shard_scans.c.id + offset, literal(1))
+            .join(domain_map, domain_map.c.shard_id == shard_scans.c.domain_id)
+            .where(~exists().where(scan_map.c.shard_id == shard_scans.c.id)),
+        )).rowcount
+
+        def merged_scan(column):
+            # Aliased, so it is not correlated with the scan map joined by the outer select
+            lookup = scan_map.alias()
+            return select(lookup.c.id).where(lookup.c.shard_id == column).scalar_subquery()
+
+        columns, values = _remapped(scans, shard_scans, id=scan_map.c.id, domain_id=domain_map.c.id,
+                                   config_scan_id=merged_scan(shard_scans.c.config_scan_id))
+        db.execute(insert(scans).from_select(
+            columns,
+            select(*values)
+            .join(scan_map, and_(scan_map.c.shard_id == shard_scans.c.id, scan_map.c.new == 1))
+            .join(domain_map, domain_map.c.shard_id == shard_scans.c.domain_id),
+        ))
+
+        for model in CHILD_TABLES:
+            table, shard = model.__table__, _shard_table(model)
+            columns, values = _remapped(table, shard, scan_result_id=scan_map.c.id)
+            db.execute(insert(table).from_select(
+                columns,
+                select(*values).join(scan_map, and_(scan_map.c.shard_id == shard.c.scan_result_id, scan_map.c.new == 1)),
+            ))
+
+        changes, shard_changes = ConfigChange.__table__, _shard_table(ConfigChange)
+        columns, values = _remapped(changes, shard_changes, domain_id=domain_map.c.id,
+                                   scan_result_id=merged_scan(shard_changes.c.scan_result_id),
+                                   previous_scan_id=merged_scan(shard_changes.c.previous_scan_id))
+        report.changes_added = db.execute(insert(changes).from_select(
+            columns,
+            select(*values)
+            .join(domain_map, domain_map.c.shard_id == shard_changes.c.domain_id)
+            .where(~exists().where(
+                changes.c.domain_id == domain_map.c.id,
+                changes.c.changed_at == shard_changes.c.changed_at,
+                changes.c.config_hash == shard_changes.c.config_hash,
+            )),
+        )).rowcount
+
+        latest, shard_latest = LatestScan.__table__, _shard_table(LatestScan)
+        # Older current states give way to the shard's, then every domain without one takes it
+        db.execute(delete(latest).where(exists(
+            select(shard_latest.c.domain_id)
+            .join(domain_map, domain_map.c.shard_id == shard_latest.c.domain_id)
+            .where(domain_map.c.id == latest.c.domain_id, shard_latest.c.scan_date > latest.c.scan_date)
+        )))
+        columns, values = _remapped(latest, shard_latest, domain_id=domain_map.c.id,
+                                   scan_result_id=merged_scan(shard_latest.c.scan_result_id),
+                                   config_scan_id=merged_scan(shard_latest.c.config_scan_id))
+        report.latest_updated = db.execute(insert(latest).from_select(
+            columns,
+            select(*values)
+            .join(domain_map, domain_map.c.shard_id == shard_latest.c.domain_id)
+            .where(~exists().where(latest.c.domain_id == domain_map.c.id)),
+        )).rowcount
+
+        _copy_missing(db, GeoLocation, "ip_address")
+        # Intervals and due times follow from the merged scans once all shards are in
+        _copy_missing(db, ScanSchedule, "domain")
+        if not db.query(SamplingStratum.id).first():
+            _copy_missing(db, SamplingStratum, None)
+        # Draws follow their stratum by its bounds (ids differ between databases); runners
+        # sharing a seed each drew part of the same sample
+        sampled, shard_sampled = SampledDomain.__table__, _shard_table(SampledDomain)
+        strata, shard_strata = SamplingStratum.__table__, _shard_table(SamplingStratum)
+        db.execute(insert(sampled).from_select(
+            ["stratum_id", "domain", "sampled_at"],
+            select(strata.c.id, shard_sampled.c.domain, shard_sampled.c.sampled_at)
+            .join(shard_strata, shard_strata.c.id == shard_sampled.c.stratum_id)
+            .join(strata, and_(
+                strata.c.rank_first == shard_strata.c.rank_first,
+                strata.c.rank_last == shard_strata.c.rank_last,
+                strata.c.tld.is_not_distinct_from(shard_strata.c.tld),
+            ))
+            .where(~exists().where(
+                sampled.c.stratum_id == strata.c.id,
+                sampled.c.domain == shard_sampled.c.domain,
+                sampled.c.sampled_at == shard_sampled.c.sampled_at,
+            )),
+        ))
+
+        domain_map.drop(db.connection())
+        scan_map.drop(db.connection())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        # DETACH is not allowed inside a transaction either
+        db.connection().exec_driver_sql(f"DETACH DATABASE {SHARD_SCHEMA}")
+        db.commit()
+
+    logger.info(f"Merged {path}: {report.domains_added} domains and {report.scans_added} scans added, "
+                f"{report.scans_duplicate} scans already present, {report.latest_updated} domains' latest scan updated")
+    return report
+
+
+def merge_shards(db: Session, paths: List[str]) -> List[MergeReport]:
+    """Merge every shard database in turn, then rebuild the statistics, rollups and schedule of the result. Commits."""
+    reports = [merge_shard(db, path) for path in paths]
+    rebuild_statistics(db)
+    rebuild_rollups(db)
+    update_intervals(db)
+    db.commit()
+    return reports
@@ -0,0 +1,78 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Union
+import numpy as np
+
+# Multiplier of the linear congruential step in jump consistent hash (Lamping & Veach)
+_JUMP_MULTIPLIER = 2862933555777941757
+_MASK_64 = (1 << 64) - 1
+
+
+def domain_key(domain: Union[str, bytes]) -> int:
+    """Stable 64-bit key of a domain (Python's hash() is salted per process, so unusable across runners)."""
+    name = domain.encode() if isinstance(domain, str) else domain
+    return int.from_bytes(hashlib.blake2b(name, digest_size=8).digest(), "little")
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash: the bucket (0..buckets-1) of a 64-bit key.
+
+    Going from N to N+1 buckets moves only 1/(N+1) of the keys, all into the new bucket.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * _JUMP_MULTIPLIER + 1) & _MASK_64
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def jump_hash_array(keys: np.ndarray, buckets: int) -> np.ndarray:
+    """jump_hash of every key at once; same buckets, a step per round for the keys still jumping."""
+    keys = keys.astype(np.uint64)
+    bucket = np.full(len(keys), -1, dtype=np.int64)
+    jump = np.zeros(len(keys), dtype=np.int64)
+    active = np.arange(len(keys))
+    while active.size:
+        bucket[active] = jump[active]
+        # uint64 arithmetic wraps like the & _MASK_64 above
+        keys[active] = keys[active] * np.uint64(_JUMP_MULTIPLIER) + np.uint64(1)
+        jump[active] = ((bucket[active] + 1) * ((1 << 31) / ((keys[active] >> np.uint64(33)) + 1).astype(np.float64))).astype(np.int64)
+        active = active[jump[active] < buckets]
+    return bucket
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    Shard index of count (1-based, e.g. 2/4) of a sharded scan.
+
+    A domain's shard depends on its name alone, so it stays put while the target list
+    changes around it, and each runner scans a disjoint slice without coordination.
+    """
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, spec: str) -> "Shard":
+        """Parse "i/N", 1 <= i <= N."""
+        index, _, count = spec.partition("/")
+        try:
+            shard = cls(int(index), int(count))
+        except ValueError:
+            raise ValueError(f"Expected INDEX/COUNT, got {spec!r}")
+        if not 1 <= shard.index <= shard.count:
+            raise ValueError(f"Shard index must be within 1..{shard.count}, got {spec!r}")
+        return shard
+
+    def __contains__(self, domain: str) -> bool:
+        return shard_of(domain, self.count) == self.index
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def shard_of(domain: str, count: int) -> int:
+    """Shard (1..count) a domain belongs to."""
+    return jump_hash(domain_key(domain), count) + 1
@@ -0,0 +1,248 @@
+import os
+import json
+import shutil
+import logging
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Iterator
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from scanner.models import Domain, ScanResult, Certificate, PQCInfo, TLSVersion, GeoLocation
+from scanner.ca_classifier import CAClassifier
+
+logger = logging.getLogger(__name__)
+
+# Column kinds: "string" columns are dictionary-encoded, "strings" columns hold a
+# dictionary-encoded list per row (codes plus row offsets), the rest are NumPy dtypes.
+LATEST_SCHEMA = {
+    "domain": "string",
+    "scan_result_id": "int64",
+    "timestamp": "int64",
+    "grade": "string",
+    "score": "float32",
+    "pqc_supported": "bool",
+    "tls_version": "string",
+    "ca_type": "string",
+    "issuer": "string",
+    "country": "string",
+    "pqc_algorithms": "strings",
+    "cipher_suites": "strings",
+}
+
+HISTORY_SCHEMA = {
+    "domain": "string",
+    "scan_result_id": "int64",
+    "timestamp": "int64",
+    "scan_status": "string",
+    "grade": "string",
+    "score": "float32",
+    "pqc_supported": "bool",
+    "tls_version": "string",
+    "ca_type": "string",
+    "issuer": "string",
+    "country": "string",
+}
+
+# array typecodes used while a column is being accumulated
+_TYPECODES = {"int64": "q", "float32": "f", "bool": "B", "string": "l", "strings": "l"}
+
+# Rows fetched per round trip while streaming scan history
+STREAM_BATCH_SIZE = 1000
+
+
+def _code_dtype(size: int) -> np.dtype:
+    """Smallest unsigned integer type that can index a dictionary of the given size."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if size <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class ColumnarSnapshotWriter:
+    """
+    Writes rows to a directory of NumPy column files.
+
+    Every column is a <name>.npy file; dictionary-encoded columns keep their values in
+    <name>.values.json and list columns their row boundaries in <name>.offsets.npy.
+    snapshot.json describes the columns. The directory is replaced as a whole on close,
+    so readers never see a half-written snapshot.
+
+    With compressed=True all arrays go to a single zip-compressed columns.npz instead
+    (smaller, for archives; read without memory-mapping).
+    """
+
+    def __init__(self, directory: str, schema: Dict[str, str], compressed: bool = False):
+        self.directory = directory
+        self.schema = schema
+        self.compressed = compressed
+        self.rows = 0
+        self.buffers = {name: array(_TYPECODES[kind]) for name, kind in schema.items()}
+        self.dictionaries: Dict[str, Dict[str, int]] = {
+            name: {} for name, kind in schema.items() if kind in ("string", "strings")
+        }
+        self.offsets = {name: array("q", [0]) for name, kind in schema.items() if kind == "strings"}
+
+    def add(self, row: Dict[str, Any]):
+        for name, kind in self.schema.items():
+            value = row[name]
+            if kind == "string":
+                codes = self.dictionaries[name]
+                self.buffers[name].append(codes.setdefault(value, len(codes)))
+            elif kind == "strings":
+                codes = self.dictionaries[name]
+                self.buffers[name].extend(codes.setdefault(item, len(codes)) for item in value)
+                self.offsets[name].append(len(self.buffers[name]))
+            elif kind == "bool":
+                self.buffers[name].append(1 if value else 0)
+            else:
+                self.buffers[name].append(value)
+        self.rows += 1
+
+    def close(self) -> "Snapshot":
+        """Write the column files and return the snapshot opened for reading."""
+        tmp_dir = self.directory + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        columns = {}
+        arrays: Dict[str, np.ndarray] = {}
+        for name, kind in self.schema.items():
+            if kind in ("string", "strings"):
+                values = sorted(self.dictionaries[name], key=self.dictionaries[name].get)
+                dtype = _code_dtype(len(values))
+                with open(os.path.join(tmp_dir, f"{name}.values.json"), "w") as f:
+                    json.dump(values, f)
+            else:
+                dtype = np.dtype(kind)
+            arrays[name] = np.frombuffer(self.buffers[name], dtype=self.buffers[name].typecode).astype(dtype)
+            if kind == "strings":
+                arrays[f"{name}.offsets"] = np.frombuffer(self.offsets[name], dtype=np.int64)
+            columns[name] = {"kind": kind, "dtype": dtype.name}
+
+        if self.compressed:
+            np.savez_compressed(os.path.join(tmp_dir, "columns.npz"), **arrays)
+        else:
+            for name, data in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), data)
+
+        manifest = {
+            "rows": self.rows,
+            "compressed": self.compressed,
+            "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "columns": columns,
+        }
+        with open(os.path.join(tmp_dir, "snapshot.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.rename(tmp_dir, self.directory)
+        logger.info(f"Wrote columnar snapshot of {self.rows} rows to {self.directory}")
+        return Snapshot(self.directory)
+
+
+class Snapshot:
+    """
+    Read-only view of a columnar snapshot; uncompressed column files are memory-mapped.
+
+    Aggregations run as NumPy operations on the integer codes, never on Python objects.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "snapshot.json")) as f:
+            manifest = json.load(f)
+        self.rows: int = manifest["rows"]
+        self.columns: Dict[str, Dict[str, str]] = manifest["columns"]
+        self._values: Dict[str, List[str]] = {}
+        self._archive = np.load(os.path.join(directory, "columns.npz")) if manifest.get("compressed") else None
+
+    def _array(self, key: str) -> np.ndarray:
+        if self._archive is not None:
+            return self._archive[key]
+        return np.load(os.path.join(self.directory, f"{key}.npy"), mmap_mode="r")
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw column: codes for dictionary-encoded columns, values otherwise."""
+        return self._array(name)
+
+    def offsets(self, name: str) -> np.ndarray:
+        """Row boundaries of a list column (rows + 1 entries)."""
+        return self._array(f"{name}.offsets")
+
+    def values(self, name: str) -> List[str]:
+        """Dictionary of a dictionary-encoded column, indexed by code."""
+        if name not in self._values:
+            with open(os.path.join(self.directory, f"{name}.values.json")) as f:
+                self._values[name] = json.load(f)
+        return self._values[name]
+
+    def row_of_items(self, name: str) -> np.ndarray:
+        """Row index of every item of a list column."""
+        return np.repeat(np.arange(self.rows), np.diff(self.offsets(name)))
+
+
+def iter_history_rows(db: Session, scan_result_ids=None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream stored scans with their hot fields, oldest first, with a fixed number of queries.
+
+    Args:
+        scan_result_ids: Optional selectable of scan ids to restrict the export to
+    """
+    # Unchanged scans keep their configuration rows on the scan they reference
+    configuration_id = func.coalesce(ScanResult.config_scan_id, ScanResult.id)
+    max_tls = (
+        db.query(TLSVersion.scan_result_id, func.max(TLSVersion.version).label("version"))
+        .filter(TLSVersion.is_supported.is_(True))
+        .group_by(TLSVersion.scan_result_id)
+        .subquery()
+    )
+
+    rows = (
+        db.query(
+            Domain.name,
+            ScanResult.id,
+            ScanResult.scan_date,
+            ScanResult.scan_status,
+            ScanResult.grade,
+            ScanResult.score,
+            PQCInfo.is_supported,
+            max_tls.c.version,
+            Certificate.issuer,
+            Certificate.issuer_organization,
+            Certificate.issuer_common_name,
+            Certificate.ca_type,
+            GeoLocation.country_name,
+        )
+        .join(Domain, Domain.id == ScanResult.domain_id)
+        .outerjoin(max_tls, max_tls.c.scan_result_id == configuration_id)
+        .outerjoin(PQCInfo, PQCInfo.scan_result_id == configuration_id)
+        .outerjoin(Certificate, Certificate.scan_result_id == configuration_id)
+        .outerjoin(GeoLocation, GeoLocation.ip_address == ScanResult.ip_address)
+    )
+    if scan_result_ids is not None:
+        rows = rows.filter(ScanResult.id.in_(scan_result_ids))
+    rows = rows.order_by(ScanResult.scan_date, ScanResult.id).yield_per(STREAM_BATCH_SIZE)
+
+    for name, scan_result_id, scan_date, status, grade, score, pqc, tls, issuer, organization, common_name, ca_type, country in rows:
+        yield {
+            "domain": name,
+            "scan_result_id": scan_result_id,
+            "timestamp": int(scan_date.replace(tzinfo=timezone.utc).timestamp()),
+            "scan_status": status,
+            "grade": grade or "Unknown",
+            "score": float(score) if score is not None else 0.0,
+            "pqc_supported": bool(pqc),
+            "tls_version": tls or "Unknown",
+            "ca_type": ca_type or "Unknown",
+            "issuer": CAClassifier.describe(issuer, organization, common_name).display_name if issuer else "Unknown",
+            "country": country or "Unknown",
+        }
+
+
+def export_history(db: Session, directory: str) -> Snapshot:
+    """Write every stored scan to a columnar snapshot."""
+    writer = ColumnarSnapshotWriter(directory, HISTORY_SCHEMA)
+    for row in iter_history_rows(db):
+        writer.add(row)
+    return writer.close()
@@ -0,0 +1,325 @@
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from scanner.models import CipherSuite, PQCInfo, LatestScan, StatisticsCache
+from scanner.latest_scan import LatestScanChange
+
+logger = logging.getLogger(__name__)
+
+# Distributions tracked per snapshot (name -> Counter)
+DISTRIBUTIONS = ("grade", "tls", "pqc_algo", "ca", "cipher", "geo")
+
+
+def split_pqc_suites(supported_suites: Optional[str]) -> List[str]:
+    """Split the comma-separated PQCInfo.supported_suites column into algorithm names."""
+    if not supported_suites:
+        return []
+    return [s.strip() for s in supported_suites.split(',') if s.strip()]
+
+
+def day_of(value: datetime) -> datetime:
+    """Truncate a timestamp to the start of its day."""
+    return datetime(value.year, value.month, value.day)
+
+
+class ScanStatistics:
+    """
+    Additive aggregates over the current scans of a set of domains.
+
+    Every field is a sum, so snapshots can be merged by adding them and a domain's
+    contribution can be withdrawn by adding it with a negative sign.
+    """
+
+    def __init__(self):
+        self.domains = 0
+        self.pqc_count = 0
+        self.commercial_ca_count = 0
+        self.score_sum = 0.0
+        self.distributions: Dict[str, Counter] = {name: Counter() for name in DISTRIBUTIONS}
+
+    def add_scan(self, hot: Dict[str, Any], pqc_algorithms: List[str], cipher_names: List[str], sign: int = 1):
+        """
+        Add (sign=1) or withdraw (sign=-1) the contribution of one domain's current scan.
+
+        Args:
+            hot: Hot fields of the scan as produced by summarize_scan
+            pqc_algorithms: PQC algorithm names of the scan
+            cipher_names: Accepted cipher suite names of the scan
+        """
+        # Only successful scans describe a configuration
+        if hot["scan_status"] != "SUCCESS":
+            return
+
+        self.domains += sign
+        self.score_sum += sign * (float(hot["score"]) if hot["score"] is not None else 0.0)
+
+        if hot["ca_type"] == "COMMERCIAL_CA":
+            self.commercial_ca_count += sign
+
+        self.distributions["grade"][hot["grade"] or "Unknown"] += sign
+        self.distributions["tls"][hot["max_tls_version"] or "Unknown"] += sign
+        self.distributions["ca"][hot["issuer"] or "Unknown"] += sign
+        self.distributions["geo"][hot["country"] or "Unknown"] += sign
+
+        if hot["pqc_supported"]:
+            self.pqc_count += sign
+            for algo in pqc_algorithms:
+                self.distributions["pqc_algo"][algo] += sign
+
+        for name in cipher_names:
+            self.distributions["cipher"][name] += sign
+
+    def merge(self, other: "ScanStatistics"):
+        """Add another snapshot into this one."""
+        self.domains += other.domains
+        self.pqc_count += other.pqc_count
+        self.commercial_ca_count += other.commercial_ca_count
+        self.score_sum += other.score_sum
+        for name in DISTRIBUTIONS:
+            for key, count in other.distributions[name].items():
+                self.distributions[name][key] += count
+
+    def is_zero(self) -> bool:
+        """True if the snapshot changes nothing (e.g. a rescan with unchanged results)."""
+        return not (self.domains or self.pqc_count or self.commercial_ca_count or round(self.score_sum, 2)
+                    or any(self.distribution(name) for name in DISTRIBUTIONS))
+
+    def distribution(self, name: str) -> Dict[str, int]:
+        """Return a distribution without keys whose net count is zero."""
+        return {key: count for key, count in self.distributions[name].items() if count}
+
+    def to_json(self) -> str:
+        data = {
+            "domains": self.domains,
+            "pqc_count": self.pqc_count,
+            "commercial_ca_count": self.commercial_ca_count,
+            "score_sum": round(self.score_sum, 2),
+        }
+        for name in DISTRIBUTIONS:
+            data[name] = self.distribution(name)
+        return json.dumps(data, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, text: str) -> "ScanStatistics":
+        data = json.loads(text)
+        stats = cls()
+        stats.domains = data.get("domains", 0)
+        stats.pqc_count = data.get("pqc_count", 0)
+        stats.commercial_ca_count = data.get("commercial_ca_count", 0)
+        stats.score_sum = data.get("score_sum", 0.0)
+        for name in DISTRIBUTIONS:
+            stats.distributions[name].update(data.get(name, {}))
+        return stats
+
+
+class DailyStatisticsWriter:
+    """
+    Accumulates per-day snapshots in statistics_cache as latest-scan pointers move.
+
+    Each statistics_cache row holds the net change that day's writes made to the
+    current-state aggregates, so the sum of all rows equals the current state.
+    """
+
+    # Maximum number of scan ids per IN (...) lookup
+    LOOKUP_CHUNK_SIZE = 500
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.days: Dict[datetime, ScanStatistics] = {}
+        # (day, hot fields, sign) of stored scans whose details are fetched in bulk on flush
+        self.stored: List[Tuple[datetime, Dict[str, Any], int]] = []
+
+    def record(self, change: LatestScanChange, configuration):
+        """Record the replacement of a domain's current scan by one with the given configuration."""
+        day = day_of(change.current["scan_date"])
+        delta = self.days.setdefault(day, ScanStatistics())
+
+        if change.previous:
+            self.stored.append((day, change.previous, -1))
+
+        algorithms = split_pqc_suites(configuration.pqc_info.supported_suites) if configuration.pqc_info else []
+        ciphers = [c.name for c in configuration.cipher_suites]
+        delta.add_scan(change.current, algorithms, ciphers)
+
+    def record_hot_fields(self, change: LatestScanChange):
+        """
+        Record a change of hot fields that keeps the configuration, e.g. a location
+        resolved after the scan was stored; cipher and PQC details cancel out.
+        """
+        delta = self.days.setdefault(day_of(change.current["scan_date"]), ScanStatistics())
+        delta.add_scan(change.previous, [], [], sign=-1)
+        delta.add_scan(change.current, [], [])
+
+    def record_stored(self, day: datetime, hot: Dict[str, Any], sign: int = 1):
+        """
+        Add (or withdraw, sign=-1) the contribution of a stored scan on day, e.g. when a
+        domain's current scan is deleted; its details are fetched on flush, so flush
+        before its configuration rows go.
+        """
+        self.stored.append((day, hot, sign))
+
+    def flush(self):
+        """Merge the accumulated deltas into statistics_cache (inside the caller's transaction)."""
+        details = self._stored_details([hot["config_scan_id"] for _, hot, _ in self.stored])
+        for day, hot, sign in self.stored:
+            algorithms, ciphers = details.get(hot["config_scan_id"], ([], []))
+            self.days.setdefault(day, ScanStatistics()).add_scan(hot, algorithms, ciphers, sign=sign)
+        self.stored = []
+
+        for day, delta in self.days.items():
+            row = self.db.query(StatisticsCache).filter_by(scan_date=day).first()
+            if row is None:
+                row = StatisticsCache(scan_date=day, statistics_json=delta.to_json())
+                self.db.add(row)
+            else:
+                merged = ScanStatistics.from_json(row.statistics_json)
+                merged.merge(delta)
+                row.statistics_json = merged.to_json()
+        self.days = {}
+
+    def _stored_details(self, scan_result_ids: List[int]) -> Dict[int, Tuple[List[str], List[str]]]:
+        """Fetch PQC algorithms and cipher names of stored configurations, a chunk of scan ids per query."""
+        details: Dict[int, Tuple[List[str], List[str]]] = {}
+        for start in range(0, len(scan_result_ids), self.LOOKUP_CHUNK_SIZE):
+            chunk = scan_result_ids[start:start + self.LOOKUP_CHUNK_SIZE]
+            for scan_result_id in chunk:
+                details[scan_result_id] = ([], [])
+
+            suites = (
+                self.db.query(PQCInfo.scan_result_id, PQCInfo.supported_suites)
+                .filter(PQCInfo.scan_result_id.in_(chunk))
+            )
+            for scan_result_id, supported_suites in suites:
+                details[scan_result_id][0].extend(split_pqc_suites(supported_suites))
+
+            ciphers = (
+                self.db.query(CipherSuite.scan_result_id, CipherSuite.name)
+                .filter(CipherSuite.scan_result_id.in_(chunk))
+            )
+            for scan_result_id, name in ciphers:
+                details[scan_result_id][1].append(name)
+        return details
+
+
+def load_current_statistics(db: Session) -> ScanStatistics:
+    """Merge every daily snapshot into the current-state aggregates."""
+    stats = ScanStatistics()
+    for (statistics_json,) in db.query(StatisticsCache.statistics_json).order_by(StatisticsCache.scan_date):
+        stats.merge(ScanStatistics.from_json(statistics_json))
+    return stats
+
+
+def is_consistent(db: Session, stats: ScanStatistics) -> bool:
+    """
+    Cheap check that the merged snapshots match latest_scans: the domain, PQC and
+    commercial CA counts, the score sum and the grade distribution, from one GROUP BY.
+    """
+    rows = (
+        db.query(
+            LatestScan.grade,
+            func.count(LatestScan.domain_id),
+            func.sum(case((LatestScan.pqc_supported.is_(True), 1), else_=0)),
+            func.sum(case((LatestScan.ca_type == "COMMERCIAL_CA", 1), else_=0)),
+            func.sum(LatestScan.score),
+        )
+        .filter(LatestScan.scan_status == "SUCCESS")
+        .group_by(LatestScan.grade)
+    )
+    expected = ScanStatistics()
+    for grade, count, pqc_count, commercial_ca_count, score_sum in rows:
+        expected.domains += count
+        expected.pqc_count += int(pqc_count or 0)
+        expected.commercial_ca_count += int(commercial_ca_count or 0)
+        expected.score_sum += float(score_sum or 0.0)
+        expected.distributions["grade"][grade or "Unknown"] += count
+    return (
+        (stats.domains, stats.pqc_count, stats.commercial_ca_count) ==
+        (expected.domains, expected.pqc_count, expected.commercial_ca_count)
+        and round(stats.score_sum, 2) == round(expected.score_sum, 2)
+        and stats.distribution("grade") == expected.distribution("grade")
+    )
+
+
+def aggregate_current_statistics(db: Session) -> ScanStatistics:
+    """
+    Compute the current-state aggregates directly with GROUP BY queries over latest_scans.
+
+    Issues a fixed number of queries regardless of how many domains are tracked.
+    """
+    success = LatestScan.scan_status == "SUCCESS"
+    stats = ScanStatistics()
+
+    domains, pqc_count, commercial_ca_count, score_sum = (
+        db.query(
+            func.count(LatestScan.domain_id),
+            func.sum(case((LatestScan.pqc_supported.is_(True), 1), else_=0)),
+            func.sum(case((LatestScan.ca_type == "COMMERCIAL_CA", 1), else_=0)),
+            func.sum(LatestScan.score),
+        )
+        .filter(success)
+        .one()
+    )
+    stats.domains = domains or 0
+    stats.pqc_count = int(pqc_count or 0)
+    stats.commercial_ca_count = int(commercial_ca_count or 0)
+    stats.score_sum = float(score_sum or 0.0)
+
+    hot_columns = (
+        ("grade", LatestScan.grade),
+        ("tls", LatestScan.max_tls_version),
+        ("ca", LatestScan.issuer),
+        ("geo", LatestScan.country),
+    )
+    for name, column in hot_columns:
+        for value, count in db.query(column, func.count()).filter(success).group_by(column):
+            stats.distributions[name][value or "Unknown"] += count
+
+    ciphers = (
+        db.query(CipherSuite.name, func.count())
+        .join(LatestScan, LatestScan.config_scan_id == CipherSuite.scan_result_id)
+        .filter(success)
+        .group_by(CipherSuite.name)
+    )
+    for name, count in ciphers:
+        stats.distributions["cipher"][name] += count
+
+    # supported_suites is a comma-separated list; group by the whole string and split the few distinct values
+    suites = (
+        db.query(PQCInfo.supported_suites, func.count())
+        .join(LatestScan, LatestScan.config_scan_id == PQCInfo.scan_result_id)
+        .filter(success, LatestScan.pqc_supported.is_(True))
+        .group_by(PQCInfo.supported_suites)
+    )
+    for supported_suites, count in suites:
+        for algo in split_pqc_suites(supported_suites):
+            stats.distributions["pqc_algo"][algo] += count
+
+    return stats
+
+
+def rebuild_statistics(db: Session) -> int:
+    """
+    Replace every snapshot with a single baseline computed from latest_scans.
+
+    Used for databases written before snapshots existed, or after stored scans were
+    changed in place. The baseline is dated at the newest scan day; later writes keep
+    adding their deltas on top of it.
+
+    Returns:
+        Number of snapshot rows written
+    """
+    db.query(StatisticsCache).delete(synchronize_session=False)
+
+    stats = aggregate_current_statistics(db)
+    if not stats.domains:
+        return 0
+
+    newest = db.query(func.max(LatestScan.scan_date)).filter(LatestScan.scan_status == "SUCCESS").scalar()
+    db.add(StatisticsCache(scan_date=day_of(newest), statistics_json=stats.to_json()))
+
+    logger.info(f"Rebuilt statistics baseline for {stats.domains} domains")
+    return 1
@@ -0,0 +1,264 @@
+import os
+import mmap
+import random
+import shutil
+import struct
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from tempfile import TemporaryFile
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from scanner.loader import DomainLoader, DomainEntry
+from scanner.sharding import Shard, domain_key, jump_hash_array
+
+logger = logging.getLogger(__name__)
+
+# File signature and layout version of indexed target lists
+MAGIC = b"TLSVTGTS"
+FORMAT_VERSION = 1
+
+# Extension of the index built next to a CSV
+INDEX_EXTENSION = ".targets"
+
+# Indexed Majestic Million, built into the Lambda image and kept current by refreshes
+TARGET_LIST_PATH = os.getenv("TARGET_LIST_PATH", "majestic_million" + INDEX_EXTENSION)
+
+# magic, version, record count, TLD count, bytes of TLD names
+_HEADER = struct.Struct("<8sIIII")
+
+# One fixed-size record per domain, in rank order; the name lives in the string heap
+RECORD_DTYPE = np.dtype([("rank", "<u4"), ("tld", "<u2"), ("length", "<u2"), ("offset", "<u4")])
+_RECORD = struct.Struct("<IHHI")
+
+
+class TargetListWriter:
+    """
+    Writes domains, in rank order, to an indexed target list.
+
+    Layout after the header: the packed records, the TLD index (record numbers grouped
+    by TLD, each group in rank order, plus each TLD's start in it), the TLD names and
+    the string heap of domain names. Records and names are streamed to temporary files,
+    so only the TLD column (2 bytes per domain) is held; the file is replaced as a
+    whole on close, so readers never see a half-written list.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.tld_ids: Dict[str, int] = {}
+        self.tlds = array("H")
+        self.last_rank = 0
+        self.heap_size = 0
+        self.records = TemporaryFile()
+        self.heap = TemporaryFile()
+
+    def add(self, entry: DomainEntry):
+        if entry.rank < self.last_rank:
+            raise ValueError(f"Target list must be written in rank order ({entry.domain} ranked {entry.rank} after {self.last_rank})")
+        name = entry.domain.encode()
+        tld = self.tld_ids.setdefault(entry.tld, len(self.tld_ids))
+        self.records.write(_RECORD.pack(entry.rank, tld, len(name), self.heap_size))
+        self.heap.write(name)
+        self.tlds.append(tld)
+        self.heap_size += len(name)
+        self.last_rank = entry.rank
+        self.rows += 1
+
+    def close(self) -> "TargetList":
+        """Write the file and return it opened for reading."""
+        tlds = np.frombuffer(self.tlds, dtype=np.uint16)
+        # Stable, so each TLD's records stay in rank order
+        order = np.argsort(tlds, kind="stable").astype("<u4")
+        starts = np.zeros(len(self.tld_ids) + 1, dtype="<u4")
+        np.cumsum(np.bincount(tlds, minlength=len(self.tld_ids)), out=starts[1:])
+        names = "\n".join(self.tld_ids).encode()
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, self.rows, len(self.tld_ids), len(names)))
+            for part in (self.records, self.heap):
+                part.seek(0)
+            shutil.copyfileobj(self.records, f)
+            f.write(order.tobytes())
+            f.write(starts.tobytes())
+            f.write(names)
+            shutil.copyfileobj(self.heap, f)
+        self.records.close()
+        self.heap.close()
+
+        os.replace(tmp_path, self.path)
+        logger.info(f"Wrote indexed target list of {self.rows} domains to {self.path}")
+        return TargetList(self.path)
+
+
+class TargetList:
+    """
+    Read-only view of an indexed target list, memory-mapped.
+
+    Records are in rank order, so a rank range is two binary searches; a TLD's records
+    are a contiguous run of the TLD index, so TLD slices are seeks too. Only the pages
+    of the selected records and names are read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, rows, tld_count, names_size = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not an indexed target list (version {FORMAT_VERSION})")
+
+        position = _HEADER.size
+        self._records = np.frombuffer(self._map, dtype=RECORD_DTYPE, count=rows, offset=position)
+        position += self._records.nbytes
+        self._tld_order = np.frombuffer(self._map, dtype="<u4", count=rows, offset=position)
+        position += self._tld_order.nbytes
+        self._tld_starts = np.frombuffer(self._map, dtype="<u4", count=tld_count + 1, offset=position)
+        position += self._tld_starts.nbytes
+
+        self.tlds: List[str] = self._map[position:position + names_size].decode().split("\n") if tld_count else []
+        self._tld_ids = {name: tld for tld, name in enumerate(self.tlds)}
+        self._heap = position + names_size
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __enter__(self) -> "TargetList":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # The arrays are views of the map and have to go first
+        self._records = self._tld_order = self._tld_starts = None
+        self._map.close()
+
+    def entry(self, index: int) -> DomainEntry:
+        rank, tld, length, offset = self._records[index].item()
+        start = self._heap + offset
+        return DomainEntry(rank=rank, domain=self._map[start:start + length].decode(), tld=self.tlds[tld])
+
+    def rank(self, index: int) -> int:
+        return int(self._records["rank"][index])
+
+    def name(self, index: int) -> bytes:
+        """UTF-8 domain name of a record, without decoding it."""
+        _, _, length, offset = self._records[index].item()
+        start = self._heap + offset
+        return self._map[start:start + length]
+
+    def select(self, rank_range: Optional[Tuple[int, int]] = None, tld: Optional[str] = None,
+               shard: Optional[Shard] = None) -> Sequence[int]:
+        """Record numbers, in rank order, of the domains ranked within rank_range, under tld and/or in shard."""
+        records = self._select(rank_range, tld)
+        if shard is None:
+            return records
+        # Every selected name is hashed: a pass over the selection, with the jumps done in bulk
+        records = np.asarray(records, dtype="<u4")
+        keys = np.fromiter((domain_key(self.name(int(index))) for index in records), dtype=np.uint64, count=len(records))
+        return records[jump_hash_array(keys, shard.count) == shard.index - 1]
+
+    def _select(self, rank_range: Optional[Tuple[int, int]], tld: Optional[str]) -> Sequence[int]:
+        ranks = self._records["rank"]
+        if tld is None:
+            if not rank_range:
+                return range(len(ranks))
+            first, last = rank_range
+            return range(bisect_left(ranks, first), bisect_right(ranks, last))
+
+        tld_id = self._tld_ids.get(tld)
+        if tld_id is None:
+            return range(0)
+        records = self._tld_order[self._tld_starts[tld_id]:self._tld_starts[tld_id + 1]]
+        if rank_range:
+            first, last = rank_range
+            rank_of = ranks.__getitem__
+            records = records[bisect_left(records, first, key=rank_of):bisect_right(records, last, key=rank_of)]
+        return records
+
+    def slice(self, offset: int = 0, limit: Optional[int] = None, rank_range: Optional[Tuple[int, int]] = None,
+              tld: Optional[str] = None, shard: Optional[Shard] = None) -> Iterator[DomainEntry]:
+        """Domains offset..offset+limit of a selection, in rank order."""
+        records = self.select(rank_range, tld, shard)
+        for index in records[offset:offset + limit if limit else None]:
+            yield self.entry(int(index))
+
+    def sample(self, k: int, rank_range: Optional[Tuple[int, int]] = None, tld: Optional[str] = None,
+               rng: Optional[random.Random] = None, shard: Optional[Shard] = None) -> List[DomainEntry]:
+        """Uniform random sample of k domains of a selection, in rank order; reads only those k."""
+        records = self.select(rank_range, tld, shard)
+        picks = sorted((rng or random.Random()).sample(range(len(records)), min(k, len(records))))
+        return [self.entry(int(records[pick])) for pick in picks]
+
+
+class DomainIndex:
+    """
+    Record number of every domain of a TargetList, for lookups by name.
+
+    An open-addressing table of record numbers (8 bytes per slot, at most half full);
+    names are compared against the mapped heap, so none are held in memory.
+    """
+
+    def __init__(self, targets: TargetList):
+        self.targets = targets
+        capacity = 1 << max(4, (2 * len(targets)).bit_length())
+        self._slots = array("q", bytes(8 * capacity))
+        self._mask = capacity - 1
+        for index in range(len(targets)):
+            i = hash(targets.name(index)) & self._mask
+            while self._slots[i]:
+                i = (i + 1) & self._mask
+            # 0 marks an empty slot
+            self._slots[i] = index + 1
+
+    def find(self, name: bytes) -> Optional[int]:
+        """Record number of a UTF-8 domain name, or None."""
+        i = hash(name) & self._mask
+        while self._slots[i]:
+            index = self._slots[i] - 1
+            if self.targets.name(index) == name:
+                return index
+            i = (i + 1) & self._mask
+        return None
+
+
+def build_target_list(entries: Iterable[DomainEntry], path: str) -> TargetList:
+    """Write entries in rank order (e.g. DomainLoader.iter_domains) as an indexed target list."""
+    writer = TargetListWriter(path)
+    for entry in entries:
+        writer.add(entry)
+    return writer.close()
+
+
+def is_target_list(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (FileNotFoundError, IsADirectoryError):
+        return False
+
+
+def index_path(csv_path: str) -> str:
+    """Where the index of a CSV is kept: next to it, e.g. majestic_million.targets."""
+    return os.path.splitext(csv_path)[0] + INDEX_EXTENSION
+
+
+def ensure_index(csv_path: str, loader: Optional[DomainLoader] = None) -> str:
+    """
+    Return the path of an indexed target list for csv_path, (re)building it from the
+    CSV if it is missing or older than the CSV. Indexed lists are returned as they are.
+    """
+    if is_target_list(csv_path):
+        return csv_path
+
+    path = index_path(csv_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path):
+        return path
+
+    logger.info(f"Indexing {csv_path} into {path}")
+    build_target_list((loader or DomainLoader()).iter_domains(csv_path), path).close()
+    return path
@@ -0,0 +1,173 @@
+import csv
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+import requests
+from sqlalchemy.orm import Session
+from scanner.loader import DomainLoader
+from scanner.models import TargetListRefresh, TargetListChange
+from scanner.target_list import TargetList, TargetListWriter, DomainIndex, TARGET_LIST_PATH, is_target_list
+
+logger = logging.getLogger(__name__)
+
+# Where the Majestic Million is published
+MAJESTIC_URL = "http://downloads.majestic.com/majestic_million.csv"
+
+# Seconds to wait for the server to answer, and between chunks of the download
+DOWNLOAD_TIMEOUT = 60
+
+# Bytes read per chunk of the download
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+
+# A move counts as a rank shift when the rank at least doubles or halves, by at least
+# RANK_SHIFT_MIN places (so the daily jitter of neighbouring ranks is not recorded)
+RANK_SHIFT_FACTOR = 2
+RANK_SHIFT_MIN = 100
+
+# Change rows inserted per statement
+CHANGE_BATCH_SIZE = 5000
+
+
+@dataclass
+class RefreshReport:
+    # False when the server answered 304 Not Modified and nothing was downloaded
+    modified: bool = False
+    domains: int = 0
+    added: int = 0
+    removed: int = 0
+    rank_shifted: int = 0
+    refresh_id: Optional[int] = None
+
+
+def is_rank_shift(previous_rank: int, rank: int) -> bool:
+    low, high = sorted((previous_rank, rank))
+    return high - low >= RANK_SHIFT_MIN and high >= low * RANK_SHIFT_FACTOR
+
+
+def _conditional_headers(db: Session, url: str, path: str) -> Dict[str, str]:
+    """Validators of the last download from url, as long as the list it produced is still on disk."""
+    if not is_target_list(path):
+        return {}
+    last = (
+        db.query(TargetListRefresh)
+        .filter(TargetListRefresh.url == url)
+        .order_by(TargetListRefresh.fetched_at.desc(), TargetListRefresh.id.desc())
+        .first()
+    )
+    headers = {}
+    if last and last.etag:
+        headers["If-None-Match"] = last.etag
+    if last and last.last_modified:
+        headers["If-Modified-Since"] = last.last_modified
+    return headers
+
+
+def _iter_rows(response: requests.Response) -> Iterator[List[str]]:
+    """CSV data rows of a streamed download, decoded a chunk at a time."""
+    lines = (line.decode("utf-8", errors="ignore") for line in response.iter_lines(chunk_size=DOWNLOAD_CHUNK_SIZE))
+    reader = csv.reader(lines)
+    next(reader, None)  # Skip header
+    yield from reader
+
+
+class _ChangeLog:
+    """Buffers target_list_changes rows of one refresh and inserts them in batches."""
+
+    def __init__(self, db: Session, refresh_id: int):
+        self.db = db
+        self.refresh_id = refresh_id
+        self.rows: List[Dict[str, Any]] = []
+
+    def add(self, domain: str, change: str, rank: Optional[int], previous_rank: Optional[int]):
+        self.rows.append({"refresh_id": self.refresh_id, "domain": domain, "change": change,
+                          "rank": rank, "previous_rank": previous_rank})
+        if len(self.rows) >= CHANGE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.db.execute(TargetListChange.__table__.insert(), self.rows)
+            self.rows = []
+
+
+def refresh_target_list(db: Session, url: str = MAJESTIC_URL, path: str = TARGET_LIST_PATH,
+                        loader: Optional[DomainLoader] = None) -> RefreshReport:
+    """
+    Download the target list if it changed since the last refresh, streaming it straight
+    into the indexed list at path, and record the domains added, removed or rank-shifted
+    against the list it replaces. Commits.
+
+    The request carries the ETag / Last-Modified of the previous download, so an
+    unchanged list costs one 304 response. Without a previous list nothing is diffed.
+    """
+    loader = loader or DomainLoader()
+    report = RefreshReport()
+
+    with requests.get(url, headers=_conditional_headers(db, url, path), stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 304:
+            logger.info(f"Target list at {url} not modified")
+            return report
+        response.raise_for_status()
+        report.modified = True
+
+        refresh = TargetListRefresh(
+            url=url,
+            fetched_at=datetime.now(timezone.utc).replace(tzinfo=None),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            domains=0, added=0, removed=0, rank_shifted=0,
+        )
+        db.add(refresh)
+        db.flush()
+        changes = _ChangeLog(db, refresh.id)
+
+        previous = TargetList(path) if is_target_list(path) else None
+        writer = TargetListWriter(path)
+        try:
+            if previous is not None:
+                index = DomainIndex(previous)
+                listed = bytearray(len(previous))
+
+            for entry in loader.unique(loader.parse(_iter_rows(response))):
+                writer.add(entry)
+                if previous is None:
+                    continue
+                found = index.find(entry.domain.encode())
+                if found is None:
+                    changes.add(entry.domain, "added", entry.rank, None)
+                    report.added += 1
+                    continue
+                listed[found] = 1
+                previous_rank = previous.rank(found)
+                if is_rank_shift(previous_rank, entry.rank):
+                    changes.add(entry.domain, "rank_shifted", entry.rank, previous_rank)
+                    report.rank_shifted += 1
+
+            if not writer.rows:
+                raise ValueError(f"No domains in the target list downloaded from {url}")
+
+            if previous is not None:
+                missing = listed.find(0)
+                while missing != -1:
+                    entry = previous.entry(missing)
+                    changes.add(entry.domain, "removed", None, entry.rank)
+                    report.removed += 1
+                    missing = listed.find(0, missing + 1)
+            changes.flush()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if previous is not None:
+                previous.close()
+
+    writer.close().close()
+    report.domains = refresh.domains = writer.rows
+    refresh.added, refresh.removed, refresh.rank_shifted = report.added, report.removed, report.rank_shifted
+    db.commit()
+    report.refresh_id = refresh.id
+
+    logger.info(f"Refreshed target list from {url}: {report.domains} domains, {report.added} added, "
+                f"{report.removed} removed, {report.rank_shifted} rank-shifted")
+    return report
@@ -0,0 +1,275 @@
+import os
+import json
+import uuid
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, List, Optional
+from urllib.parse import urlparse
+import boto3
+from sqlalchemy import create_engine, select, update, delete, func
+from sqlalchemy.engine import Engine
+from scanner.database import engine as scan_engine
+from scanner.loader import DomainEntry
+from scanner.models import QueuedDomain
+
+logger = logging.getLogger(__name__)
+
+# Queue the dispatcher fills and workers drain: an SQS queue URL, or a database URL
+# (unset: the scan database itself)
+QUEUE_URL = os.getenv("QUEUE_URL")
+
+# Seconds a leased domain stays hidden from other workers unless its lease is renewed
+LEASE_SECONDS = 300
+
+# Leases after which a domain stays in the database queue as a dead letter instead of
+# being retried (on SQS a redrive policy plays this part)
+MAX_ATTEMPTS = 3
+
+# Rows inserted per statement when enqueueing
+ENQUEUE_BATCH_SIZE = 5000
+
+# Most messages one SQS call sends, receives, renews or deletes
+SQS_BATCH_SIZE = 10
+
+# Seconds an SQS receive waits for messages to arrive (long polling)
+SQS_WAIT_SECONDS = 10
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def encode_entry(entry: DomainEntry) -> str:
+    return json.dumps({"rank": entry.rank, "domain": entry.domain, "tld": entry.tld})
+
+
+def decode_entry(body: str) -> Optional[DomainEntry]:
+    """
+    Domain of a queue message: JSON {"domain": "example.com", "rank": 1, "tld": "com"},
+    a JSON string or the bare name. None if it names no domain.
+    """
+    try:
+        data = json.loads(body)
+        if isinstance(data, str):
+            data = {"domain": data}
+    except json.JSONDecodeError:
+        data = {"domain": body}
+    if not isinstance(data, dict) or not data.get("domain"):
+        return None
+    return DomainEntry(domain=data["domain"], rank=data.get("rank", 0), tld=data.get("tld", ""))
+
+
+@dataclass
+class Lease:
+    entry: DomainEntry
+    # Backend-specific proof of the lease: (row id, lease token) or an SQS receipt handle
+    handle: Any
+
+
+class WorkQueue:
+    """
+    Domains waiting to be scanned, shared by any number of workers.
+
+    Workers lease batches; a lease hides its domains from the others until it runs
+    out. A worker renews the leases of the domains it is still scanning and completes
+    them once their results are stored, so the domains of a worker that dies come back
+    to the pool when its leases expire. Delivery is at least once: a domain whose
+    lease ran out mid-scan may be scanned twice.
+    """
+
+    def put(self, entries: Iterable[DomainEntry]) -> int:
+        """Enqueue domains; returns how many."""
+        raise NotImplementedError
+
+    def lease(self, count: int, seconds: int = LEASE_SECONDS, wait: bool = True) -> List[Lease]:
+        """Lease up to count domains for seconds (wait: allow the backend to wait briefly for some to arrive)."""
+        raise NotImplementedError
+
+    def renew(self, leases: List[Lease], seconds: int = LEASE_SECONDS) -> int:
+        """Extend leases to seconds from now; returns how many were still held."""
+        raise NotImplementedError
+
+    def complete(self, leases: List[Lease]) -> int:
+        """Remove finished domains from the queue; returns how many were still held."""
+        raise NotImplementedError
+
+    def pending(self) -> int:
+        """Domains not finished yet, leased or not."""
+        raise NotImplementedError
+
+
+class DatabaseQueue(WorkQueue):
+    """
+    Work queue in the scan_queue table of a SQLAlchemy database.
+
+    A lease is one UPDATE that stamps the next visible rows with a fresh token and a
+    new visible_at, so concurrent workers never share a domain: writers are serialized
+    on SQLite, and on PostgreSQL rows locked by another lease are skipped. A SQLite file
+    serves the workers of one host (or offline runs); workers on several hosts share a
+    PostgreSQL database. Lease times come from each worker's clock, so hosts should
+    keep theirs in sync to well within LEASE_SECONDS.
+    """
+
+    def __init__(self, url: Optional[str] = None, engine: Optional[Engine] = None):
+        if engine is None and url is not None:
+            # Wait for other workers' writes instead of failing on a locked SQLite file
+            engine = create_engine(url, connect_args={"timeout": 60} if url.startswith("sqlite") else {})
+        self.engine = engine or scan_engine
+        self.table = QueuedDomain.__table__
+
+    def put(self, entries: Iterable[DomainEntry]) -> int:
+        now = _utcnow()
+        count = 0
+        batch = []
+        with self.engine.begin() as conn:
+            for entry in entries:
+                batch.append({"domain": entry.domain, "rank": entry.rank, "tld": entry.tld,
+                              "enqueued_at": now, "visible_at": now, "attempts": 0})
+                if len(batch) >= ENQUEUE_BATCH_SIZE:
+                    conn.execute(self.table.insert(), batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                conn.execute(self.table.insert(), batch)
+                count += len(batch)
+        return count
+
+    def lease(self, count: int, seconds: int = LEASE_SECONDS, wait: bool = True) -> List[Lease]:
+        queue = self.table
+        token = uuid.uuid4().hex
+        now = _utcnow()
+        visible = (queue.c.visible_at <= now, queue.c.attempts < MAX_ATTEMPTS)
+        candidates = (
+            select(queue.c.id).where(*visible)
+            .order_by(queue.c.visible_at, queue.c.id)
+            .limit(count)
+            .with_for_update(skip_locked=True)
+        )
+        with self.engine.begin() as conn:
+            # Rows another lease took meanwhile fail the repeated visibility check
+            rows = conn.execute(
+                update(queue).where(queue.c.id.in_(candidates.scalar_subquery()), *visible)
+                .values(visible_at=now + timedelta(seconds=seconds), lease_token=token, attempts=queue.c.attempts + 1)
+                .returning(queue.c.id, queue.c.rank, queue.c.domain, queue.c.tld)
+            ).all()
+        rows.sort(key=lambda row: row.rank)
+        return [Lease(DomainEntry(rank=row.rank, domain=row.domain, tld=row.tld), (row.id, token)) for row in rows]
+
+    def _by_token(self, leases: List[Lease]):
+        ids = defaultdict(list)
+        for lease in leases:
+            row_id, token = lease.handle
+            ids[token].append(row_id)
+        return ids.items()
+
+    def renew(self, leases: List[Lease], seconds: int = LEASE_SECONDS) -> int:
+        queue = self.table
+        renewed = 0
+        with self.engine.begin() as conn:
+            for token, ids in self._by_token(leases):
+                renewed += conn.execute(
+                    update(queue).where(queue.c.id.in_(ids), queue.c.lease_token == token)
+                    .values(visible_at=_utcnow() + timedelta(seconds=seconds))
+                ).rowcount
+        return renewed
+
+    def complete(self, leases: List[Lease]) -> int:
+        queue = self.table
+        completed = 0
+        with self.engine.begin() as conn:
+            for token, ids in self._by_token(leases):
+                completed += conn.execute(
+                    delete(queue).where(queue.c.id.in_(ids), queue.c.lease_token == token)
+                ).rowcount
+        return completed
+
+    def pending(self) -> int:
+        """Domains not finished yet, leased or not; dead letters excluded."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(self.table).where(self.table.c.attempts < MAX_ATTEMPTS)
+            ).scalar()
+
+
+class SQSQueue(WorkQueue):
+    """Work queue on Amazon SQS: a lease is the visibility timeout of the received messages."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.queue = boto3.resource('sqs').Queue(url)
+
+    def put(self, entries: Iterable[DomainEntry]) -> int:
+        count = 0
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) == SQS_BATCH_SIZE:
+                count += self._send(batch)
+                batch = []
+        if batch:
+            count += self._send(batch)
+        return count
+
+    def _send(self, batch: List[DomainEntry]) -> int:
+        # Ids only need to be distinct within a batch; ranks repeat (0 for bare messages)
+        response = self.queue.send_message_batch(
+            Entries=[{'Id': str(i), 'MessageBody': encode_entry(entry)} for i, entry in enumerate(batch)]
+        )
+        for failure in response.get('Failed', []):
+            logger.warning(f"Failed to enqueue {batch[int(failure['Id'])].domain}: "
+                           f"{failure['Code']} {failure.get('Message', '')}")
+        return len(response.get('Successful', []))
+
+    def lease(self, count: int, seconds: int = LEASE_SECONDS, wait: bool = True) -> List[Lease]:
+        leases = []
+        while len(leases) < count:
+            messages = self.queue.receive_messages(
+                MaxNumberOfMessages=min(SQS_BATCH_SIZE, count - len(leases)),
+                VisibilityTimeout=seconds,
+                # Only the first receive waits; later ones take what is there
+                WaitTimeSeconds=SQS_WAIT_SECONDS if wait and not leases else 0,
+            )
+            if not messages:
+                break
+            for message in messages:
+                entry = decode_entry(message.body)
+                if entry is None:
+                    logger.warning(f"Dropping message without a domain: {message.body}")
+                    message.delete()
+                    continue
+                leases.append(Lease(entry, message.receipt_handle))
+        return leases
+
+    def _batches(self, leases: List[Lease]):
+        for start in range(0, len(leases), SQS_BATCH_SIZE):
+            yield [{'Id': str(i), 'ReceiptHandle': lease.handle} for i, lease in enumerate(leases[start:start + SQS_BATCH_SIZE])]
+
+    def renew(self, leases: List[Lease], seconds: int = LEASE_SECONDS) -> int:
+        renewed = 0
+        for entries in self._batches(leases):
+            response = self.queue.meta.client.change_message_visibility_batch(
+                QueueUrl=self.url, Entries=[dict(entry, VisibilityTimeout=seconds) for entry in entries],
+            )
+            renewed += len(response.get('Successful', []))
+        return renewed
+
+    def complete(self, leases: List[Lease]) -> int:
+        completed = 0
+        for entries in self._batches(leases):
+            completed += len(self.queue.delete_messages(Entries=entries).get('Successful', []))
+        return completed
+
+    def pending(self) -> int:
+        # SQS only keeps approximate counts
+        self.queue.reload()
+        return (int(self.queue.attributes['ApproximateNumberOfMessages'])
+                + int(self.queue.attributes['ApproximateNumberOfMessagesNotVisible']))
+
+
+def open_queue(url: Optional[str] = QUEUE_URL) -> WorkQueue:
+    """SQS for an SQS queue URL, otherwise the database queue at url (None: the scan database)."""
+    if url and (urlparse(url).hostname or "").endswith("amazonaws.com"):
+        return SQSQueue(url)
+    return DatabaseQueue(url)
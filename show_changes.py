@@ -0,0 +1,34 @@
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from scanner.database import get_db
+from scanner.config_history import changes_since
+
+
+def show_changes(days: int = 7, domain: str = None, include_first: bool = False):
+    db = next(get_db())
+    try:
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+        changes = changes_since(db, since, domain_name=domain, include_first=include_first).all()
+        print(f"{len(changes)} configuration changes since {since:%Y-%m-%d %H:%M} UTC:")
+        for change, domain_name in changes:
+            components = change.changed_components or "first configuration"
+            print(f"- {change.changed_at:%Y-%m-%d %H:%M} {domain_name}: {components}")
+            for component, detail in json.loads(change.details or "{}").items():
+                print(f"    {component}: {json.dumps(detail)}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show what changed in scanned configurations")
+    parser.add_argument("--days", type=int, default=7, help="Look back this many days (default: 7)")
+    parser.add_argument("--domain", help="Only show changes of this domain")
+    parser.add_argument("--include-first", action="store_true", help="Also list each domain's first recorded configuration")
+    args = parser.parse_args()
+
+    show_changes(args.days, args.domain, args.include_first)
+
+
+if __name__ == "__main__":
+    main()
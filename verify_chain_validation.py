@@ -0,0 +1,88 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from scanner.chain_validator import ChainValidator, TrustStore
+
+NOW = datetime.now(timezone.utc)
+
+
+def make_cert(subject_cn, key, issuer_cert=None, issuer_key=None, ca=False, hostnames=(), not_before=None, not_after=None):
+    """Issue a certificate for key (self-signed without an issuer)."""
+    subject = x509.Name([x509.NameAttribute(NameOID.ORGANIZATION_NAME, "Local Test CA"), x509.NameAttribute(NameOID.COMMON_NAME, subject_cn)])
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(issuer_cert.subject if issuer_cert else subject)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_before or NOW - timedelta(days=1))
+        .not_valid_after(not_after or NOW + timedelta(days=90))
+        .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+    )
+    if hostnames:
+        builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName(h) for h in hostnames]), critical=False)
+    return builder.sign(issuer_key or key, hashes.SHA256())
+
+
+def verify_chain_validation(sites: int = 200):
+    """Validate chains from a locally generated root -> intermediate -> leaf hierarchy, offline."""
+    root_key, other_key, intermediate_key = (ec.generate_private_key(ec.SECP256R1()) for _ in range(3))
+    root = make_cert("Local Root", root_key, ca=True)
+    other_root = make_cert("Other Root", other_key, ca=True)
+    intermediate = make_cert("Local Intermediate", intermediate_key, root, root_key, ca=True)
+    rogue_intermediate = make_cert("Local Intermediate", other_key, other_root, other_key, ca=True)
+
+    validator = ChainValidator(TrustStore([root]))
+    failures = 0
+
+    def check(label, chain, hostname, expected):
+        nonlocal failures
+        verdict = validator.validate(chain, hostname)
+        ok = verdict.valid == expected
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {label}: valid={verdict.valid} error={verdict.error}")
+
+    leaf_key = ec.generate_private_key(ec.SECP256R1())
+    leaf = make_cert("example.test", leaf_key, intermediate, intermediate_key, hostnames=["example.test", "*.example.test"])
+    check("valid chain", [leaf, intermediate], "example.test", True)
+    check("wildcard", [leaf, intermediate], "www.example.test", True)
+    check("hostname mismatch", [leaf, intermediate], "other.test", False)
+    check("missing intermediate", [leaf], "example.test", False)
+    expired = make_cert("old.test", leaf_key, intermediate, intermediate_key, hostnames=["old.test"],
+                        not_before=NOW - timedelta(days=100), not_after=NOW - timedelta(days=10))
+    check("expired leaf", [expired, intermediate], "old.test", False)
+    forged = make_cert("example.test", leaf_key, rogue_intermediate, other_key, hostnames=["example.test"])
+    check("untrusted root", [forged, rogue_intermediate, other_root], "example.test", False)
+    check("wrong intermediate presented", [forged, intermediate], "example.test", False)
+
+    # Verdicts do not depend on the chains validated before: an incomplete chain does not
+    # make its links untrusted for a complete one, nor does a complete one complete it
+    # (root -> I3 -> I2 -> I1 -> leaf)
+    deep_keys = [ec.generate_private_key(ec.SECP256R1()) for _ in range(3)]
+    i3 = make_cert("Local Intermediate 3", deep_keys[2], root, root_key, ca=True)
+    i2 = make_cert("Local Intermediate 2", deep_keys[1], i3, deep_keys[2], ca=True)
+    i1 = make_cert("Local Intermediate 1", deep_keys[0], i2, deep_keys[1], ca=True)
+    incomplete = make_cert("a.test", leaf_key, i1, deep_keys[0], hostnames=["a.test"])
+    complete = make_cert("b.test", leaf_key, i1, deep_keys[0], hostnames=["b.test"])
+    check("incomplete deep chain", [incomplete, i1, i2], "a.test", False)
+    check("complete deep chain after an incomplete one", [complete, i1, i2, i3], "b.test", True)
+    check("incomplete deep chain after a complete one", [incomplete, i1, i2], "a.test", False)
+
+    # Many sites behind the same intermediate: only the first builds the path
+    for i in range(sites):
+        site = make_cert(f"site{i}.test", leaf_key, intermediate, intermediate_key, hostnames=[f"site{i}.test"])
+        failures += not validator.validate([site, intermediate], f"site{i}.test").valid
+
+    stats = validator.stats()
+    print(f"Path cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%}), {stats['size']} entries")
+    if failures:
+        print(f"{failures} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    verify_chain_validation()
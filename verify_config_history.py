@@ -0,0 +1,94 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# The scanner's engine is created from DATABASE_URL on import
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "history.db")
+
+from scanner.database import engine, get_db
+from scanner.loader import DomainEntry
+from scanner.manager import ScanManager
+from scanner.models import Base, ScanResult, TLSVersion, CipherSuite, Certificate, PQCInfo, ConfigChange
+from scanner.regrade import regrade
+from scanner.security_grader import SecurityGrader
+
+CIPHERS = ["TLS_AES_128_GCM_SHA256", "TLS_ECDHE_RSA_WITH_AES_128_CBC_SHA", "TLS_RSA_WITH_AES_256_CBC_SHA"]
+
+
+def make_scan(scan_date, ciphers=CIPHERS, is_valid=True):
+    """A successful scan of an unchanged server as the scanner builds it, flags classified with the current keywords."""
+    return ScanResult(
+        scan_date=scan_date,
+        scan_status="SUCCESS",
+        grade="A",
+        score=90,
+        tls_versions=[TLSVersion(version="TLS 1.2", is_supported=True), TLSVersion(version="TLS 1.3", is_supported=True)],
+        cipher_suites=[CipherSuite(name=name, is_weak=SecurityGrader.is_weak_cipher(name), tls_version="TLS 1.2")
+                       for name in ciphers],
+        certificate=Certificate(issuer="<Name(C=US,O=Example CA,CN=Example R1)>", ca_type="COMMERCIAL_CA",
+                                valid_until=datetime(2026, 6, 1), is_valid=is_valid),
+        pqc_info=PQCInfo(is_supported=False),
+    )
+
+
+def verify_config_history(domains: int = 20):
+    """Rescans of unchanged servers stay references across a regrade; real changes are still logged."""
+    Base.metadata.create_all(engine)
+    manager = ScanManager(max_workers=1)
+    entries = [DomainEntry(rank=rank, domain=f"site{rank}.com", tld="com") for rank in range(1, domains + 1)]
+    start = datetime(2026, 1, 1)
+    db = next(get_db())
+    failures = 0
+
+    def check(label, ok):
+        nonlocal failures
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {label}")
+
+    def changes():
+        db.expire_all()
+        return db.query(ConfigChange).count()
+
+    manager.save_results([(entry, make_scan(start)) for entry in entries])
+    check("first scans logged as first configurations", changes() == domains)
+
+    manager.save_results([(entry, make_scan(start + timedelta(days=1))) for entry in entries])
+    check("unchanged rescans stored by reference", changes() == domains)
+
+    # CBC suites become weak: regrade rewrites the stored flags, new scans carry the new ones
+    SecurityGrader.WEAK_CIPHER_KEYWORDS.add("CBC")
+    try:
+        report = regrade(db)
+        check(f"regrade rewrote {report.changed_configurations} configurations", report.changed_configurations > 0)
+        manager.save_results([(entry, make_scan(start + timedelta(days=2))) for entry in entries])
+    finally:
+        SecurityGrader.WEAK_CIPHER_KEYWORDS.discard("CBC")
+    check(f"no change logged for unchanged servers after a regrade ({changes() - domains} logged)", changes() == domains)
+    references = db.query(ScanResult).filter(ScanResult.scan_date == start + timedelta(days=2), ScanResult.config_scan_id.isnot(None)).count()
+    check(f"{references} rescans after the regrade stored by reference", references == domains)
+
+    # The chain verdict follows the trust store and the clock, not the server
+    manager.save_results([(entry, make_scan(start + timedelta(days=3), is_valid=False)) for entry in entries])
+    check(f"no change logged when only the chain verdict flips ({changes() - domains} logged)", changes() == domains)
+
+    # Hashes stored before derived columns were left out are refreshed on comparison
+    db.query(ConfigChange).update({ConfigChange.config_hash: "0" * 64})
+    db.commit()
+    manager.save_results([(entry, make_scan(start + timedelta(days=4))) for entry in entries])
+    check("stale stored hashes refreshed instead of logging a change", changes() == domains)
+
+    manager.save_results([(entries[0], make_scan(start + timedelta(days=5), CIPHERS[:2]))])
+    change = db.query(ConfigChange).order_by(ConfigChange.id.desc()).first()
+    check(f"a removed cipher suite is still logged ({change.details})",
+          changes() == domains + 1 and change.changed_components == "cipher_suites" and CIPHERS[2] in change.details)
+
+    db.close()
+    if failures:
+        print(f"{failures} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    verify_config_history()
@@ -10,13 +10,16 @@ def verify_db():
             print(f"- {d.name} (Rank: {d.global_rank})")
             for r in d.scan_results:
                 print(f"  - Scan Date: {r.scan_date}, Status: {r.scan_status}")
-                if r.certificate:
-                    print(f"    - Cert: {r.certificate.signature_algorithm}, Key: {r.certificate.public_key_algorithm} ({r.certificate.public_key_size} bits)")
-                print(f"    - TLS Versions: {[v.version for v in r.tls_versions if v.is_supported]}")
-                print(f"    - Cipher Suites: {len(r.cipher_suites)} found")
-                if r.pqc_info:
-                    print(f"    - PQC Supported: {r.pqc_info.is_supported}")
-                    print(f"    - PQC Suites: {r.pqc_info.supported_suites}")
+                if r.config_scan_id:
+                    print(f"    - Configuration unchanged since scan {r.config_scan_id}")
+                config = r.configuration_scan
+                if config.certificate:
+                    print(f"    - Cert: {config.certificate.signature_algorithm}, Key: {config.certificate.public_key_algorithm} ({config.certificate.public_key_size} bits)")
+                print(f"    - TLS Versions: {[v.version for v in config.tls_versions if v.is_supported]}")
+                print(f"    - Cipher Suites: {len(config.cipher_suites)} found")
+                if config.pqc_info:
+                    print(f"    - PQC Supported: {config.pqc_info.is_supported}")
+                    print(f"    - PQC Suites: {config.pqc_info.supported_suites}")
 
     finally:
         db.close()
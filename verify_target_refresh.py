@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from scanner.models import Base, TargetListChange
+from scanner.target_list import TargetList
+from scanner.target_refresh import refresh_target_list
+
+HEADER = "GlobalRank,TldRank,Domain,TLD,RefSubNets,RefIPs,IDN_Domain,IDN_TLD,PrevGlobalRank,PrevTldRank,PrevRefSubNets,PrevRefIPs\n"
+
+
+def make_csv(domains):
+    return (HEADER + "".join(f"{rank},{rank},{domain},{domain.rsplit('.', 1)[1]},1,1,{domain},x,0,0,0,0\n"
+                             for rank, domain in enumerate(domains, 1))).encode()
+
+
+class ListServer(BaseHTTPRequestHandler):
+    """Stands in for the Majestic download: serves one CSV with an ETag and Last-Modified and honours both."""
+    body = b""
+    version = 0
+    requests = []
+
+    def do_GET(self):
+        etag = f'"v{self.version}"'
+        last_modified = formatdate(1_700_000_000 + self.version * 86400, usegmt=True)
+        ListServer.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in self.headers and self.headers.get("If-Modified-Since") == last_modified):
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def verify_target_refresh(size: int = 20000):
+    """Refresh against a local HTTP server through an initial download, a 304 and a changed list."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ListServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/majestic_million.csv"
+
+    db = sessionmaker(bind=create_engine("sqlite://"))()
+    Base.metadata.create_all(db.get_bind())
+    path = os.path.join(tempfile.mkdtemp(), "majestic_million.targets")
+    failures = 0
+
+    def check(label, ok):
+        nonlocal failures
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {label}")
+
+    first = [f"site{i}.com" for i in range(size)]
+    ListServer.body, ListServer.version = make_csv(first), 1
+    report = refresh_target_list(db, url, path)
+    check(f"initial download ({report.domains} domains, nothing diffed)", report.modified and report.domains == size and not report.added)
+
+    report = refresh_target_list(db, url, path)
+    check("unchanged list answered 304", not report.modified and ListServer.requests[-1].get("If-None-Match") == '"v1"')
+
+    # Drop 100 domains, add 50 new ones at the top, move site0 from rank 1 far down
+    second = [f"new{i}.org" for i in range(50)] + first[1:size // 2] + [first[0]] + first[size // 2:size - 100]
+    ListServer.body, ListServer.version = make_csv(second), 2
+    report = refresh_target_list(db, url, path)
+    check(f"changed list: {report.added} added, {report.removed} removed, {report.rank_shifted} rank-shifted",
+          (report.added, report.removed) == (50, 100) and report.rank_shifted >= 1)
+
+    shifted = db.query(TargetListChange).filter_by(refresh_id=report.refresh_id, domain="site0.com").one()
+    check(f"site0.com recorded as {shifted.change} {shifted.previous_rank} -> {shifted.rank}",
+          (shifted.change, shifted.previous_rank, shifted.rank) == ("rank_shifted", 1, size // 2 + 50))
+    with TargetList(path) as targets:
+        check("indexed list matches the download", [targets.entry(i).domain for i in range(len(targets))] == second)
+
+    server.shutdown()
+    if failures:
+        print(f"{failures} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    verify_target_refresh()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from collections import Counter
+from sqlalchemy import create_engine
+from scanner.loader import DomainEntry
+from scanner.models import Base
+from scanner.work_queue import DatabaseQueue, MAX_ATTEMPTS
+
+
+def entries(count, prefix="site"):
+    return [DomainEntry(rank=rank, domain=f"{prefix}{rank}.com", tld="com") for rank in range(1, count + 1)]
+
+
+def drain(url):
+    """One worker process: lease small batches and complete them until nothing is left; returns what it took."""
+    queue = DatabaseQueue(url)
+    taken = []
+    while True:
+        leases = queue.lease(20, wait=False)
+        if not leases:
+            return taken
+        taken.extend(lease.entry.domain for lease in leases)
+        queue.complete(leases)
+
+
+def verify_work_queue(size: int = 1000, workers: int = 4):
+    """Leases, expiry, renewal and dead letters of the database queue, then several processes draining one file."""
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "queue.db")
+    Base.metadata.create_all(create_engine(url))
+    queue = DatabaseQueue(url)
+    failures = 0
+
+    def check(label, ok):
+        nonlocal failures
+        failures += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {label}")
+
+    check("enqueued", queue.put(entries(12)) == 12 and queue.pending() == 12)
+    first, second = queue.lease(4), queue.lease(4)
+    check("leases are disjoint", not {l.entry.domain for l in first} & {l.entry.domain for l in second})
+    check("leased in rank order", [l.entry.rank for l in first] == [1, 2, 3, 4])
+    check("leased domains stay pending", queue.pending() == 12)
+    check("completing removes them", queue.complete(first) == 4 and queue.pending() == 8)
+    check("a completed lease cannot be completed again", queue.complete(first) == 0)
+
+    short = queue.lease(2, seconds=1)
+    renewed = queue.lease(2, seconds=1)
+    check("renewal holds a lease", queue.renew(renewed, seconds=60) == 2)
+    time.sleep(1.5)
+    again = queue.lease(10)
+    again_names = {l.entry.domain for l in again}
+    check(f"an expired lease returns to the pool ({len(again)} leased)",
+          {l.entry.domain for l in short} <= again_names and not {l.entry.domain for l in renewed} & again_names)
+    check("the expired holder can no longer complete", queue.complete(short) == 0 and queue.renew(short) == 0)
+    queue.complete(second + renewed + again)
+    check("queue empty", queue.pending() == 0)
+
+    queue.put(entries(1, prefix="poison"))
+    for _ in range(MAX_ATTEMPTS):
+        queue.lease(1, seconds=0)
+    check(f"dead letter after {MAX_ATTEMPTS} attempts", not queue.lease(1) and queue.pending() == 0)
+
+    queue.put(entries(size))
+    with multiprocessing.Pool(workers) as pool:
+        taken = Counter(domain for part in pool.map(drain, [url] * workers) for domain in part)
+    check(f"{workers} processes scanned {len(taken)} of {size} domains, each once",
+          len(taken) == size and set(taken.values()) == {1} and queue.pending() == 0)
+
+    if failures:
+        print(f"{failures} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    verify_work_queue()